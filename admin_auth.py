@@ -0,0 +1,27 @@
+# admin_auth.py
+# Token check for the operational endpoints in app.py: the full /stats diagnostics, /metrics and
+# /catalog/diff. ADMIN_TOKEN is its own setting, independent of request profiling
+# (PROFILING_ADMIN_TOKEN in profiling.py guards only the profiler). Sent as X-Admin-Token or as
+# "Authorization: Bearer <token>", which Prometheus scrape configs can send. With ADMIN_TOKEN unset
+# nothing matches: /metrics and /catalog/diff answer 404 and /stats serves its redacted counters.
+import hmac
+import os
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def request_admin_token(headers):
+    """The admin token a request carries in X-Admin-Token or an Authorization: Bearer header, or None."""
+    token = headers.get("X-Admin-Token")
+    if token:
+        return token
+    scheme, _, credentials = (headers.get("Authorization") or "").partition(" ")
+    if scheme.lower() == "bearer" and credentials.strip():
+        return credentials.strip()
+    return None
+
+def is_admin_request(headers):
+    """True if ADMIN_TOKEN is set and the request headers carry it (constant-time compare)."""
+    token = request_admin_token(headers)
+    if not ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
@@ -1,36 +1,96 @@
 # airtable_utils.py
 # This file contains utility functions for fetching records from Airtable.
-# It includes functions to handle pagination, filtering by region and state, and grouping records by parent
-import requests
+# It includes functions to handle pagination, filtering by region and state, and grouping records by parent.
+# A process-wide snapshot of the full table is kept so requests don't re-page Airtable every time;
+# it is served immediately while fresh and refreshed in the background once it goes stale.
+# Alternatively, a query mode pushes the region/state filter and a field projection down to Airtable,
+# and a stream mode groups the table page by page without holding it (or a snapshot) in memory.
+# Each refresh is diffed against the previous snapshot (catalog_diff.py) to report which cards changed.
+# Change notifications (airtable_webhook.py) patch the snapshot in place of a full refetch.
+# With the shared catalog store (catalog_store.py) worker processes take turns fetching: one refreshes
+# under a lease and publishes, the rest only track the published version and read each card's
+# records from the store instead of paging Airtable or holding a copy of the catalog themselves.
 import os
+import time
+import sqlite3
+import threading
+import logging
 from dotenv import load_dotenv
 
+from http_client import http_get
+from metrics import stage_timer
+from rate_limit import rate_limited_request
+from catalog_index import (add_to_groups, sort_groups, state_card_regions, build_catalog_index, lookup_catalog_index,
+                           patch_catalog_index, linecard_scope)
+from catalog_model import CatalogRecord
+from regions import OVERLAPPING_STATES
+from catalog_diff import record_versions, scope_manifest, build_diff_report
+from catalog_store import (get_catalog_store, get_catalog_store_stats, lease_owner, CATALOG_REFRESH_LEASE,
+                           CATALOG_STORE_POLL, CATALOG_STORE_WAIT_INTERVAL, CATALOG_STORE_MAX_WAIT)
+
 load_dotenv()
 
-def fetch_airtable_records(region, state=None):
+logger = logging.getLogger(__name__)
+
+AIRTABLE_URL = os.getenv("AIRTABLE_API_URL", "https://api.airtable.com/v0/appDsGXHk2qjpghDU/tblSsgAiKeTkRTTxn")
+
+# How fetch_airtable_records gets its data:
+#  - "snapshot": filter the shared full-table snapshot in Python (default)
+#  - "query":    send filterByFormula + fields[] so Airtable only returns matching rows/columns
+#  - "full":     walk the full table on every call (original behavior)
+#  - "stream":   walk the full table, filtering and grouping each page as it arrives, so memory is
+#                bounded by one page plus the matching records
+AIRTABLE_FETCH_MODE = os.getenv("AIRTABLE_FETCH_MODE", "snapshot").strip().lower()
+
+# Fields read by build_table_content / resolve_display_name plus the ones the filters need.
+# Airtable rejects unknown field names, so only list fields that exist in the table.
+AIRTABLE_QUERY_FIELDS = [
+    f.strip() for f in os.getenv(
+        "AIRTABLE_QUERY_FIELDS",
+        "Manufacturer Names,Parent,Description,Logos,Region,Manufacturer States"
+    ).split(",") if f.strip()
+]
+
+class AirtableAPIError(RuntimeError):
+    """Raised when Airtable answers with a non-200 status; keeps the status code for callers."""
+    def __init__(self, status_code, text):
+        super().__init__(f"Airtable API returned status {status_code}: {text}")
+        self.status_code = status_code
+
+# Snapshot freshness (seconds). Within TTL the snapshot is served as-is; between TTL and
+# MAX_STALE it is still served but a background refresh is started; beyond MAX_STALE
+# callers wait for a synchronous refetch.
+AIRTABLE_SNAPSHOT_TTL = float(os.getenv("AIRTABLE_SNAPSHOT_TTL", "300"))
+AIRTABLE_SNAPSHOT_MAX_STALE = float(os.getenv("AIRTABLE_SNAPSHOT_MAX_STALE", "3600"))
+
+def iter_airtable_pages(query_params=None):
     """
-    Fetch all records from the Airtable table with pagination.
-    Returns a dictionary grouped by parent company.
+    Yield each page of raw records (a list of record dicts) as it arrives, following pagination.
+    The next page is only requested once the caller asks for it.
+    query_params (optional) are sent with every page, e.g. filterByFormula / fields[].
     Raises exceptions with helpful messages on failure.
     """
-    url = "https://api.airtable.com/v0/appDsGXHk2qjpghDU/tblSsgAiKeTkRTTxn"
     pat = os.getenv("AIRTABLE_PAT")  # Personal access token ID with read and write access
     if not pat:
         raise RuntimeError("Missing AIRTABLE_PAT environment variable")
 
     headers = {"Authorization": f"Bearer {pat}"}
 
-    all_records = []
-    params = {}
+    params = dict(query_params or {})
 
     # pagination loop
+    def get_page():
+        with stage_timer("airtable_page"):
+            return http_get(AIRTABLE_URL, headers=headers, params=params, timeout=30)
+
     while True:
-        resp = requests.get(url, headers=headers, params=params, timeout=30)
+        # waits for the shared Airtable rate limit and retries 429s (rate_limit.py)
+        resp = rate_limited_request(get_page)
         if resp.status_code != 200:
             # bubble up helpful error
-            raise RuntimeError(f"Airtable API returned status {resp.status_code}: {resp.text}")
+            raise AirtableAPIError(resp.status_code, resp.text)
         data = resp.json()
-        all_records.extend(data.get("records", []))
+        yield data.get("records", [])
 
         offset = data.get("offset")
         if offset:
@@ -38,38 +98,633 @@ def fetch_airtable_records(region, state=None):
         else:
             break
 
-    # Filter records by region
-    filtered = [r["fields"] for r in all_records if any(region.lower() == reg.lower() for reg in r["fields"].get("Region", []))]
+def fetch_all_airtable_records(query_params=None):
+    """
+    Fetch every raw record from the Airtable table, following pagination.
+    Returns the list of record dicts exactly as Airtable returns them ({"id", "createdTime", "fields"}).
+    query_params (optional) are sent with every page, e.g. filterByFormula / fields[].
+    Raises exceptions with helpful messages on failure.
+    """
+    all_records = []
+    for page in iter_airtable_pages(query_params):
+        all_records.extend(page)
+    return all_records
+
+def _formula_string(value):
+    """Quote a value as an Airtable formula string literal."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def _formula_list_contains(field, value):
+    """
+    Formula testing whether a comma-separated/multi-select field contains value (case-insensitive).
+    Both sides are wrapped in commas so "west" does not match "midwest".
+    """
+    needle = _formula_string("," + value.strip().lower() + ",")
+    haystack = '"," & REGEX_REPLACE(TRIM(LOWER({%s} & "")), " *, *", ",") & ","' % field
+    return f"FIND({needle}, {haystack})"
 
-    # If filtering by state to further narrow down
+def build_airtable_filter_formula(region, state=None):
+    """
+    Build a filterByFormula expression equivalent to the client-side region/state filter.
+    A state card for an overlapping state spans several regions, so only the state is filtered
+    server-side there; the client-side filter then picks the card's regions.
+    """
+    clauses = []
+    if not state or region.lower() not in OVERLAPPING_STATES.get(state.lower(), ()):
+        clauses.append(_formula_list_contains("Region", region))
     if state:
-        def normalize_manufacturer_states(val):
-            if isinstance(val, list):
-                return [s.strip().lower() for s in val]
-            elif isinstance(val, str):
-                return [s.strip().lower() for s in val.split(",")]
-            else:
-                return []
+        clauses.append(_formula_list_contains("Manufacturer States", state))
+    if len(clauses) == 1:
+        return clauses[0]
+    return "AND(" + ", ".join(clauses) + ")"
+
+# Record ids per filterByFormula when refetching individual records (keeps the URL well under limits)
+AIRTABLE_ID_BATCH = int(os.getenv("AIRTABLE_ID_BATCH", "50"))
+
+def build_record_id_formula(record_ids):
+    """filterByFormula matching exactly the given record ids."""
+    clauses = [f"RECORD_ID() = {_formula_string(record_id)}" for record_id in record_ids]
+    if len(clauses) == 1:
+        return clauses[0]
+    return "OR(" + ", ".join(clauses) + ")"
+
+def fetch_airtable_records_by_id(record_ids):
+    """Fetch the raw records with the given ids, AIRTABLE_ID_BATCH per listing. Deleted ids are simply absent."""
+    record_ids = list(dict.fromkeys(record_ids))
+    records = []
+    for i in range(0, len(record_ids), AIRTABLE_ID_BATCH):
+        batch = record_ids[i:i + AIRTABLE_ID_BATCH]
+        records.extend(fetch_all_airtable_records({"filterByFormula": build_record_id_formula(batch)}))
+    return records
 
-        filtered = [
-            r for r in filtered
-            if state.lower() in normalize_manufacturer_states(r.get("Manufacturer States", ""))
-        ]
+def build_airtable_query_params(region, state=None):
+    """Query parameters for a server-side filtered, field-projected listing."""
+    params = {"filterByFormula": build_airtable_filter_formula(region, state)}
+    if AIRTABLE_QUERY_FIELDS:
+        params["fields[]"] = list(AIRTABLE_QUERY_FIELDS)
+    return params
 
-    # Group by parent company
+def filter_and_group_records(all_records, region, state=None):
+    """
+    Filter raw Airtable records by region (and optionally state) and group them by parent company.
+    Returns a dictionary grouped by parent company, sorted case-insensitively by parent name.
+    """
+    return group_record_pages([all_records], region, state)
+
+def group_record_pages(pages, region, state=None):
+    """
+    Filter and group an iterable of record pages (see iter_airtable_pages) one page at a time.
+    Each raw record is reduced to a CatalogRecord and merged into its parent group only if it
+    matches, so nothing but the current page and the matching records is held. The result is the
+    same grouped dict filter_and_group_records gives for all the records at once.
+    """
+    # CatalogRecord resolves the region/state sets once per record
+    region = region.lower()
+    state = state.lower() if state else None
     grouped = {}
+    for page in pages:
+        for record in map(CatalogRecord.from_airtable, page):
+            if state:
+                matches = state in record.states and region in state_card_regions(record.regions, state)
+            else:
+                matches = region in record.regions
+            if matches:
+                add_to_groups(grouped, record)
+    return sort_groups(grouped)
 
-    for record in filtered:
-        name = record.get("Manufacturer Names", "Unknown Manufacturer")
-        parent = record.get("Parent", name)
+# --- Snapshot cache ---------------------------------------------------------
+# The published snapshot is replaced wholesale on refresh; apart from its lazily built manifest it is
+# never mutated, so readers can use it without holding the lock. Raw records are only kept while the
+# snapshot is ingested: the index (compact CatalogRecords) and the per-record versions replace them.
+# "shared" snapshots mirror the shared catalog store's head: they carry its version number, so every
+# worker agrees on what v12 is, and no index; cards are looked up in the store, and the full index is
+# only built from it (get_snapshot_index) in the rare paths that need every scope.
+_snapshot_lock = threading.Lock()
+_refresh_lock = threading.Lock()  # serializes fetches so concurrent misses share one table walk
+# {"record_count", "fetched_at", "version", "index", "versions", "manifest", "shared"}; manifest is lazy,
+# and so are index and versions of a shared snapshot
+_snapshot = None
+_index_lock = threading.Lock()
+_refresh_thread = None
+_last_diff = None  # diff report of the most recent refresh against the snapshot it replaced
+_store_checked_at = 0.0
+_snapshot_stats = {
+    "hits": 0,
+    "stale_hits": 0,
+    "misses": 0,
+    "refreshes": 0,
+    "refresh_errors": 0,
+    "patches": 0,
+    "patched_records": 0,
+    "store_versions": 0,
+    "store_lookups": 0,
+    "store_loads": 0,
+    "patch_retries": 0,
+    "lease_waits": 0,
+    "lease_wait_seconds": 0.0,
+    "lease_wait_timeouts": 0,
+    "store_fallback_refreshes": 0,
+    "last_refresh_seconds": None,
+    "last_error": None,
+}
 
-        if parent not in grouped:
-            grouped[parent] = {
-                "parent": None,
-                "children": []}
-        if name == parent:
-            grouped[parent]["parent"] = record
+def refresh_airtable_snapshot():
+    """
+    Fetch the full table from Airtable and publish it as the current snapshot (and to the shared
+    catalog store, if enabled). Returns the new snapshot dict.
+    """
+    global _snapshot, _last_diff
+    started = time.time()
+    records = fetch_all_airtable_records()
+    finished = time.time()
+    versions = record_versions(records)
+    index = build_catalog_index(records, versions)
+    fetched = {"record_count": len(records), "fetched_at": finished, "version": None,
+               "index": index, "versions": versions, "manifest": None, "shared": False}
+    with _snapshot_lock:
+        previous = _snapshot
+    published = _store_publish(fetched, previous)
+    with _snapshot_lock:
+        if published:
+            snapshot, _last_diff = published
         else:
-            grouped[parent]["children"].append(record)
+            fetched["version"] = (previous["version"] + 1) if previous else 1
+            snapshot = fetched
+        _snapshot = snapshot
+        _snapshot_stats["refreshes"] += 1
+        _snapshot_stats["last_refresh_seconds"] = round(finished - started, 3)
+        _snapshot_stats["last_error"] = None
+    logger.info("Airtable snapshot v%d refreshed: %d records in %.2fs", snapshot["version"], len(records), finished - started)
+    if previous and not published:
+        _record_snapshot_diff(previous, snapshot)
+    return snapshot
+
+def _shared_snapshot(head):
+    """A snapshot standing for the store's current version (index and versions are loaded on demand)."""
+    return {"record_count": head["record_count"], "fetched_at": head["fetched_at"], "version": head["version"],
+            "index": None, "versions": None, "manifest": None, "shared": True}
+
+def _load_store_snapshot(store):
+    """The store's current catalog as a full snapshot with its index, or None if nothing is published."""
+    head, records = store.load(AIRTABLE_URL)
+    if head is None:
+        return None
+    with _snapshot_lock:
+        _snapshot_stats["store_loads"] += 1
+    snapshot = _shared_snapshot(head)
+    snapshot["index"] = build_catalog_index(records)
+    snapshot["versions"] = {record.id: record.version for record in records}
+    return snapshot
+
+def _diff_or_none(previous, snapshot):
+    try:
+        return diff_snapshots(previous, snapshot)
+    except Exception:
+        logger.exception("Failed to diff the Airtable snapshot against v%s", previous["version"] if previous else None)
+        return None
+
+def _store_publish(fetched, previous):
+    """
+    Publish a freshly fetched snapshot to the shared catalog store, with its diff against the catalog
+    the store held (this worker's previous snapshot if the store was empty).
+    Returns (shared snapshot, diff report), or None when the store is off or failed.
+    """
+    store = get_catalog_store()
+    if store is None:
+        return None
+    try:
+        base = _load_store_snapshot(store) or previous
+        diff = _diff_or_none(base, fetched) if base else None
+        version = store.publish(AIRTABLE_URL, fetched["index"], fetched["fetched_at"], diff)
+        head = store.head(AIRTABLE_URL)
+    except sqlite3.Error:
+        logger.exception("Could not publish the Airtable snapshot to the shared catalog store")
+        return None
+    if diff is not None:
+        diff["to_version"] = version
+    return _shared_snapshot(head), diff
+
+def _adopt_store_snapshot(store):
+    """
+    Make the version published in the store this process's snapshot, unless it already is. Only the
+    head row is read (and the diff report stored with it); nothing is loaded or indexed. Returns the
+    current snapshot (None if there is none anywhere yet). Call with _refresh_lock held.
+    """
+    global _snapshot, _last_diff
+    with _snapshot_lock:
+        previous = _snapshot
+    shared = previous is not None and previous.get("shared")
+    head = store.head(AIRTABLE_URL)
+    if head is None or (shared and previous["version"] == head["version"]):
+        return previous
+    diff = store.last_diff(AIRTABLE_URL)
+    snapshot = _shared_snapshot(head)
+    with _snapshot_lock:
+        _snapshot = snapshot
+        _snapshot_stats["store_versions"] += 1
+        if diff is not None and diff.get("to_version") == head["version"]:
+            _last_diff = diff
+    logger.info("Airtable snapshot v%d adopted from the shared catalog store (%d records)",
+                snapshot["version"], snapshot["record_count"])
+    return snapshot
+
+def _snapshot_age(snapshot):
+    return (time.time() - snapshot["fetched_at"]) if snapshot else None
+
+def _sync_from_store(store, wait):
+    owner = lease_owner()
+    wait_started = None
+    try:
+        while True:
+            snapshot = _adopt_store_snapshot(store)
+            age = _snapshot_age(snapshot)
+            if snapshot and age <= AIRTABLE_SNAPSHOT_TTL:
+                return snapshot
+            if store.acquire_lease(owner, CATALOG_REFRESH_LEASE):
+                try:
+                    # another worker may have published between the check and taking the lease
+                    snapshot = _adopt_store_snapshot(store)
+                    if snapshot and _snapshot_age(snapshot) <= AIRTABLE_SNAPSHOT_TTL:
+                        return snapshot
+                    return refresh_airtable_snapshot()
+                finally:
+                    store.release_lease(owner)
+            # another worker is fetching: keep serving what we have while it is still usable
+            if not wait or (snapshot and age <= AIRTABLE_SNAPSHOT_MAX_STALE):
+                return snapshot
+            if wait_started is None:
+                wait_started = time.time()
+                with _snapshot_lock:
+                    _snapshot_stats["lease_waits"] += 1
+            elif time.time() - wait_started >= CATALOG_STORE_MAX_WAIT:
+                # the lease holder may have died mid-fetch; its lease would block us until it expires
+                logger.warning("No Airtable snapshot published after waiting %.0fs for the refresh lease (%s); "
+                               "fetching it directly", time.time() - wait_started, store.lease_info())
+                with _snapshot_lock:
+                    _snapshot_stats["lease_wait_timeouts"] += 1
+                return refresh_airtable_snapshot()
+            time.sleep(CATALOG_STORE_WAIT_INTERVAL)
+    finally:
+        if wait_started is not None:
+            with _snapshot_lock:
+                _snapshot_stats["lease_wait_seconds"] += time.time() - wait_started
+
+def _sync_snapshot(wait=True):
+    """
+    Bring this process's snapshot up to date and return it; call with _refresh_lock held.
+
+    With the shared catalog store, a newer published catalog is loaded from it and Airtable is
+    only fetched by the worker holding the refresh lease. The other workers wait for its result
+    when they have nothing usable (wait=True), or keep their current snapshot (wait=False, which
+    may return None). Without the store, or if it fails, Airtable is fetched directly.
+    """
+    store = get_catalog_store()
+    if store is not None:
+        try:
+            return _sync_from_store(store, wait)
+        except sqlite3.Error:
+            logger.exception("Shared catalog store unavailable; fetching the Airtable snapshot directly")
+    with _snapshot_lock:
+        current = _snapshot
+    if current and _snapshot_age(current) <= AIRTABLE_SNAPSHOT_TTL:
+        return current
+    return refresh_airtable_snapshot()
+
+def _store_has_update(snapshot):
+    """True if another worker published a different catalog version (checked every CATALOG_STORE_POLL seconds)."""
+    global _store_checked_at
+    store = get_catalog_store()
+    now = time.time()
+    if store is None or now - _store_checked_at < CATALOG_STORE_POLL:
+        return False
+    _store_checked_at = now
+    try:
+        head = store.head(AIRTABLE_URL)
+    except sqlite3.Error as ex:
+        logger.warning("Could not read the shared catalog store: %s", ex)
+        return False
+    return head is not None and not (snapshot.get("shared") and head["version"] == snapshot["version"])
+
+def _record_snapshot_diff(previous, snapshot):
+    """
+    Diff a new snapshot against the one it replaced and keep the report for get_last_snapshot_diff().
+    Returns the report, or None if diffing failed.
+    """
+    global _last_diff
+    try:
+        report = diff_snapshots(previous, snapshot)
+    except Exception:
+        logger.exception("Failed to diff Airtable snapshot v%d against v%d", snapshot["version"], previous["version"])
+        return None
+    with _snapshot_lock:
+        _last_diff = report
+    records = report["records"]
+    logger.info("Airtable snapshot v%d diff: %d added, %d removed, %d changed records; %d cards affected",
+                snapshot["version"], records["added"], records["removed"], records["changed"],
+                len(report["changed_scopes"]))
+    return report
+
+# Attempts at writing a webhook patch to the shared store when other workers keep publishing in between
+STORE_PATCH_ATTEMPTS = 3
+
+def _patch_snapshot(previous, fetched, removed):
+    """A new snapshot dict: previous with the fetched raw records replaced or added and removed ids dropped."""
+    versions = dict(get_snapshot_versions(previous))
+    for record_id in removed:
+        versions.pop(record_id, None)
+    versions.update(record_versions(fetched))
+    index = patch_catalog_index(get_snapshot_index(previous), fetched, removed, versions)
+    return {"record_count": len(index["records"]), "fetched_at": previous["fetched_at"], "version": previous["version"] + 1,
+            "index": index, "versions": versions, "manifest": None, "shared": False}
+
+def _store_apply(store, fetched, removed):
+    """
+    Patch the store's current catalog and write the change back as its next version, rebuilding
+    the patch if another worker publishes in between. Returns (shared snapshot, diff report), or
+    None if the store has nothing published or kept changing.
+    """
+    for attempt in range(STORE_PATCH_ATTEMPTS):
+        base = _load_store_snapshot(store)
+        if base is None:
+            return None
+        patched = _patch_snapshot(base, fetched, removed)
+        diff = _diff_or_none(base, patched)
+        index = patched["index"]
+        version = store.apply_changes(AIRTABLE_URL, base["version"], [index["records"][r["id"]] for r in fetched],
+                                      removed, index["patched_scopes"], diff)
+        if version is not None:
+            return _shared_snapshot({"record_count": patched["record_count"], "fetched_at": base["fetched_at"],
+                                     "version": version}), diff
+        with _snapshot_lock:
+            _snapshot_stats["patch_retries"] += 1
+    logger.warning("Shared catalog store kept changing; gave up writing the patch after %d attempts", STORE_PATCH_ATTEMPTS)
+    return None
+
+def apply_record_changes(changed_ids, destroyed_ids=()):
+    """
+    Patch the current snapshot with Airtable changes instead of refetching the table: refetch only
+    changed_ids (created or updated records), drop destroyed_ids, and publish the result as a new
+    snapshot version. Ids that can no longer be fetched are treated as destroyed.
+
+    Returns the diff report against the replaced snapshot (its "changed_scopes" are the cards to
+    regenerate), or None when no snapshot is loaded yet; the next fetch then reads the whole table.
+    The snapshot keeps its fetched_at, so the TTL refresh still reconciles anything a missed
+    notification left behind. With the shared catalog store the store's current version is patched
+    and written back as the next one, which the other workers pick up on their next store check.
+    """
+    global _snapshot, _last_diff
+    changed_ids = list(dict.fromkeys(changed_ids))
+    with _refresh_lock:
+        store = get_catalog_store()
+        if store is not None:
+            try:
+                _adopt_store_snapshot(store)
+            except sqlite3.Error:
+                logger.exception("Could not read the shared catalog store; patching this worker's snapshot")
+                store = None
+        with _snapshot_lock:
+            previous = _snapshot
+        if previous is None:
+            return None
+        fetched = fetch_airtable_records_by_id(changed_ids) if changed_ids else []
+        fetched_ids = {r["id"] for r in fetched}
+        removed = (set(destroyed_ids) | set(changed_ids)) - fetched_ids
+        stored = None
+        if store is not None and previous.get("shared"):
+            try:
+                stored = _store_apply(store, fetched, removed)
+            except sqlite3.Error:
+                logger.exception("Could not write Airtable changes to the shared catalog store")
+        if stored is not None:
+            snapshot, diff = stored
+        else:
+            snapshot = _patch_snapshot(previous, fetched, removed)
+        with _snapshot_lock:
+            _snapshot = snapshot
+            if stored is not None:
+                _last_diff = diff
+            _snapshot_stats["patches"] += 1
+            _snapshot_stats["patched_records"] += len(fetched) + len(removed)
+    logger.info("Airtable snapshot v%d patched: %d records refetched, %d removed",
+                snapshot["version"], len(fetched), len(removed))
+    if stored is not None:
+        return diff
+    return _record_snapshot_diff(previous, snapshot)
+
+def _refresh_snapshot_worker():
+    global _refresh_thread
+    try:
+        with _refresh_lock:
+            _sync_snapshot(wait=False)
+    except Exception as ex:
+        logger.exception("Background Airtable snapshot refresh failed")
+        with _snapshot_lock:
+            _snapshot_stats["refresh_errors"] += 1
+            _snapshot_stats["last_error"] = str(ex)
+    finally:
+        with _snapshot_lock:
+            _refresh_thread = None
+
+def _start_background_refresh():
+    """Start a background refresh unless one is already running."""
+    global _refresh_thread
+    with _snapshot_lock:
+        if _refresh_thread is not None:
+            return
+        _refresh_thread = threading.Thread(target=_refresh_snapshot_worker, name="airtable-snapshot-refresh", daemon=True)
+        _refresh_thread.start()
+
+def get_airtable_snapshot():
+    """
+    Return the current snapshot dict ({"record_count", "fetched_at", "version", "index", ...}).
+
+    - Fresh (age <= AIRTABLE_SNAPSHOT_TTL): served immediately.
+    - Stale (age <= AIRTABLE_SNAPSHOT_MAX_STALE): served immediately, background refresh started.
+    - Missing or too old: fetched synchronously (concurrent callers wait for the same fetch).
+    With the shared catalog store, "fetched" usually means loaded from it (see _sync_snapshot),
+    and a version published by another worker is picked up in the background.
+    """
+    with _snapshot_lock:
+        snapshot = _snapshot
+        age = _snapshot_age(snapshot)
+        if snapshot and age <= AIRTABLE_SNAPSHOT_TTL:
+            _snapshot_stats["hits"] += 1
+        elif snapshot and age <= AIRTABLE_SNAPSHOT_MAX_STALE:
+            _snapshot_stats["stale_hits"] += 1
+        else:
+            _snapshot_stats["misses"] += 1
+            snapshot = None
+
+    if snapshot and age <= AIRTABLE_SNAPSHOT_TTL:
+        if _store_has_update(snapshot):
+            _start_background_refresh()
+        return snapshot
+    if snapshot:
+        _start_background_refresh()
+        return snapshot
+
+    with _refresh_lock:
+        # another caller may have completed the fetch while we waited for the lock
+        with _snapshot_lock:
+            current = _snapshot
+        if current and _snapshot_age(current) <= AIRTABLE_SNAPSHOT_TTL:
+            return current
+        return _sync_snapshot(wait=True)
+
+def _ensure_index(snapshot):
+    """Load a shared snapshot's index and versions from the store, once (kept for the snapshot's lifetime)."""
+    if snapshot.get("index") is None:
+        with _index_lock:
+            if snapshot.get("index") is None:
+                store = get_catalog_store()
+                loaded = _load_store_snapshot(store) if store is not None else None
+                if loaded is None:
+                    raise RuntimeError("The shared catalog store has no catalog to index")
+                snapshot["versions"] = loaded["versions"]
+                snapshot["index"] = loaded["index"]
+    return snapshot
+
+def get_snapshot_index(snapshot):
+    """
+    Return the region/state catalog index for a snapshot: built when the snapshot was fetched or, for
+    a shared snapshot, from the store the first time it is asked for (the store's current version).
+    """
+    return _ensure_index(snapshot)["index"]
+
+def get_snapshot_versions(snapshot):
+    """{record id: version} for a snapshot (catalog_diff.record_version); loaded with the index."""
+    return _ensure_index(snapshot)["versions"]
+
+def get_snapshot_manifest(snapshot):
+    """Per-scope {manufacturer: version} manifest for a snapshot, built from its index once per snapshot."""
+    manifest = snapshot.get("manifest")
+    if manifest is None:
+        index = get_snapshot_index(snapshot)
+        with _index_lock:
+            manifest = snapshot.get("manifest")
+            if manifest is None:
+                manifest = scope_manifest(index)
+                snapshot["manifest"] = manifest
+    return manifest
+
+def diff_snapshots(old_snapshot, new_snapshot):
+    """Diff report (catalog_diff.build_diff_report) between two snapshots; old_snapshot may be None."""
+    return build_diff_report(
+        get_snapshot_versions(old_snapshot) if old_snapshot else {},
+        get_snapshot_manifest(old_snapshot) if old_snapshot else {},
+        get_snapshot_versions(new_snapshot),
+        get_snapshot_manifest(new_snapshot),
+        from_version=old_snapshot["version"] if old_snapshot else None,
+        to_version=new_snapshot["version"],
+    )
+
+def get_last_snapshot_diff():
+    """The diff report from the most recent refresh, or None before the second refresh."""
+    with _snapshot_lock:
+        return _last_diff
+
+def get_snapshot_stats():
+    """
+    Return a JSON-serializable summary of the snapshot: age, version, record count and hit/miss counters.
+    """
+    with _snapshot_lock:
+        stats = dict(_snapshot_stats)
+        snapshot = _snapshot
+        stats["refreshing"] = _refresh_thread is not None
+        stats["last_diff_changed_scopes"] = len(_last_diff["changed_scopes"]) if _last_diff else None
+    stats["lease_wait_seconds"] = round(stats["lease_wait_seconds"], 3)
+    stats["ttl_seconds"] = AIRTABLE_SNAPSHOT_TTL
+    stats["max_stale_seconds"] = AIRTABLE_SNAPSHOT_MAX_STALE
+    if snapshot:
+        stats["age_seconds"] = round(time.time() - snapshot["fetched_at"], 3)
+        stats["version"] = snapshot["version"]
+        stats["record_count"] = snapshot["record_count"]
+        stats["index_build_seconds"] = snapshot["index"]["build_seconds"] if snapshot.get("index") else None
+        stats["shared"] = snapshot.get("shared", False)
+    else:
+        stats["age_seconds"] = None
+        stats["version"] = None
+        stats["record_count"] = 0
+    stats["store"] = get_catalog_store_stats(AIRTABLE_URL)
+    return stats
+
+def _store_lookup(region, state=None):
+    """The grouped dict for a card read from the shared catalog store, or None if it can't answer."""
+    store = get_catalog_store()
+    if store is None:
+        return None
+    try:
+        head, grouped = store.lookup(AIRTABLE_URL, linecard_scope(region.lower(), state.lower() if state else None))
+    except sqlite3.Error:
+        logger.exception("Could not read the card from the shared catalog store")
+        return None
+    if head is None:
+        return None
+    with _snapshot_lock:
+        _snapshot_stats["store_lookups"] += 1
+    return grouped
+
+def _replace_unservable_snapshot(snapshot):
+    """
+    Replace a shared snapshot the store could not serve a card for (store failing, or emptied under
+    us) with a fresh fetch, once per process: concurrent callers queue on _refresh_lock and take the
+    snapshot the first one published instead of each walking the table. The result carries an
+    in-process index unless it was published to a store that answers again.
+    """
+    with _refresh_lock:
+        with _snapshot_lock:
+            current = _snapshot
+        if current is None or current is snapshot:
+            logger.warning("Shared catalog store could not answer; refreshing the Airtable snapshot")
+            with _snapshot_lock:
+                _snapshot_stats["store_fallback_refreshes"] += 1
+            current = refresh_airtable_snapshot()
+    return current
+
+def fetch_airtable_records(region, state=None, mode=None):
+    """
+    Fetch records for a region (and optionally a state).
+    Returns a dictionary grouped by parent company.
+    Raises exceptions with helpful messages on failure.
+
+    mode overrides AIRTABLE_FETCH_MODE ("snapshot", "query", "full" or "stream").
+    In query mode, Airtable does the filtering and projection; the client-side filter is still
+    applied to the (much smaller) result so both paths group identically. If Airtable rejects
+    the query (422: bad formula or unknown field), the client-side snapshot path is used instead.
+    """
+    mode = (mode or AIRTABLE_FETCH_MODE).lower()
+
+    if mode == "query":
+        try:
+            all_records = fetch_all_airtable_records(build_airtable_query_params(region, state))
+            with stage_timer("filter_group"):
+                return filter_and_group_records(all_records, region, state)
+        except AirtableAPIError as ex:
+            if ex.status_code != 422:
+                raise
+            logger.warning("Airtable rejected filtered query, falling back to client-side filtering: %s", ex)
+        mode = "snapshot"
+
+    if mode == "stream":
+        # pages are grouped as they arrive; page requests are timed as airtable_page stages
+        return group_record_pages(iter_airtable_pages(), region, state)
 
-    return dict(sorted(grouped.items(), key=lambda x: x[0].lower()))
\ No newline at end of file
+    if mode == "full":
+        all_records = fetch_all_airtable_records()
+        with stage_timer("filter_group"):
+            return filter_and_group_records(all_records, region, state)
+    snapshot = get_airtable_snapshot()
+    if snapshot.get("index") is None:
+        with stage_timer("filter_group"):
+            grouped = _store_lookup(region, state)
+        if grouped is not None:
+            return grouped
+        snapshot = _replace_unservable_snapshot(snapshot)
+        if snapshot.get("index") is None:
+            # republished to a store that answers again
+            with stage_timer("filter_group"):
+                grouped = _store_lookup(region, state)
+            if grouped is not None:
+                return grouped
+    with stage_timer("filter_group"):
+        return lookup_catalog_index(get_snapshot_index(snapshot), region, state)
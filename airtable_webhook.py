@@ -0,0 +1,143 @@
+# airtable_webhook.py
+# Change notifications from Airtable, applied to the in-process catalog instead of waiting for
+# the snapshot TTL. A notification is a JSON body listing changed record ids, either Airtable
+# webhook payloads ({"changedTablesById": {tbl: {"changedRecordsById", "createdRecordsById",
+# "destroyedRecordIds"}}}, alone or as {"payloads": [...]} from the list-payloads API) or the
+# compact form {"changed": [ids], "destroyed": [ids]}. Airtable's own ping carries no ids, so it
+# has to be relayed through something that lists the payloads and forwards them here.
+# Bodies are authenticated with an HMAC-SHA256 of the raw body, sent as
+# "X-Airtable-Content-MAC: hmac-sha256=<hex>", keyed by AIRTABLE_WEBHOOK_SECRET (the base64
+# macSecretBase64 Airtable returns when the webhook is created).
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import threading
+import time
+import logging
+
+import airtable_utils
+from pdf_cache import invalidate_scopes
+
+logger = logging.getLogger(__name__)
+
+AIRTABLE_WEBHOOK_SECRET = os.getenv("AIRTABLE_WEBHOOK_SECRET", "")
+AIRTABLE_WEBHOOK_MAC_HEADER = "X-Airtable-Content-MAC"
+_MAC_PREFIX = "hmac-sha256="
+
+_stats_lock = threading.Lock()
+_stats = {
+    "received": 0,
+    "rejected": 0,
+    "applied": 0,
+    "records_changed": 0,
+    "records_destroyed": 0,
+    "pdf_cache_invalidated": 0,
+    "last_applied": None,
+}
+
+def _bump(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+def webhook_enabled():
+    return bool(AIRTABLE_WEBHOOK_SECRET)
+
+def _secret_key():
+    try:
+        return base64.b64decode(AIRTABLE_WEBHOOK_SECRET, validate=True)
+    except (binascii.Error, ValueError):
+        # not base64: use the configured string itself
+        return AIRTABLE_WEBHOOK_SECRET.encode("utf-8")
+
+def sign_body(body):
+    """Header value authenticating body with AIRTABLE_WEBHOOK_SECRET (used by senders and the replay tool)."""
+    return _MAC_PREFIX + hmac.new(_secret_key(), body, hashlib.sha256).hexdigest()
+
+def verify_signature(body, header):
+    """True if header is a valid MAC of the raw body bytes (constant-time compare); counts received/rejected."""
+    _bump("received")
+    valid = webhook_enabled() and bool(header) and hmac.compare_digest(
+        header.strip().encode("utf-8"), sign_body(body).encode("utf-8"))
+    if not valid:
+        _bump("rejected")
+    return valid
+
+def _table_id():
+    return airtable_utils.AIRTABLE_URL.rstrip("/").rsplit("/", 1)[-1]
+
+def _field(obj, key, kind, where):
+    """obj[key] if it is a kind (an empty one if missing or null); ValueError for any other type."""
+    value = obj.get(key)
+    if value is None:
+        return kind()
+    if not isinstance(value, kind):
+        raise ValueError(f"{where}{key} must be a JSON {'object' if kind is dict else 'array'}")
+    return value
+
+def parse_notification(payload):
+    """
+    Return (changed_ids, destroyed_ids) from a notification body; changes to other tables are ignored.
+    Raises ValueError for bodies that are not a notification, including mistyped nested fields.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Notification body must be a JSON object")
+    changed = []
+    destroyed = []
+    if "changed" in payload or "destroyed" in payload:
+        changed.extend(_field(payload, "changed", list, ""))
+        destroyed.extend(_field(payload, "destroyed", list, ""))
+    payloads = _field(payload, "payloads", list, "") if "payloads" in payload else [payload]
+    table_id = _table_id()
+    for i, item in enumerate(payloads):
+        if item is None:
+            continue
+        if not isinstance(item, dict):
+            raise ValueError(f"payloads[{i}] must be a JSON object")
+        for tbl, changes in _field(item, "changedTablesById", dict, f"payloads[{i}].").items():
+            if tbl != table_id:
+                continue
+            if not isinstance(changes, dict):
+                raise ValueError(f"changedTablesById.{tbl} must be a JSON object")
+            where = f"changedTablesById.{tbl}."
+            changed.extend(_field(changes, "createdRecordsById", dict, where).keys())
+            changed.extend(_field(changes, "changedRecordsById", dict, where).keys())
+            destroyed.extend(_field(changes, "destroyedRecordIds", list, where))
+    if not all(isinstance(record_id, str) for record_id in changed + destroyed):
+        raise ValueError("Record ids must be strings")
+    destroyed = list(dict.fromkeys(destroyed))
+    changed = [record_id for record_id in dict.fromkeys(changed) if record_id not in destroyed]
+    return changed, destroyed
+
+def apply_notification(payload):
+    """
+    Apply a parsed notification body: patch the catalog snapshot (refetching only the changed
+    records) and drop cached PDFs of every region/state card the change affects.
+    Returns a JSON-serializable summary.
+    """
+    changed, destroyed = parse_notification(payload)
+    summary = {"changed": len(changed), "destroyed": len(destroyed), "snapshot_version": None,
+               "changed_scopes": [], "pdf_cache_invalidated": 0}
+    if not changed and not destroyed:
+        return summary
+    report = airtable_utils.apply_record_changes(changed, destroyed)
+    if report is not None:
+        summary["snapshot_version"] = report["to_version"]
+        summary["changed_scopes"] = report["changed_scopes"]
+        summary["pdf_cache_invalidated"] = invalidate_scopes(report["changed_scopes"])
+    with _stats_lock:
+        _stats["applied"] += 1
+        _stats["records_changed"] += len(changed)
+        _stats["records_destroyed"] += len(destroyed)
+        _stats["pdf_cache_invalidated"] += summary["pdf_cache_invalidated"]
+        _stats["last_applied"] = time.time()
+    logger.info("Airtable notification applied: %d changed, %d destroyed, %d cards affected",
+                len(changed), len(destroyed), len(summary["changed_scopes"]))
+    return summary
+
+def get_webhook_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["enabled"] = webhook_enabled()
+    return stats
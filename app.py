@@ -1,13 +1,29 @@
 # Uses Flask to create a web application for generating line card PDFs based on region or state.
-from flask import Flask, render_template, request, jsonify, send_from_directory
-from datetime import datetime
+from flask import Flask, Response, render_template, request, jsonify, make_response, send_from_directory, send_file
 import os
+import json
+import contextvars
 import logging
 import traceback
+from werkzeug.wsgi import ClosingIterator
 
-from airtable_utils import fetch_airtable_records
+from airtable_utils import fetch_airtable_records, get_snapshot_stats, get_last_snapshot_diff, AirtableAPIError
+from airtable_webhook import webhook_enabled, verify_signature, apply_notification, get_webhook_stats, AIRTABLE_WEBHOOK_MAC_HEADER
 from pdf_generator import generate_pdf
 from pdf_generator_state import generate_pdf_state
+from regions import REGION_STATE_MAP, STATE_TO_REGION_MAP
+from http_client import get_http_pool_stats
+from rate_limit import get_rate_limit_stats, AIRTABLE_BACKOFF_MAX
+from logo_cache import get_logo_cache_stats
+from logo_normalize import get_logo_normalize_stats
+from utils import get_image_info_stats, get_fragment_cache_stats
+from pdf_cache import render_cached, render_cached_file, bypass_pdf_cache, linecard_filename, get_pdf_cache_stats
+from catalog_index import linecard_scope
+from jobs import submit_job, get_job
+from metrics import metric_labels, render_metrics
+from profiling import is_admin_token, profile_call, list_profiles, get_profile_file, PROFILE_KINDS
+from output_janitor import ensure_output_janitor, mark_serving, get_output_janitor_stats
+from admin_auth import is_admin_request
 
 logging.basicConfig(level=logging.INFO)
 
@@ -22,24 +38,10 @@ static_temp_logos = os.path.join(static_assets_dir, "temp_logos")
 os.makedirs(static_assets_dir, exist_ok=True)
 os.makedirs(static_temp_logos, exist_ok=True)
 
-# Maps for region and state
-REGION_STATE_MAP = {
-    "midwest": ["illinois", "indiana", "michigan", "wisconsin"],
-    "west": ["california", "nevada", "hawaii", "new mexico"],
-    "east": ["florida", "georgia", "alabama", "tennessee", "kentucky", "north carolina", "south carolina", "virginia",
-             "new york", "massachusetts", "connecticut", "ohio", "pennsylvania", "new jersey", "maryland", "delaware",
-             "rhode island", "maine", "new hampshire", "vermont", "west virginia"],
-    "southwest": ["texas", "arkansas", "oklahoma", "louisiana", "mississippi", "arizona", "tennessee"],
-    "north central": ["minnesota", "north dakota", "south dakota", "iowa", "nebraska", "kansas", "missouri"],
-    "pacific northwest": ["oregon", "washington", "alaska"],
-    "rockies": ["colorado", "utah", "montana", "wyoming", "idaho"]
-}
-
-STATE_TO_REGION_MAP = {
-    state: region
-    for region, states in REGION_STATE_MAP.items()
-    for state in states
-}
+@app.before_request
+def start_janitor():
+    # Started lazily so each gunicorn worker (forked after import) gets its own janitor thread
+    ensure_output_janitor()
 
 @app.before_request
 def log_request():
@@ -56,6 +58,163 @@ def log_request():
 def index():
     return render_template("input_form.html")
 
+def render_regional_linecard(region):
+    """
+    Fetch the records for a region and render its line card into output/.
+    Returns (response_dict, http_status); shared by the synchronous endpoint and background jobs.
+    """
+    filename = linecard_filename(region)
+    output_path = os.path.join("output", filename)
+
+    airtable_records = fetch_airtable_records(region)
+    logging.info("Regional PDF request for region=%s returned %d grouped records", region, len(airtable_records or {}))
+    if not airtable_records:
+        return {"error": "No records found for region"}, 404
+
+    # generate_pdf now uses assets for header/footer; product-image option removed.
+    # Identical inputs (same records, assets and settings) are served from the rendered-PDF cache.
+    render = render_cached(
+        linecard_scope(region),
+        airtable_records,
+        output_path,
+        lambda path: generate_pdf(airtable_records, output_path=path, region=region)
+    )
+
+    # Return a web-accessible URL path (not the filesystem path)
+    url_path = f"/output/{filename}"
+
+    return {
+        "message": f"{region.title()} Line Card PDF generated successfully.",
+        "path": url_path,
+        "url": url_path,
+        "filename": filename,
+        "cached": render["cached"]
+    }, 200
+
+def render_state_linecard(state, region):
+    """
+    Fetch the records for a state and render its line card into output/.
+    Returns (response_dict, http_status); shared by the synchronous endpoint and background jobs.
+    """
+    filename = linecard_filename(region, state)
+    output_path = os.path.join("output", filename)
+
+    airtable_records = fetch_airtable_records(region, state=state)
+    logging.info("State PDF request for state=%s region=%s returned %d grouped records", state, region, len(airtable_records or {}))
+    if not airtable_records:
+        return {"error": "No records found for state"}, 404
+
+    # generate_pdf_state now accepts region + state and uses assets for header/footer and state label
+    render = render_cached(
+        linecard_scope(region, state),
+        airtable_records,
+        output_path,
+        lambda path: generate_pdf_state(airtable_records, output_path=path, region=region, state=state)
+    )
+
+    url_path = f"/output/{filename}"
+
+    return {
+        "message": f"{state.title()} Line Card PDF generated successfully.",
+        "path": url_path,
+        "url": url_path,
+        "filename": filename,
+        "cached": render["cached"]
+    }, 200
+
+def stream_linecard(scope, airtable_records, filename, render):
+    """
+    Render (or fetch from the PDF cache) into a file and send it as the response body, read from
+    disk in chunks rather than held in memory. Nothing is written to output/, so concurrent
+    requests can't clobber each other's files.
+    """
+    result = render_cached_file(scope, airtable_records, render)
+    response = send_file(result["path"], mimetype="application/pdf", download_name=filename, max_age=0)
+    if result["temporary"]:
+        # send_file bodies are direct_passthrough (see serve_output); remove the file when the body closes
+        response.response = ClosingIterator(response.response, lambda: remove_quietly(result["path"]))
+    response.headers["X-Linecard-Cache"] = "hit" if result["cached"] else "miss"
+    return response
+
+def remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def stream_regional_linecard(region):
+    airtable_records = fetch_airtable_records(region)
+    logging.info("Regional PDF stream for region=%s returned %d grouped records", region, len(airtable_records or {}))
+    if not airtable_records:
+        return jsonify({"error": "No records found for region"}), 404
+    return stream_linecard(linecard_scope(region), airtable_records, linecard_filename(region),
+                           lambda path: generate_pdf(airtable_records, output_path=path, region=region))
+
+def stream_state_linecard(state, region):
+    airtable_records = fetch_airtable_records(region, state=state)
+    logging.info("State PDF stream for state=%s region=%s returned %d grouped records", state, region, len(airtable_records or {}))
+    if not airtable_records:
+        return jsonify({"error": "No records found for state"}), 404
+    return stream_linecard(linecard_scope(region, state), airtable_records, linecard_filename(region, state),
+                           lambda path: generate_pdf_state(airtable_records, output_path=path, region=region, state=state))
+
+def profile_token():
+    return request.headers.get("X-Profile-Token") or request.args.get("profile_token")
+
+def profiled_response(label, handler):
+    """
+    Run handler() under the profiler and return its response with an X-Profile-Id header.
+    Profiled requests always render (PDF cache bypassed) and run synchronously, so the profile
+    covers the real work.
+    """
+    with bypass_pdf_cache():
+        result, profile_id = profile_call(label, handler)
+    response = make_response(result)
+    if profile_id:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+def wants_stream(data):
+    # Streaming mode: {"stream": true} in the JSON body, ?mode=stream, or an Accept header asking for a PDF
+    return (bool(data.get("stream")) or request.args.get("mode") == "stream"
+            or request.accept_mimetypes.best == "application/pdf")
+
+def wants_async(data):
+    # Job mode: {"async": true} in the JSON body or ?mode=async
+    return bool(data.get("async")) or request.args.get("mode") == "async"
+
+def job_response(job):
+    """Public view of a job record for the status endpoint."""
+    response = {
+        "job_id": job["id"],
+        "scope": job["scope"],
+        "status": job["status"],
+        "status_url": f"/jobs/{job['id']}",
+    }
+    if job["status"] == "done":
+        response.update(job.get("result") or {})
+    elif job["status"] == "failed":
+        response["error"] = job.get("error") or "Server error generating PDF"
+    return response
+
+def submit_linecard_job(scope, render):
+    # Run the render on the job pool inside an app context (static folder resolution, logging),
+    # carrying the request's metric labels over to the worker thread
+    context = contextvars.copy_context()
+    def run():
+        with app.app_context():
+            return context.run(render)
+    job, created = submit_job(scope, run)
+    response = job_response(job)
+    response["attached"] = not created
+    return jsonify(response), 202
+
+def airtable_busy_response(e):
+    # Airtable kept answering 429 after every retry: ask the client to come back instead of failing with a 500
+    response = jsonify({"error": "Airtable is rate limiting requests; try again shortly.", "detail": str(e)})
+    response.headers["Retry-After"] = str(int(AIRTABLE_BACKOFF_MAX))
+    return response, 503
+
 @app.route("/generate-pdf/regional", methods=["POST", "GET", "OPTIONS"])
 def generate_regional_pdf():
     # If a non-POST reached this endpoint, return a JSON explanation (helps debugging when JS isn't running)
@@ -69,31 +228,25 @@ def generate_regional_pdf():
         if region not in REGION_STATE_MAP:
             return jsonify({"error": "Invalid region name."}), 400
 
-        timestamp = datetime.now().strftime("%Y%m%d")
-        filename = f"{region}_Linecard_{timestamp}.pdf"
-        output_path = os.path.join("output", filename)
-
-        airtable_records = fetch_airtable_records(region)
-        logging.info("Regional PDF request for region=%s returned %d grouped records", region, len(airtable_records or {}))
-        if not airtable_records:
-            return jsonify({"error": "No records found for region"}), 404
-
-        # generate_pdf now uses assets for header/footer; product-image option removed
-        generate_pdf(
-            airtable_records,
-            output_path=output_path,
-            region=region
-        )
-
-        # Return a web-accessible URL path (not the filesystem path)
-        url_path = f"/output/{filename}"
-
-        return jsonify({
-            "message": f"{region.title()} Line Card PDF generated successfully.",
-            "path": url_path,
-            "url": url_path,
-            "filename": filename
-        })
+        with metric_labels(endpoint="regional", region=region):
+            if is_admin_token(profile_token()):
+                if wants_stream(data):
+                    return profiled_response(f"regional-{region}", lambda: stream_regional_linecard(region))
+                return profiled_response(f"regional-{region}", lambda: render_regional_linecard(region))
+
+            if wants_stream(data):
+                return stream_regional_linecard(region)
+
+            if wants_async(data):
+                return submit_linecard_job(linecard_scope(region), lambda: render_regional_linecard(region))
+
+            response, status = render_regional_linecard(region)
+            return jsonify(response), status
+    except AirtableAPIError as e:
+        if e.status_code == 429:
+            return airtable_busy_response(e)
+        logging.error("Error generating regional PDF: %s", traceback.format_exc())
+        return jsonify({"error": "Server error generating PDF", "detail": str(e)}), 500
     except Exception as e:
         logging.error("Error generating regional PDF: %s", traceback.format_exc())
         return jsonify({"error": "Server error generating PDF", "detail": str(e)}), 500
@@ -112,38 +265,128 @@ def generate_state_pdf():
         if not region:
             return jsonify({"error": "Invalid state name."}), 400
 
-        timestamp = datetime.now().strftime("%Y%m%d")
-        filename = f"{state.replace(' ', '_')}_Linecard_{timestamp}.pdf"
-        output_path = os.path.join("output", filename)
-
-        airtable_records = fetch_airtable_records(region, state=state)
-        logging.info("State PDF request for state=%s region=%s returned %d grouped records", state, region, len(airtable_records or {}))
-        if not airtable_records:
-            return jsonify({"error": "No records found for state"}), 404
-
-        # generate_pdf_state now accepts region + state and uses assets for header/footer and state label
-        generate_pdf_state(
-            airtable_records,
-            output_path=output_path,
-            region=region,
-            state=state
-        )
-
-        url_path = f"/output/{filename}"
-
-        return jsonify({
-            "message": f"{state.title()} Line Card PDF generated successfully.",
-            "path": url_path,
-            "url": url_path,
-            "filename": filename
-        })
+        with metric_labels(endpoint="state", region=region, state=state):
+            if is_admin_token(profile_token()):
+                if wants_stream(data):
+                    return profiled_response(f"state-{state}", lambda: stream_state_linecard(state, region))
+                return profiled_response(f"state-{state}", lambda: render_state_linecard(state, region))
+
+            if wants_stream(data):
+                return stream_state_linecard(state, region)
+
+            if wants_async(data):
+                return submit_linecard_job(linecard_scope(region, state), lambda: render_state_linecard(state, region))
+
+            response, status = render_state_linecard(state, region)
+            return jsonify(response), status
+    except AirtableAPIError as e:
+        if e.status_code == 429:
+            return airtable_busy_response(e)
+        logging.error("Error generating state PDF: %s", traceback.format_exc())
+        return jsonify({"error": "Server error generating PDF", "detail": str(e)}), 500
     except Exception as e:
         logging.error("Error generating state PDF: %s", traceback.format_exc())
         return jsonify({"error": "Server error generating PDF", "detail": str(e)}), 500
 
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job id."}), 404
+    return jsonify(job_response(job))
+
+@app.route("/catalog/diff", methods=["GET"])
+def catalog_diff():
+    # Which cards the last Airtable snapshot refresh changed (added/removed/changed manufacturers per scope).
+    # Admin-only: it names manufacturers per card (404 unless the admin token matches, see admin_auth.py)
+    if not is_admin_request(request.headers):
+        return jsonify({"error": "Not found."}), 404
+    report = get_last_snapshot_diff()
+    if report is None:
+        return jsonify({"error": "No snapshot refresh has been diffed yet."}), 404
+    return jsonify(report)
+
+@app.route("/airtable/webhook", methods=["POST"])
+def airtable_webhook():
+    # Airtable change notification: refetch the listed records and invalidate the affected cards
+    if not webhook_enabled():
+        return jsonify({"error": "Not found."}), 404
+    body = request.get_data()
+    if not verify_signature(body, request.headers.get(AIRTABLE_WEBHOOK_MAC_HEADER)):
+        logging.warning("Rejected Airtable notification with a bad or missing signature from %s", request.remote_addr)
+        return jsonify({"error": "Invalid signature."}), 401
+    try:
+        summary = apply_notification(json.loads(body))
+    except ValueError as e:
+        return jsonify({"error": "Invalid notification.", "detail": str(e)}), 400
+    except AirtableAPIError as e:
+        logging.error("Airtable refetch for notification failed: %s", e)
+        return jsonify({"error": "Airtable refetch failed", "detail": str(e)}), 502
+    return jsonify(summary)
+
+# /stats fields only returned with the admin token: the last refresh error (it can quote the
+# Airtable URL), the catalog store's lease owner (host:pid) and filesystem paths
+ADMIN_ONLY_STATS_KEYS = frozenset(("last_error", "lease", "path", "dir"))
+
+def redact_stats(value):
+    if isinstance(value, dict):
+        return {k: redact_stats(v) for k, v in value.items() if k not in ADMIN_ONLY_STATS_KEYS}
+    return value
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    # Cache/diagnostic counters for this worker process; the admin token (admin_auth.py) adds the
+    # ADMIN_ONLY_STATS_KEYS details
+    report = {
+        "airtable_snapshot": get_snapshot_stats(),
+        "http_pool": get_http_pool_stats(),
+        "airtable_rate_limit": get_rate_limit_stats(),
+        "logo_cache": get_logo_cache_stats(),
+        "logo_normalize": get_logo_normalize_stats(),
+        "image_info": get_image_info_stats(),
+        "fragments": get_fragment_cache_stats(),
+        "pdf_cache": get_pdf_cache_stats(),
+        "output_janitor": get_output_janitor_stats(),
+        "airtable_webhook": get_webhook_stats()
+    }
+    return jsonify(report if is_admin_request(request.headers) else redact_stats(report))
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # Stage histograms and counters for this worker process, in Prometheus text format. Admin-only
+    # like /catalog/diff: its labels list every region and state served (scrape with the bearer token)
+    if not is_admin_request(request.headers):
+        return jsonify({"error": "Not found."}), 404
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/profiles", methods=["GET"])
+def profiles():
+    # Admin-only listing of captured request profiles (404 unless profiling is enabled and the token matches)
+    if not is_admin_token(profile_token()):
+        return jsonify({"error": "Not found."}), 404
+    listing = []
+    for profile in list_profiles():
+        profile = dict(profile)
+        profile["files"] = {kind: f"/profiles/{profile['id']}/{kind}" for kind in PROFILE_KINDS}
+        listing.append(profile)
+    return jsonify({"profiles": listing})
+
+@app.route("/profiles/<profile_id>/<kind>", methods=["GET"])
+def profile_file(profile_id, kind):
+    if not is_admin_token(profile_token()):
+        return jsonify({"error": "Not found."}), 404
+    path = get_profile_file(profile_id, kind)
+    if not path:
+        return jsonify({"error": "Unknown profile."}), 404
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path))
+
 @app.route("/output/<path:filename>")
 def serve_output(filename):
-    return send_from_directory("output", filename)
+    response = send_from_directory("output", filename)
+    # Keep the janitor off this file until the response has been sent. send_file responses are
+    # direct_passthrough, so call_on_close never fires; wrap the body so close() releases it.
+    response.response = ClosingIterator(response.response, mark_serving(os.path.join("output", filename)))
+    return response
 
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,222 @@
+# batch_render.py
+# Render every regional and state line card in one run (e.g. before a trade show).
+# The Airtable catalog is fetched once and every logo is downloaded/normalized once up front;
+# the renders then fan out over a process pool. Each document goes through the same
+# generate_pdf / generate_pdf_state calls and rendered-PDF cache as the web endpoints, so the
+# output is identical and later web requests for the same cards are cache hits.
+#
+# With --incremental, a manifest of the last run in the output folder is diffed against the fresh
+# catalog (catalog_diff.py) and only the cards whose manufacturers changed are regenerated; the
+# others keep their existing PDFs. The diff report is written next to the PDFs.
+#
+#   python batch_render.py [--output-dir batch_output] [--workers N] [--regions east west] [--no-states] [--incremental]
+import argparse
+import json
+import os
+import sys
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import pdf_cache
+from airtable_utils import refresh_airtable_snapshot, get_snapshot_index, get_snapshot_versions, get_snapshot_manifest
+from catalog_diff import build_diff_report
+from catalog_index import lookup_catalog_index, linecard_scope
+from logo_cache import logo_cache_key, atomic_write
+from pdf_generator import generate_pdf
+from pdf_generator_state import generate_pdf_state
+from regions import REGION_STATE_MAP, STATE_TO_REGION_MAP
+from utils import acquire_logo, LOGO_FETCH_WORKERS
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = ".batch_manifest.json"
+DIFF_REPORT_FILENAME = "catalog_diff.json"
+
+def load_batch_manifest(output_dir):
+    """
+    The previous run's {"versions": {record id: version}, "manifests": {scope: {manufacturer: version}},
+    "files": {scope: PDF name}}, or an empty one.
+    """
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    for key in ("versions", "manifests", "files"):
+        manifest.setdefault(key, {})
+    return manifest
+
+def save_batch_manifest(output_dir, manifest):
+    atomic_write(os.path.join(output_dir, MANIFEST_FILENAME), json.dumps(manifest).encode("utf-8"))
+
+def plan_documents(regions=None, include_states=True):
+    """Return [(region, state or None)] for the regional cards and (optionally) every state card."""
+    regions = [r for r in REGION_STATE_MAP if regions is None or r in regions]
+    documents = [(region, None) for region in regions]
+    if include_states:
+        documents.extend((region, state) for state, region in STATE_TO_REGION_MAP.items() if region in regions)
+    return documents
+
+def prefetch_logos(grouped_by_document, max_workers=None):
+    """
+    Download and normalize every distinct logo the planned documents use, once, into the shared
+    logo cache so the render processes only read local files. Returns (distinct, failed).
+    """
+    attachments = {}
+    for grouped in grouped_by_document:
+        for group in grouped.values():
+            records = ([group["parent"]] if group.get("parent") else []) + list(group.get("children") or [])
+            for record in records:
+                logos = record.get("Logos") or []
+                if logos:
+                    key = logo_cache_key(logos[0])
+                    if key:
+                        attachments.setdefault(key, logos[0])
+    failed = 0
+    if attachments:
+        workers = max(1, min(max_workers or LOGO_FETCH_WORKERS, len(attachments)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="logo-prefetch") as pool:
+            for future in as_completed([pool.submit(acquire_logo, a) for a in attachments.values()]):
+                try:
+                    if not future.result():
+                        failed += 1
+                except Exception:
+                    logger.exception("Logo prefetch failed")
+                    failed += 1
+    return len(attachments), failed
+
+def render_document(region, state, airtable_records, output_path):
+    """Process-pool entry point: render one card through the PDF cache. Returns a timing summary."""
+    started = time.perf_counter()
+    if state:
+        render = lambda path: generate_pdf_state(airtable_records, output_path=path, region=region, state=state)
+    else:
+        render = lambda path: generate_pdf(airtable_records, output_path=path, region=region)
+    result = pdf_cache.render_cached(linecard_scope(region, state), airtable_records, output_path, render)
+    return {
+        "seconds": time.perf_counter() - started,
+        "bytes": os.path.getsize(output_path),
+        "cached": result["cached"],
+    }
+
+def _init_worker(use_cache):
+    pdf_cache.PDF_CACHE_ENABLED = pdf_cache.PDF_CACHE_ENABLED and use_cache
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render all regional and state line cards from one Airtable fetch.")
+    parser.add_argument("--output-dir", default="batch_output", help="folder for the PDFs (default: batch_output)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="render processes (default: CPU count)")
+    parser.add_argument("--regions", nargs="+", choices=sorted(REGION_STATE_MAP), help="limit to these regions")
+    parser.add_argument("--no-states", action="store_true", help="only render the regional cards")
+    parser.add_argument("--no-cache", action="store_true", help="re-render even when the PDF cache has a match")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only regenerate cards whose records changed since the last run into --output-dir")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    wall_started = time.perf_counter()
+
+    # One catalog pass; every document is an index lookup
+    started = time.perf_counter()
+    snapshot = refresh_airtable_snapshot()
+    index = get_snapshot_index(snapshot)
+    fetch_seconds = time.perf_counter() - started
+    print(f"Fetched {snapshot['record_count']} Airtable records in {fetch_seconds:.2f}s")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    new_manifest = get_snapshot_manifest(snapshot)
+    previous = load_batch_manifest(args.output_dir)
+    changed_scopes = None
+    if args.incremental:
+        report = build_diff_report(
+            previous["versions"],
+            previous["manifests"],
+            get_snapshot_versions(snapshot),
+            new_manifest,
+        )
+        atomic_write(os.path.join(args.output_dir, DIFF_REPORT_FILENAME), json.dumps(report, indent=2).encode("utf-8"))
+        changed_scopes = set(report["changed_scopes"])
+        records = report["records"]
+        print(f"Catalog diff: {records['added']} added, {records['removed']} removed, {records['changed']} changed records; "
+              f"{len(changed_scopes)} cards affected")
+
+    documents = []
+    skipped = []
+    unchanged = {}  # (region, state) -> existing file name
+    for region, state in plan_documents(args.regions, include_states=not args.no_states):
+        grouped = lookup_catalog_index(index, region, state)
+        if not grouped:
+            skipped.append((region, state))
+            continue
+        scope = linecard_scope(region, state)
+        existing = previous["files"].get(scope)
+        if (changed_scopes is not None and scope not in changed_scopes and existing
+                and os.path.exists(os.path.join(args.output_dir, existing))):
+            unchanged[(region, state)] = existing
+            continue
+        documents.append((region, state, grouped))
+
+    started = time.perf_counter()
+    distinct, failed = prefetch_logos(grouped for _, _, grouped in documents)
+    print(f"Prepared {distinct} logos ({failed} failed) in {time.perf_counter() - started:.2f}s")
+
+    timestamp = datetime.now().strftime("%Y%m%d")
+    results = {}
+    errors = {}
+    workers = max(1, args.workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(not args.no_cache,)) as pool:
+        futures = {}
+        for region, state, grouped in documents:
+            output_path = os.path.join(args.output_dir, pdf_cache.linecard_filename(region, state, timestamp))
+            futures[pool.submit(render_document, region, state, grouped, output_path)] = (region, state, output_path)
+        for future in as_completed(futures):
+            doc = futures[future]
+            try:
+                results[doc] = future.result()
+            except Exception as ex:
+                logger.exception("Render failed for %s/%s", doc[0], doc[1])
+                errors[doc] = str(ex)
+
+    wall_seconds = time.perf_counter() - wall_started
+    print()
+    print(f"{'document':<34} {'seconds':>8} {'bytes':>10}  cached")
+    for region, state, output_path in sorted(futures.values(), key=lambda d: (d[0], d[1] or "")):
+        label = f"{region} / {state}" if state else f"{region} (region)"
+        doc = (region, state, output_path)
+        if doc in results:
+            r = results[doc]
+            print(f"{label:<34} {r['seconds']:8.2f} {r['bytes']:>10}  {'yes' if r['cached'] else 'no'}")
+        else:
+            print(f"{label:<34} {'FAILED':>8}  {errors[doc]}")
+    for (region, state), filename in sorted(unchanged.items(), key=lambda d: (d[0][0], d[0][1] or "")):
+        label = f"{region} / {state}" if state else f"{region} (region)"
+        print(f"{label:<34} {'same':>8}  unchanged, kept {filename}")
+    for region, state in skipped:
+        label = f"{region} / {state}" if state else f"{region} (region)"
+        print(f"{label:<34} {'skipped':>8}  no records")
+
+    # Remember what each card was rendered from. A failed card, or one outside --regions/--no-states
+    # that has an older PDF, keeps its previous manifest so the next diff still flags its changes.
+    manifests = dict(new_manifest)
+    files = {linecard_scope(region, state): filename for (region, state), filename in unchanged.items()}
+    files.update((linecard_scope(region, state), os.path.basename(path)) for region, state, path in results)
+    failed_scopes = {linecard_scope(region, state) for region, state, _ in errors}
+    for scope in failed_scopes | (set(previous["files"]) - set(files)):
+        if scope in previous["manifests"]:
+            manifests[scope] = previous["manifests"][scope]
+        else:
+            manifests.pop(scope, None)
+        if scope in previous["files"]:
+            files[scope] = previous["files"][scope]
+    save_batch_manifest(args.output_dir, {"versions": get_snapshot_versions(snapshot), "manifests": manifests, "files": files})
+
+    render_seconds = sum(r["seconds"] for r in results.values())
+    print()
+    print(f"{len(results)} rendered, {len(unchanged)} unchanged, {len(errors)} failed, {len(skipped)} skipped with {workers} workers")
+    print(f"Total render time {render_seconds:.2f}s, wall time {wall_seconds:.2f}s -> {os.path.abspath(args.output_dir)}")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
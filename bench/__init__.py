@@ -0,0 +1,2 @@
+# Benchmarks and local stand-ins for external services (Airtable, logo CDN).
+# Run modules from the repository root, e.g. `python -m bench.check_query_mode`.
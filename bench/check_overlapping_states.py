@@ -0,0 +1,104 @@
+# check_overlapping_states.py
+# Verifies that the card for a state listed under several regions (regions.OVERLAPPING_STATES,
+# e.g. Tennessee in East and Southwest) lists the manufacturers of all of those regions, each once,
+# in every fetch mode and after a webhook-style patch, and that they end up in the rendered PDF.
+#
+#   python -m bench.check_overlapping_states [--records 400] [--state tennessee]
+import argparse
+import os
+import sys
+import tempfile
+
+# Read at import by the modules below: keep this check away from the real caches and store
+_work_dir = tempfile.mkdtemp(prefix="linecard-overlap-")
+os.environ.setdefault("AIRTABLE_PAT", "fake-token")
+os.environ.setdefault("CATALOG_STORE_PATH", "off")
+os.environ.setdefault("LOGO_CACHE_DIR", os.path.join(_work_dir, "logos"))
+
+from reportlab import rl_config
+
+import airtable_utils
+from bench.fake_airtable import FakeAirtableServer, make_catalog
+from bench.fake_logo_host import FakeLogoServer
+from pdf_generator_state import generate_pdf_state
+from regions import OVERLAPPING_STATES, STATE_TO_REGION_MAP
+
+MODES = ("snapshot", "full", "query", "stream")
+
+def _card_ids(grouped):
+    """Record ids on a card, parents before their children, in card order."""
+    ids = []
+    for group in grouped.values():
+        if group["parent"] is not None:
+            ids.append(group["parent"].id)
+        ids.extend(child.id for child in group["children"])
+    return ids
+
+def _probe_records(state, regions):
+    """One record per region tagged only with that region and state, plus one tagged with all of them."""
+    probes = {}
+    for i, region in enumerate(regions):
+        probes[f"recOVERLAP{i:07d}"] = {
+            "Manufacturer Names": f"Overlap Probe {region.title()} Only",
+            "Region": [region.title()],
+            "Manufacturer States": state.title(),
+            "Description": f"Probe {i}: tagged {region.title()} and {state.title()} only.",
+        }
+    probes["recOVERLAPALLREGN"] = {
+        "Manufacturer Names": "Overlap Probe Every Region",
+        "Region": [region.title() for region in regions],
+        "Manufacturer States": state.title(),
+        "Description": f"Probe {len(regions)}: tagged with every region {state.title()} is in.",
+    }
+    return probes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that overlapping-state cards list every region's manufacturers once.")
+    parser.add_argument("--records", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--state", default="tennessee", choices=sorted(OVERLAPPING_STATES))
+    args = parser.parse_args(argv)
+
+    state = args.state
+    region = STATE_TO_REGION_MAP[state]  # the region the app renders the card under
+    probes = _probe_records(state, OVERLAPPING_STATES[state])
+    late_id, late_fields = probes.popitem()  # added after the snapshot is built, through the patch path
+
+    failures = []
+    with FakeLogoServer() as logo_server:
+        catalog = make_catalog(args.records, seed=args.seed, logo_url_base=logo_server.base_url)
+        catalog += [{"id": record_id, "createdTime": "2024-01-01T00:00:00.000Z", "fields": fields}
+                    for record_id, fields in probes.items()]
+        with FakeAirtableServer(catalog) as server:
+            airtable_utils.AIRTABLE_URL = server.table_url
+            airtable_utils.get_airtable_snapshot()
+            server.upsert_record(late_id, late_fields)
+            airtable_utils.apply_record_changes([late_id])
+            probes[late_id] = late_fields
+
+            cards = {mode: airtable_utils.fetch_airtable_records(region, state=state, mode=mode) for mode in MODES}
+            for mode, grouped in cards.items():
+                ids = _card_ids(grouped)
+                missing = [record_id for record_id in probes if record_id not in ids]
+                duplicated = sorted({record_id for record_id in ids if ids.count(record_id) > 1})
+                same = ids == _card_ids(cards["full"])
+                print(f"{mode:<9} {len(ids):>5} records  missing {len(missing)}  duplicated {len(duplicated)}  "
+                      f"{'same as full' if same else 'DIFFERS FROM FULL'}")
+                if missing or duplicated or not same:
+                    failures.append(mode)
+
+            # a parent row shows its logo and description, not its name; look for the description text
+            rl_config.pageCompression = 0
+            report = generate_pdf_state(cards["snapshot"], None, region, state)
+            for fields in probes.values():
+                name = fields["Manufacturer Names"]
+                found = fields["Description"].encode() in report["pdf"]
+                print(f"{'rendered' if found else 'NOT RENDERED':<12} {name}")
+                if not found:
+                    failures.append(name)
+
+    print(f"{state} card ({region} art): {'ok' if not failures else 'FAILED: ' + ', '.join(failures)}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
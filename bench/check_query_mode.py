@@ -0,0 +1,60 @@
+# check_query_mode.py
+# Verifies that the server-side query mode of fetch_airtable_records (filterByFormula + fields[])
+# groups exactly like the client-side path, using the local Airtable stand-in.
+# Also prints pages and bytes moved by each path.
+#
+#   python -m bench.check_query_mode [--records 2000]
+import argparse
+import os
+import sys
+
+import airtable_utils
+from bench.fake_airtable import FakeAirtableServer, make_catalog, SYNTHETIC_REGIONS
+
+def _projected(grouped, fields):
+    """Reduce a grouped dict of CatalogRecords to comparable dicts of the projected fields."""
+    def project(record):
+        if record is None:
+            return None
+        return {k: v for k, v in record.as_fields().items() if k in fields}
+    return {
+        parent: {"parent": project(g["parent"]), "children": [project(c) for c in g["children"]]}
+        for parent, g in grouped.items()
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare query-mode and client-side grouping against a local Airtable stand-in.")
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("AIRTABLE_PAT", "fake-token")
+    records = make_catalog(args.records, seed=args.seed)
+    scopes = [(region.lower(), None) for region in SYNTHETIC_REGIONS]
+    scopes += [(region.lower(), state.lower()) for region, states in SYNTHETIC_REGIONS.items() for state in states]
+
+    failures = 0
+    with FakeAirtableServer(records) as server:
+        airtable_utils.AIRTABLE_URL = server.table_url
+        print(f"{'scope':<32} {'full pages':>10} {'full bytes':>12} {'query pages':>11} {'query bytes':>12}  result")
+        for region, state in scopes:
+            server.reset_stats()
+            full = airtable_utils.fetch_airtable_records(region, state=state, mode="full")
+            full_stats = dict(server.stats)
+
+            server.reset_stats()
+            query = airtable_utils.fetch_airtable_records(region, state=state, mode="query")
+            query_stats = dict(server.stats)
+
+            fields = airtable_utils.AIRTABLE_QUERY_FIELDS
+            same = _projected(full, fields) == _projected(query, fields)
+            failures += 0 if same else 1
+            scope = region + (f"/{state}" if state else "")
+            print(f"{scope:<32} {full_stats['requests']:>10} {full_stats['bytes']:>12} "
+                  f"{query_stats['requests']:>11} {query_stats['bytes']:>12}  {'ok' if same else 'MISMATCH'}")
+
+    print(f"{len(scopes) - failures}/{len(scopes)} scopes grouped identically")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+# fake_airtable.py
+# Local stand-in for the Airtable list-records API used by airtable_utils.
+# Serves a synthetic manufacturer catalog with pagination, fields[] projection and the subset of
+# filterByFormula that airtable_utils.build_airtable_filter_formula produces.
+# Counts pages and response bytes so fetch strategies can be compared.
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Small built-in geography for synthetic data (mirrors the shape of the app's region map)
+SYNTHETIC_REGIONS = {
+    "Midwest": ["Illinois", "Indiana", "Michigan", "Wisconsin"],
+    "West": ["California", "Nevada", "Hawaii", "New Mexico"],
+    "East": ["Florida", "Georgia", "Tennessee", "New York", "Ohio"],
+    "Southwest": ["Texas", "Arizona", "Tennessee"],
+    "North Central": ["Minnesota", "Iowa", "Missouri"],
+    "Pacific Northwest": ["Oregon", "Washington", "Alaska"],
+    "Rockies": ["Colorado", "Utah", "Idaho"],
+}
+
+# RECORD_ID() = "rec..." (airtable_utils.build_record_id_formula)
+_RECORD_ID_CLAUSE = re.compile(r'RECORD_ID\(\) = "((?:[^"\\]|\\.)*)"')
+
+# FIND(",needle,", "," & REGEX_REPLACE(TRIM(LOWER({Field} & "")), " *, *", ",") & ",")
+_FIND_CLAUSE = re.compile(
+    r'FIND\("((?:[^"\\]|\\.)*)", "," & REGEX_REPLACE\(TRIM\(LOWER\(\{([^}]+)\} & ""\)\), " \*, \*", ","\) & ","\)'
+)
+
+def make_catalog(n_records, seed=0, logo_url_base="https://logos.invalid", children_ratio=0.3,
+                 description_words=30, extra_fields=True):
+    """
+    Build n_records synthetic Airtable records ({"id", "createdTime", "fields"}).
+    Roughly children_ratio of the records are children of an earlier parent.
+    extra_fields adds columns the line card never reads, like a real wide table.
+    """
+    rng = random.Random(seed)
+    regions = list(SYNTHETIC_REGIONS)
+    words = ["industrial", "valve", "pump", "control", "flow", "steam", "heat", "pipe", "sensor", "meter",
+             "filter", "boiler", "seal", "gauge", "motor", "drive", "safety", "process", "quality", "service"]
+    records = []
+    parents = []
+    for i in range(n_records):
+        name = f"Manufacturer {i:05d}"
+        record_regions = rng.sample(regions, k=rng.choice([1, 1, 1, 2]))
+        states = sorted({s for reg in record_regions for s in rng.sample(SYNTHETIC_REGIONS[reg], k=rng.randint(1, len(SYNTHETIC_REGIONS[reg])))})
+        fields = {
+            "Manufacturer Names": name,
+            "Description": " ".join(rng.choice(words) for _ in range(description_words)).capitalize() + ".",
+            "Region": record_regions,
+            "Manufacturer States": ", ".join(states),
+            "Logos": [{
+                "id": f"att{i:05d}",
+                "url": f"{logo_url_base}/logo/{i:05d}.png",
+                "filename": f"logo_{i:05d}.png",
+                "type": "image/png",
+            }],
+        }
+        if parents and rng.random() < children_ratio:
+            parent = rng.choice(parents)
+            fields["Parent"] = parent["Manufacturer Names"]
+            fields["Region"] = list(parent["Region"])
+            fields["Manufacturer States"] = parent["Manufacturer States"]
+        else:
+            parents.append(fields)
+        if extra_fields:
+            fields["Notes"] = " ".join(rng.choice(words) for _ in range(80))
+            fields["Website"] = f"https://example.invalid/{i:05d}"
+            fields["Contact Email"] = f"sales{i:05d}@example.invalid"
+            fields["Internal Rating"] = rng.randint(1, 5)
+        records.append({"id": f"rec{i:014d}", "createdTime": "2024-01-01T00:00:00.000Z", "fields": fields})
+    return records
+
+def _airtable_list_text(value):
+    """Emulate Airtable's `{Field} & ""` coercion (arrays are joined with ', ')."""
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return ", ".join(str(v) for v in value)
+    return str(value)
+
+def compile_formula(formula):
+    """
+    Turn a filterByFormula produced by build_airtable_filter_formula or build_record_id_formula
+    into a predicate over records. Returns None if the formula is not in the supported subset.
+    """
+    formula = (formula or "").strip()
+    if not formula:
+        return lambda record: True
+    ids = _compile_record_ids(formula)
+    if ids is not None:
+        return lambda record: record["id"] in ids
+    body = formula
+    if body.startswith("AND(") and body.endswith(")"):
+        body = body[4:-1]
+    clauses = []
+    pos = 0
+    for m in _FIND_CLAUSE.finditer(body):
+        gap = body[pos:m.start()].strip()
+        if gap not in ("", ","):
+            return None
+        needle = m.group(1).replace('\\"', '"').replace("\\\\", "\\")
+        clauses.append((needle, m.group(2)))
+        pos = m.end()
+    if not clauses or body[pos:].strip():
+        return None
+
+    def predicate(record):
+        for needle, field in clauses:
+            text = _airtable_list_text(record["fields"].get(field)).lower().strip()
+            haystack = "," + re.sub(r" *, *", ",", text) + ","
+            if needle not in haystack:
+                return False
+        return True
+    return predicate
+
+def _compile_record_ids(formula):
+    """Set of ids for a RECORD_ID() = "..." formula (optionally OR()-ed), else None."""
+    body = formula
+    if body.startswith("OR(") and body.endswith(")"):
+        body = body[3:-1]
+    ids = set()
+    pos = 0
+    for m in _RECORD_ID_CLAUSE.finditer(body):
+        if body[pos:m.start()].strip() not in ("", ","):
+            return None
+        ids.add(m.group(1).replace('\\"', '"').replace("\\\\", "\\"))
+        pos = m.end()
+    if not ids or body[pos:].strip():
+        return None
+    return ids
+
+class FakeAirtableServer:
+    """
+    Threaded HTTP server answering GET <base>/v0/<base_id>/<table_id> like Airtable's list endpoint.
+
+    Usage:
+        with FakeAirtableServer(records) as server:
+            airtable_utils.AIRTABLE_URL = server.table_url
+
+    With rate_limit set, like the real API it answers 429 (with Retry-After: retry_after, if given)
+    to requests beyond rate_limit per rolling second.
+    """
+    def __init__(self, records, page_size=100, latency=0.0, host="127.0.0.1", port=0,
+                 rate_limit=None, retry_after=None):
+        self.records = records
+        self.page_size = page_size
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self._recent = []  # arrival times within the last second
+        self.known_fields = set()
+        for r in records:
+            self.known_fields.update(r["fields"].keys())
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def table_url(self):
+        return f"{self.base_url}/v0/appFAKE/tblFAKE"
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = {"requests": 0, "bytes": 0, "errors": 0, "rate_limited": 0}
+
+    def upsert_record(self, record_id, fields):
+        """Create record_id, or merge fields into it (a None value clears that field), like a table edit."""
+        with self.stats_lock:
+            records = list(self.records)
+            for i, r in enumerate(records):
+                if r["id"] == record_id:
+                    merged = {**r["fields"], **fields}
+                    records[i] = {**r, "fields": {k: v for k, v in merged.items() if v is not None}}
+                    break
+            else:
+                records.append({"id": record_id, "createdTime": "2024-01-01T00:00:00.000Z",
+                                "fields": {k: v for k, v in fields.items() if v is not None}})
+            self.records = records
+            self.known_fields.update(fields)
+
+    def delete_record(self, record_id):
+        with self.stats_lock:
+            self.records = [r for r in self.records if r["id"] != record_id]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-airtable", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _over_rate_limit(self):
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        with self.stats_lock:
+            self._recent = [t for t in self._recent if now - t < 1.0]
+            if len(self._recent) >= self.rate_limit:
+                self.stats["rate_limited"] += 1
+                return True
+            self._recent.append(now)
+        return False
+
+    def list_records(self, query):
+        """Return (status, payload) for a parsed query string dict."""
+        fields = query.get("fields[]") or query.get("fields") or []
+        unknown = [f for f in fields if f not in self.known_fields]
+        if unknown:
+            return 422, {"error": {"type": "UNKNOWN_FIELD_NAME", "message": f"Unknown field name: {unknown[0]!r}"}}
+
+        predicate = compile_formula((query.get("filterByFormula") or [""])[0])
+        if predicate is None:
+            return 422, {"error": {"type": "INVALID_FILTER_BY_FORMULA", "message": "Unsupported formula"}}
+
+        with self.stats_lock:
+            records = list(self.records)
+        matching = [r for r in records if predicate(r)]
+        try:
+            offset = int((query.get("offset") or ["0"])[0])
+            page_size = min(int((query.get("pageSize") or [self.page_size])[0]), self.page_size)
+        except ValueError:
+            return 422, {"error": {"type": "INVALID_OFFSET_VALUE", "message": "Bad offset"}}
+
+        page = matching[offset:offset + page_size]
+        if fields:
+            page = [{**r, "fields": {k: v for k, v in r["fields"].items() if k in fields}} for r in page]
+        payload = {"records": page}
+        if offset + page_size < len(matching):
+            payload["offset"] = str(offset + page_size)
+        return 200, payload
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                parsed = urlparse(self.path)
+                extra_headers = {}
+                if server._over_rate_limit():
+                    status, payload = 429, {"errors": [{"error": "RATE_LIMIT_REACHED",
+                                                        "message": "Rate limit exceeded. Please try again later"}]}
+                    if server.retry_after is not None:
+                        extra_headers["Retry-After"] = str(server.retry_after)
+                elif not self.headers.get("Authorization", "").startswith("Bearer "):
+                    status, payload = 401, {"error": "AUTHENTICATION_REQUIRED"}
+                else:
+                    status, payload = server.list_records(parse_qs(parsed.query))
+                body = json.dumps(payload).encode("utf-8")
+                with server.stats_lock:
+                    server.stats["requests"] += 1
+                    server.stats["bytes"] += len(body)
+                    if status != 200:
+                        server.stats["errors"] += 1
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                for name, value in extra_headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,137 @@
+# fake_logo_host.py
+# Local stand-in for the logo CDN that Airtable attachment URLs point at.
+# Serves deterministic synthetic logos for /logo/<n>.<ext> in a mix of sizes and formats
+# (small flat PNGs, large transparent PNGs, photo-like JPEGs) so logo download,
+# normalization and embedding costs resemble real uploads. Images are generated on first
+# request and kept in memory.
+import io
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image, ImageDraw
+
+# (width, height, kind) picked by logo number; large entries mimic print-resolution uploads
+LOGO_PROFILES = [
+    (240, 90, "flat"),
+    (600, 200, "flat"),
+    (1200, 400, "alpha"),
+    (1600, 1000, "photo"),
+    (3000, 1200, "alpha"),
+]
+
+def make_logo(n, profile=None):
+    """Return (bytes, content_type) for synthetic logo number n."""
+    rng = random.Random(n)
+    width, height, kind = profile or LOGO_PROFILES[n % len(LOGO_PROFILES)]
+    colour = (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255))
+    buf = io.BytesIO()
+    if kind == "photo":
+        # smooth gradient plus noise: many colours, so it stays a JPEG after normalization
+        im = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+        noise = Image.effect_noise((width, height), 40).convert("RGB")
+        im = Image.blend(im, noise, 0.3)
+        im = Image.blend(im, Image.new("RGB", (width, height), colour), 0.4)
+        im.save(buf, "JPEG", quality=92)
+        return buf.getvalue(), "image/jpeg"
+    mode = "RGBA" if kind == "alpha" else "RGB"
+    background = (255, 255, 255, 0) if kind == "alpha" else (255, 255, 255)
+    im = Image.new(mode, (width, height), background)
+    draw = ImageDraw.Draw(im)
+    for _ in range(6):
+        x0, y0 = rng.randint(0, width // 2), rng.randint(0, height // 2)
+        x1, y1 = rng.randint(x0 + 1, width), rng.randint(y0 + 1, height)
+        draw.rectangle((x0, y0, x1, y1), fill=colour + ((255,) if kind == "alpha" else ()))
+    im.save(buf, "PNG")
+    return buf.getvalue(), "image/png"
+
+class FakeLogoServer:
+    """
+    Threaded HTTP server answering GET /logo/<n>.<ext> with synthetic logo n.
+
+    latency delays every response; every missing_every-th logo (n % missing_every == 1) is a 404,
+    like a deleted CDN object. Use base_url as make_catalog's logo_url_base.
+    """
+    def __init__(self, latency=0.0, missing_every=0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.missing_every = missing_every
+        self._images = {}
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = {"requests": 0, "bytes": 0, "not_found": 0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-logo-host", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def get_logo(self, n):
+        """Return (bytes, content_type) for logo n, or None if it is configured as missing."""
+        if self.missing_every and n % self.missing_every == 1:
+            return None
+        with self.stats_lock:
+            cached = self._images.get(n)
+        if cached is None:
+            cached = make_logo(n)
+            with self.stats_lock:
+                self._images[n] = cached
+        return cached
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                try:
+                    n = int(self.path.rsplit("/", 1)[-1].split(".")[0])
+                    logo = server.get_logo(n)
+                except ValueError:
+                    logo = None
+                with server.stats_lock:
+                    server.stats["requests"] += 1
+                    if logo is None:
+                        server.stats["not_found"] += 1
+                    else:
+                        server.stats["bytes"] += len(logo[0])
+                if logo is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body, content_type = logo
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
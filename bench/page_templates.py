@@ -0,0 +1,67 @@
+# page_templates.py
+# Compares the page decorator drawing header/footer images on every page against the
+# precompiled form XObject templates, on a 30-page document using the real region assets.
+#
+#   python -m bench.page_templates [--region east] [--pages 30] [--repeat 5]
+import argparse
+import io
+import statistics
+import sys
+import time
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, PageBreak
+
+from utils import make_page_decorator, get_asset_image_path, compute_image_display_height
+
+def build_document(region, pages, use_templates, state_name=None):
+    """Build a pages-long document in memory; returns (seconds, pdf_bytes)."""
+    page_width, _ = letter
+    header2_h = compute_image_display_height(get_asset_image_path(f"{region}Logo_2"), page_width) or (0.9 * inch)
+    footer_h = compute_image_display_height(get_asset_image_path(f"{region}Footer"), page_width) or (0.5 * inch)
+
+    style = getSampleStyleSheet()["Normal"]
+    elements = []
+    for page in range(pages):
+        elements.append(Paragraph(f"Page {page + 1} body text.", style))
+        if page < pages - 1:
+            elements.append(PageBreak())
+
+    buf = io.BytesIO()
+    doc = SimpleDocTemplate(buf, pagesize=letter, topMargin=header2_h + 10, bottomMargin=footer_h + 6,
+                            leftMargin=36, rightMargin=36)
+    decorator = make_page_decorator(region, state_name=state_name, use_templates=use_templates)
+    started = time.perf_counter()
+    doc.build(elements, onFirstPage=decorator, onLaterPages=decorator)
+    return time.perf_counter() - started, buf.getvalue()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark per-page header/footer drawing vs form XObject templates.")
+    parser.add_argument("--region", default="east")
+    parser.add_argument("--state", default=None, help="optional state label for page 1")
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    # warm the asset registry and image metadata cache so both variants start equal
+    build_document(args.region, 1, False, args.state)
+
+    results = {}
+    for label, use_templates in (("per-page drawImage", False), ("form XObject templates", True)):
+        timings = []
+        size = 0
+        for _ in range(args.repeat):
+            seconds, pdf = build_document(args.region, args.pages, use_templates, args.state)
+            timings.append(seconds)
+            size = len(pdf)
+        results[label] = (statistics.median(timings), size)
+
+    print(f"{args.pages}-page {args.region} document, median of {args.repeat} builds")
+    for label, (seconds, size) in results.items():
+        print(f"  {label:<24} {seconds * 1000:8.1f} ms  {size:>10} bytes")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
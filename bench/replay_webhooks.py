@@ -0,0 +1,137 @@
+# replay_webhooks.py
+# Replays recorded Airtable change notifications (bench/fixtures/airtable_webhooks.json) against
+# the /airtable/webhook endpoint. By default everything runs locally: each fixture's mutations are
+# applied to the Airtable stand-in, the signed payload is posted through the Flask test client,
+# and the patched catalog is checked against a full rebuild from the stand-in's table.
+# PDF cache entries are seeded for every card first so invalidation can be seen.
+# With --url the payloads are only signed and posted to a running server.
+#
+#   python -m bench.replay_webhooks [--records 400] [--fixtures path]
+#   AIRTABLE_WEBHOOK_SECRET=... python -m bench.replay_webhooks --url http://127.0.0.1:5000 --table-id tblXXXX
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "airtable_webhooks.json")
+FIXTURE_TABLE_ID = "tblFAKE"
+
+def load_fixtures(path, table_id=None):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if table_id:
+        text = text.replace(f'"{FIXTURE_TABLE_ID}"', json.dumps(table_id))
+    return json.loads(text)
+
+def _grouped_view(grouped, ordered=True):
+    def view(record):
+        return json.dumps(record.as_fields(), sort_keys=True) if record is not None else None
+    return {
+        parent: (view(group["parent"]), [view(c) for c in group["children"]] if ordered
+                 else sorted(view(c) for c in group["children"]))
+        for parent, group in grouped.items()
+    }
+
+def _index_view(index, ordered=True):
+    view = {f"region:{region}": _grouped_view(grouped, ordered) for region, grouped in index["regions"].items()}
+    for region, region_states in index["states"].items():
+        for state, grouped in region_states.items():
+            view[f"state:{region}/{state}"] = _grouped_view(grouped, ordered)
+    return view
+
+def check_patched_index(patched, table_records):
+    """Compare a patched index with a rebuild from the table: "ok", "order" (children order only) or "MISMATCH"."""
+    from catalog_index import build_catalog_index
+    rebuilt = build_catalog_index(table_records)
+    if _index_view(patched) == _index_view(rebuilt):
+        return "ok"
+    if _index_view(patched, ordered=False) == _index_view(rebuilt, ordered=False):
+        return "order"
+    return "MISMATCH"
+
+def replay_local(args):
+    os.environ.setdefault("AIRTABLE_PAT", "fake-token")
+    cache_dir = tempfile.mkdtemp(prefix="linecard-webhooks-")
+    os.environ["PDF_CACHE_DIR"] = os.path.join(cache_dir, "pdfs")
+    os.environ["CATALOG_STORE_PATH"] = os.path.join(cache_dir, "catalog.sqlite3")
+    os.environ.setdefault("AIRTABLE_WEBHOOK_SECRET", base64.b64encode(os.urandom(32)).decode("ascii"))
+
+    import airtable_utils
+    import airtable_webhook
+    import pdf_cache
+    from app import app
+    from bench.fake_airtable import FakeAirtableServer, make_catalog
+
+    fixtures = load_fixtures(args.fixtures)
+    failures = 0
+    with FakeAirtableServer(make_catalog(args.records, seed=args.seed)) as server:
+        airtable_utils.AIRTABLE_URL = server.table_url
+        snapshot = airtable_utils.get_airtable_snapshot()
+        manifest = airtable_utils.get_snapshot_manifest(snapshot)
+        for scope in manifest:
+            pdf_cache.store_pdf_bytes(hashlib.sha1(scope.encode("utf-8")).hexdigest(), b"%PDF-1.4 placeholder\n", scope)
+        print(f"Loaded {snapshot['record_count']} records, seeded {len(manifest)} cached cards")
+
+        client = app.test_client()
+        body = b'{"changed": ["rec00000000000000"]}'
+        status = client.post("/airtable/webhook", data=body,
+                             headers={airtable_webhook.AIRTABLE_WEBHOOK_MAC_HEADER: "hmac-sha256=" + "0" * 64}).status_code
+        print(f"{'forged signature':<52} HTTP {status}  {'ok' if status == 401 else 'MISMATCH'}")
+        failures += 0 if status == 401 else 1
+
+        print(f"{'notification':<52} {'status':>6} {'records':>7} {'cards':>5} {'dropped':>7} {'requests':>8}  index")
+        for fixture in fixtures:
+            for mutation in fixture.get("mutations", []):
+                if mutation["op"] == "delete":
+                    server.delete_record(mutation["id"])
+                else:
+                    server.upsert_record(mutation["id"], mutation.get("fields", {}))
+            body = json.dumps(fixture["payload"]).encode("utf-8")
+            server.reset_stats()
+            response = client.post("/airtable/webhook", data=body, content_type="application/json",
+                                   headers={airtable_webhook.AIRTABLE_WEBHOOK_MAC_HEADER: airtable_webhook.sign_body(body)})
+            summary = response.get_json() or {}
+            result = check_patched_index(airtable_utils.get_snapshot_index(airtable_utils.get_airtable_snapshot()), server.records)
+            if response.status_code != 200 or result == "MISMATCH":
+                failures += 1
+            print(f"{fixture['name'][:52]:<52} {response.status_code:>6} "
+                  f"{summary.get('changed', 0) + summary.get('destroyed', 0):>7} {len(summary.get('changed_scopes', [])):>5} "
+                  f"{summary.get('pdf_cache_invalidated', 0):>7} {server.stats['requests']:>8}  {result}")
+
+    print(f"{len(fixtures) + 1 - failures}/{len(fixtures) + 1} notifications handled as expected")
+    return 1 if failures else 0
+
+def replay_remote(args):
+    import requests
+    import airtable_webhook
+
+    if not airtable_webhook.webhook_enabled():
+        print("Set AIRTABLE_WEBHOOK_SECRET to the secret the server uses", file=sys.stderr)
+        return 2
+    url = args.url.rstrip("/") + "/airtable/webhook"
+    failures = 0
+    for fixture in load_fixtures(args.fixtures, args.table_id):
+        body = json.dumps(fixture["payload"]).encode("utf-8")
+        response = requests.post(url, data=body, timeout=60, headers={
+            "Content-Type": "application/json",
+            airtable_webhook.AIRTABLE_WEBHOOK_MAC_HEADER: airtable_webhook.sign_body(body),
+        })
+        failures += 0 if response.status_code == 200 else 1
+        print(f"{fixture['name'][:52]:<52} HTTP {response.status_code} {response.text.strip()[:120]}")
+    return 1 if failures else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded Airtable change notifications against the webhook endpoint.")
+    parser.add_argument("--fixtures", default=FIXTURES)
+    parser.add_argument("--records", type=int, default=400, help="synthetic catalog size (local mode)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="post to a running server instead of replaying locally")
+    parser.add_argument("--table-id", help=f"table id to substitute for {FIXTURE_TABLE_ID} (with --url)")
+    args = parser.parse_args(argv)
+    return replay_remote(args) if args.url else replay_local(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+# run_bench.py
+# End-to-end benchmark of the line card pipeline against local Airtable and logo-CDN stand-ins.
+# For each catalog size it times fetch_airtable_records (cold snapshot and warm), logo acquisition
+# (cold and warm logo cache), build_table_content (parsed paragraph cache off, cold and all hits),
+# generate_pdf and generate_pdf_state, records
+# tracemalloc peaks and PDF sizes, and writes everything to a JSON file for comparing runs.
+# Caches live in a temp directory per scenario, so every scenario starts cold.
+#
+#   python -m bench.run_bench [--records 50 500 2000] [--latency 0.05] [--logo-latency 0.01]
+#                             [--region southwest --state texas] [--repeat 3] [--compare old.json]
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import airtable_utils
+import logo_cache
+import utils
+from bench.fake_airtable import FakeAirtableServer, make_catalog
+from bench.fake_logo_host import FakeLogoServer
+from pdf_generator import generate_pdf
+from pdf_generator_state import generate_pdf_state
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def measure(func, repeat=1, trace_memory=True, setup=None):
+    """
+    Run func repeat times (calling setup() before each run, untimed) and return
+    (last_result, {"seconds": median, "runs": [...], "peak_bytes": int or None}).
+    Memory is traced in one extra run so tracemalloc overhead doesn't skew the timings.
+    """
+    runs = []
+    result = None
+    for _ in range(max(1, repeat)):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - started)
+    peak = None
+    if trace_memory:
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, {"seconds": round(statistics.median(runs), 6), "runs": [round(r, 6) for r in runs], "peak_bytes": peak}
+
+def _reset_snapshot():
+    airtable_utils._snapshot = None
+
+def _reset_fragments():
+    with utils._fragment_lock:
+        utils._fragment_cache.clear()
+
+def run_scenario(n_records, args, logo_server):
+    """Benchmark every stage for one catalog size. Returns the scenario result dict."""
+    catalog = make_catalog(n_records, seed=args.seed, logo_url_base=logo_server.base_url)
+    stages = {}
+    with FakeAirtableServer(catalog, latency=args.latency) as airtable, \
+            tempfile.TemporaryDirectory(prefix="linecard-bench-") as cache_dir:
+        airtable_utils.AIRTABLE_URL = airtable.table_url
+        logo_cache.LOGO_CACHE_DIR = os.path.join(cache_dir, "logos")
+
+        def cold_fetch_setup():
+            _reset_snapshot()
+            airtable.reset_stats()
+
+        # Airtable: a cold fetch walks every page; a warm one is served from the snapshot index
+        records, stages["fetch_cold"] = measure(lambda: airtable_utils.fetch_airtable_records(args.region),
+                                                args.repeat, not args.no_memory, setup=cold_fetch_setup)
+        stages["fetch_cold"]["airtable_requests"] = airtable.stats["requests"]
+        stages["fetch_cold"]["airtable_bytes"] = airtable.stats["bytes"]
+        _, stages["fetch_warm"] = measure(lambda: airtable_utils.fetch_airtable_records(args.region),
+                                          args.repeat, not args.no_memory)
+        state_records = airtable_utils.fetch_airtable_records(args.region, state=args.state)
+
+        # Logos: first pass downloads and normalizes, later passes hit the on-disk cache
+        logo_report = {}
+        logo_server.reset_stats()
+        logo_files, stages["logos_cold"] = measure(lambda: utils.fetch_group_logos(records, [], report=logo_report),
+                                                   1, False)
+        stages["logos_cold"].update(logo_report)
+        stages["logos_cold"]["cdn_requests"] = logo_server.stats["requests"]
+        stages["logos_cold"]["cdn_bytes"] = logo_server.stats["bytes"]
+        _, stages["logos_warm"] = measure(lambda: utils.fetch_group_logos(records, []), args.repeat, not args.no_memory)
+
+        # Layout: with the parsed paragraph cache off, cold (every text parsed and kept) and warm (every text a hit)
+        def build_layout():
+            return utils.build_table_content(records, [], logo_files=logo_files)
+
+        cache_size = utils.FRAGMENT_CACHE_SIZE
+        utils.FRAGMENT_CACHE_SIZE = 0
+        try:
+            _, stages["build_table_content_uncached"] = measure(build_layout, args.repeat, not args.no_memory)
+        finally:
+            utils.FRAGMENT_CACHE_SIZE = cache_size
+        _, stages["build_table_content"] = measure(build_layout, args.repeat, not args.no_memory, setup=_reset_fragments)
+        _, stages["build_table_content_hit"] = measure(build_layout, args.repeat, not args.no_memory)
+
+        # Full renders, in memory (logos are warm; paragraph cache cleared so each run parses from scratch)
+        report, stages["generate_pdf"] = measure(lambda: generate_pdf(records, None, args.region),
+                                                 args.repeat, not args.no_memory, setup=_reset_fragments)
+        stages["generate_pdf"]["pdf_bytes"] = len(report["pdf"])
+        if state_records:
+            report, stages["generate_pdf_state"] = measure(
+                lambda: generate_pdf_state(state_records, None, args.region, args.state),
+                args.repeat, not args.no_memory, setup=_reset_fragments)
+            stages["generate_pdf_state"]["pdf_bytes"] = len(report["pdf"])
+
+    return {
+        "records": n_records,
+        "region": args.region,
+        "state": args.state,
+        "region_groups": len(records),
+        "state_groups": len(state_records),
+        "stages": stages,
+    }
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def print_results(results, baseline=None):
+    """Print a stage table per scenario; with a baseline, add the relative change of each median."""
+    previous = {s["records"]: s for s in (baseline or {}).get("scenarios", [])}
+    for scenario in results["scenarios"]:
+        print(f"\n{scenario['records']} records: {scenario['region']} ({scenario['region_groups']} groups), "
+              f"{scenario['state']} ({scenario['state_groups']} groups)")
+        print(f"  {'stage':<28} {'median ms':>10} {'peak MiB':>9} {'pdf KiB':>9}  vs baseline")
+        old_stages = previous.get(scenario["records"], {}).get("stages", {})
+        for name, stage in scenario["stages"].items():
+            peak = f"{stage['peak_bytes'] / 1048576:9.1f}" if stage.get("peak_bytes") is not None else f"{'-':>9}"
+            pdf = f"{stage['pdf_bytes'] / 1024:9.0f}" if stage.get("pdf_bytes") else f"{'-':>9}"
+            delta = ""
+            old = old_stages.get(name)
+            if old and old.get("seconds"):
+                delta = f"{(stage['seconds'] - old['seconds']) / old['seconds'] * 100:+.1f}%"
+            print(f"  {name:<28} {stage['seconds'] * 1000:10.1f} {peak} {pdf}  {delta}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the line card pipeline against local Airtable and logo stand-ins.")
+    parser.add_argument("--records", type=int, nargs="+", default=[50, 500, 2000],
+                        help="catalog sizes to benchmark (50..10000)")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Airtable per-page latency (s)")
+    parser.add_argument("--logo-latency", type=float, default=0.01, help="fake logo host per-request latency (s)")
+    parser.add_argument("--missing-every", type=int, default=0, help="make every Nth logo a 404")
+    parser.add_argument("--region", default="southwest")
+    parser.add_argument("--state", default="texas")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (median is reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    parser.add_argument("--output", help="results file (default: bench/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args(argv)
+
+    for n in args.records:
+        if not 1 <= n <= 10000:
+            parser.error(f"--records values must be between 1 and 10000 (got {n})")
+
+    os.environ.setdefault("AIRTABLE_PAT", "bench")
+    results = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "scenarios": [],
+    }
+    with FakeLogoServer(latency=args.logo_latency, missing_every=args.missing_every) as logo_server:
+        for n in args.records:
+            print(f"Benchmarking {n} records...", flush=True)
+            results["scenarios"].append(run_scenario(n, args, logo_server))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
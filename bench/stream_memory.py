@@ -0,0 +1,172 @@
+# stream_memory.py
+# Peak RSS of fetching and rendering one regional line card as the Airtable table grows.
+# "full" fetches every page into one list, filters it and builds every flowable before doc.build;
+# "stream" groups each page as it arrives (AIRTABLE_FETCH_MODE=stream) and lays the tables out
+# lazily (PDF_STREAM_FLOWABLES). Both render into a file, as the streaming response does. Only the
+# first --card-records manufacturers carry the target region, so the card is the same at every
+# catalog size and any growth in peak RSS comes from the table walk; with --card-fraction the card
+# instead holds that share of the catalog and grows with it, which measures the layout and render.
+# Every run is a fresh subprocess that reports its own VmHWM peak; logos are fetched once up front
+# so all runs read them from the same warm logo cache.
+#
+#   python -m bench.stream_memory [--records 1000 5000 10000 25000 50000] [--modes full stream]
+#                                 [--region Rockies] [--card-records 200 | --card-fraction 0.2]
+#                                 [--output results.json]
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bench.fake_airtable import FakeAirtableServer, make_catalog, SYNTHETIC_REGIONS
+from bench.fake_logo_host import FakeLogoServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FALLBACK_REGION = "Midwest"
+
+def _peak_rss_bytes():
+    # Linux carries ru_maxrss across fork+exec, so a child would report the parent's peak; VmHWM is per process
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+
+def retarget_catalog(catalog, region, card_records):
+    """Tag the first card_records records with region and strip it from the rest (in place)."""
+    fallback = FALLBACK_REGION if region != FALLBACK_REGION else next(r for r in SYNTHETIC_REGIONS if r != region)
+    for i, record in enumerate(catalog):
+        regions = [r for r in record["fields"].get("Region", []) if r != region]
+        if i < card_records:
+            regions.insert(0, region)
+        record["fields"]["Region"] = regions or [fallback]
+    return catalog
+
+def run_child(mode, region):
+    """Fetch and render one card in this process; print a JSON line with the measurements."""
+    import hashlib
+    from reportlab import rl_config
+    rl_config.invariant = 1  # no creation date or random document id, so the card hashes compare across runs
+    import airtable_utils
+    from pdf_generator import generate_pdf
+
+    baseline = _peak_rss_bytes()  # interpreter, ReportLab, Pillow, ...
+    started = time.perf_counter()
+    records = airtable_utils.fetch_airtable_records(region, mode=mode)
+    fetched = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="linecard-stream-pdf-") as out_dir:
+        path = os.path.join(out_dir, "card.pdf")
+        report = generate_pdf(records, path, region, stream_layout=(mode == "stream"))
+        finished = time.perf_counter()
+        md5 = hashlib.md5()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                md5.update(chunk)
+        pdf_bytes = os.path.getsize(path)
+    print(json.dumps({
+        "groups": len(records),
+        "pages": report["pages"],
+        "pdf_bytes": pdf_bytes,
+        "pdf_md5": md5.hexdigest(),
+        "fetch_seconds": round(fetched - started, 3),
+        "render_seconds": round(finished - fetched, 3),
+        "baseline_rss_bytes": baseline,
+        "peak_rss_bytes": _peak_rss_bytes(),
+    }))
+    return 0
+
+def measure(table_url, mode, region, cache_dir):
+    env = dict(os.environ)
+    env.update({
+        "AIRTABLE_API_URL": table_url,
+        "AIRTABLE_PAT": env.get("AIRTABLE_PAT") or "bench",
+        "AIRTABLE_RATE_LIMIT": "0",  # the stand-in has no limit; don't pace 500 pages at 4.5/s
+        "CATALOG_STORE_PATH": "off",
+        "LOGO_CACHE_DIR": os.path.join(cache_dir, "logos"),
+        "FRAGMENT_CACHE_SIZE": "0",
+    })
+    proc = subprocess.run([sys.executable, "-m", "bench.stream_memory", "--child", mode, "--region", region],
+                          cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{mode} run failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def print_results(results):
+    print(f"\n{'records':>8} {'card':>6} {'mode':<7} {'groups':>6} {'pages':>5} {'fetch s':>8} {'render s':>8} "
+          f"{'peak MiB':>9} {'+base MiB':>9}  pdf")
+    for run in results["runs"]:
+        print(f"{run['records']:>8} {run['card_records']:>6} {run['mode']:<7} {run['groups']:>6} {run['pages']:>5} "
+              f"{run['fetch_seconds']:>8.2f} {run['render_seconds']:>8.2f} "
+              f"{run['peak_rss_bytes'] / 1048576:>9.1f} {(run['peak_rss_bytes'] - run['baseline_rss_bytes']) / 1048576:>9.1f}"
+              f"  {run['pdf_md5'][:8]}")
+    for mode in results["settings"]["modes"]:
+        peaks = [r["peak_rss_bytes"] for r in results["runs"] if r["mode"] == mode]
+        if len(peaks) > 1:
+            print(f"{mode}: peak RSS {peaks[0] / 1048576:.1f} -> {peaks[-1] / 1048576:.1f} MiB "
+                  f"({(peaks[-1] - peaks[0]) / 1048576:+.1f} MiB)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare peak RSS of the full and streaming pipelines as the catalog grows.")
+    parser.add_argument("--records", type=int, nargs="+", default=[1000, 5000, 10000, 25000, 50000])
+    parser.add_argument("--modes", nargs="+", default=["full", "stream"], choices=["full", "stream", "snapshot", "query"])
+    parser.add_argument("--region", default="Rockies", choices=sorted(SYNTHETIC_REGIONS))
+    card = parser.add_mutually_exclusive_group()
+    card.add_argument("--card-records", type=int, default=200, help="manufacturers on the rendered card")
+    card.add_argument("--card-fraction", type=float,
+                      help="put this share of the catalog (0..1] on the card, so it grows with the catalog")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--child", metavar="MODE", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        return run_child(args.child, args.region)
+    if args.card_fraction is not None and not 0 < args.card_fraction <= 1:
+        parser.error(f"--card-fraction must be in (0, 1] (got {args.card_fraction})")
+
+    results = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "child")},
+        "runs": [],
+    }
+    with FakeLogoServer() as logo_server, tempfile.TemporaryDirectory(prefix="linecard-stream-") as cache_dir:
+        for i, n in enumerate(sorted(args.records)):
+            card_records = max(1, round(n * args.card_fraction)) if args.card_fraction else args.card_records
+            catalog = retarget_catalog(make_catalog(n, seed=args.seed, logo_url_base=logo_server.base_url),
+                                       args.region, card_records)
+            with FakeAirtableServer(catalog) as airtable:
+                if i == 0:
+                    print("Warming the logo cache...", flush=True)
+                    measure(airtable.table_url, args.modes[0], args.region, cache_dir)
+                for mode in args.modes:
+                    print(f"{n} records, {mode}...", flush=True)
+                    airtable.reset_stats()
+                    run = measure(airtable.table_url, mode, args.region, cache_dir)
+                    run.update({"records": n, "card_records": card_records, "mode": mode,
+                                "airtable_requests": airtable.stats["requests"]})
+                    results["runs"].append(run)
+            del catalog
+
+    print_results(results)
+    # the modes must render the same card; with a fixed card, so must every catalog size
+    by_card = {}
+    for run in results["runs"]:
+        by_card.setdefault(None if args.card_fraction is None else run["records"], set()).add(run["pdf_md5"])
+    if any(len(hashes) > 1 for hashes in by_card.values()):
+        print("warning: the rendered cards differ between runs")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
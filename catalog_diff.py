@@ -0,0 +1,101 @@
+# catalog_diff.py
+# Change detection between two Airtable snapshots. Every record gets a version (its last-modified
+# timestamp, or a content hash when the table has no such field) and every card scope gets a
+# manifest {manufacturer name: version} built from the same catalog index fetch_airtable_records
+# reads. Diffing two manifests tells exactly which regional/state cards changed and how, so only
+# those need to be regenerated.
+import hashlib
+import json
+import os
+import time
+import logging
+
+from catalog_index import canonical_value, linecard_scope, record_parent_and_name
+
+logger = logging.getLogger(__name__)
+
+# Airtable "Last modified time" field; records without it fall back to a hash of their fields
+AIRTABLE_MODIFIED_FIELD = os.getenv("AIRTABLE_MODIFIED_FIELD", "Last Modified")
+
+def record_version(fields):
+    """Version string for one record's fields: the modified timestamp if present, else a content hash."""
+    modified = fields.get(AIRTABLE_MODIFIED_FIELD)
+    if modified:
+        return f"m:{modified}"
+    payload = json.dumps(canonical_value(fields), sort_keys=True, default=str, separators=(",", ":"))
+    return "h:" + hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def record_versions(records):
+    """{record id: version} for a list of raw Airtable records."""
+    return {r["id"]: record_version(r.get("fields", {})) for r in records}
+
+def _group_manifest(grouped, versions):
+    manifest = {}
+    for group in grouped.values():
+        members = ([group["parent"]] if group.get("parent") else []) + list(group.get("children") or [])
+        for record in members:
+            # records carry the version computed at ingest; otherwise hash each shared record once
+            version = getattr(record, "version", None) or versions.get(id(record))
+            if version is None:
+                version = versions[id(record)] = record_version(record)
+            _, name = record_parent_and_name(record)
+            manifest[name] = version
+    return manifest
+
+def scope_manifest(index):
+    """
+    Return {scope: {manufacturer name: version}} for every regional and state card in a catalog index.
+    Scopes use the same strings as the PDF cache (catalog_index.linecard_scope).
+    """
+    versions = {}
+    manifest = {}
+    for region, grouped in index["regions"].items():
+        manifest[linecard_scope(region)] = _group_manifest(grouped, versions)
+    for region, region_states in index["states"].items():
+        for state, grouped in region_states.items():
+            manifest[linecard_scope(region, state)] = _group_manifest(grouped, versions)
+    return manifest
+
+def diff_manifests(old, new):
+    """
+    Compare two scope manifests. Returns {scope: {"added": [...], "removed": [...], "changed": [...]}}
+    (sorted manufacturer names) for the scopes that differ; unchanged scopes are omitted.
+    """
+    old = old or {}
+    diff = {}
+    for scope in sorted(set(old) | set(new)):
+        before = old.get(scope, {})
+        after = new.get(scope, {})
+        if before == after:
+            continue
+        diff[scope] = {
+            "added": sorted(n for n in after if n not in before),
+            "removed": sorted(n for n in before if n not in after),
+            "changed": sorted(n for n in after if n in before and after[n] != before[n]),
+        }
+    return diff
+
+def diff_record_versions(old, new):
+    """Record-level summary of two {record id: version} maps."""
+    old = old or {}
+    return {
+        "added": sum(1 for rid in new if rid not in old),
+        "removed": sum(1 for rid in old if rid not in new),
+        "changed": sum(1 for rid, version in new.items() if rid in old and old[rid] != version),
+    }
+
+def build_diff_report(old_versions, old_manifest, new_versions, new_manifest, from_version=None, to_version=None):
+    """
+    Diff report for a refresh: record counts plus the per-scope manufacturer changes.
+    "changed_scopes" lists the cards that need regenerating.
+    """
+    scopes = diff_manifests(old_manifest, new_manifest)
+    return {
+        "from_version": from_version,
+        "to_version": to_version,
+        "generated_at": time.time(),
+        "modified_field": AIRTABLE_MODIFIED_FIELD,
+        "records": diff_record_versions(old_versions, new_versions),
+        "changed_scopes": list(scopes),
+        "scopes": scopes,
+    }
@@ -0,0 +1,234 @@
+# catalog_index.py
+# Precomputed region -> state -> parent-group index over a full Airtable snapshot.
+# Built once per snapshot so a region or state lookup is a dictionary access instead of a
+# scan over every record. The grouping rules here are the single source of truth and are
+# also used by airtable_utils.filter_and_group_records. Groups hold catalog_model.CatalogRecord
+# objects, each built once per raw record and shared by every scope it appears in.
+# A state listed under several regions (regions.OVERLAPPING_STATES, e.g. Tennessee) has one card:
+# its state scope under each of those regions holds the manufacturers of all of them.
+import time
+import logging
+
+from catalog_model import CatalogRecord
+from regions import OVERLAPPING_STATES
+
+logger = logging.getLogger(__name__)
+
+def linecard_scope(region, state=None):
+    """Scope string for a regional or state card, e.g. "region:east" or "state:east/ohio"."""
+    return f"state:{region}/{state}" if state else f"region:{region}"
+
+# Attachment fields that identify logo content; signed URLs change on every fetch and are ignored
+_ATTACHMENT_IDENTITY_KEYS = ("id", "filename", "size", "type", "width", "height")
+
+def canonical_value(value):
+    """Make record fields JSON-stable: drop attachment URLs, which are re-signed by Airtable on every fetch."""
+    if isinstance(value, CatalogRecord):
+        return canonical_value(value.as_fields())
+    if isinstance(value, dict):
+        if "url" in value and ("id" in value or "filename" in value):
+            return {k: canonical_value(value[k]) for k in _ATTACHMENT_IDENTITY_KEYS if k in value}
+        return {str(k): canonical_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical_value(v) for v in value]
+    return value
+
+def record_parent_and_name(record):
+    """Return (parent_key, name) for a record (CatalogRecord or fields dict); a record without Parent is its own parent."""
+    name = record.get("Manufacturer Names", "Unknown Manufacturer")
+    return record.get("Parent", name), name
+
+def state_card_regions(regions, state):
+    """
+    Regions whose card for state lists a record tagged with regions (lowercase names).
+    For an overlapping state, a record in any of its regions is on the card under all of them.
+    """
+    shared = OVERLAPPING_STATES.get(state)
+    if shared and not regions.isdisjoint(shared):
+        return set(regions).union(shared)
+    return regions
+
+def add_to_groups(grouped, record):
+    """Merge one record into a {parent: {"parent", "children"}} dict."""
+    parent, name = record_parent_and_name(record)
+    if parent not in grouped:
+        grouped[parent] = {
+            "parent": None,
+            "children": []}
+    if name == parent:
+        grouped[parent]["parent"] = record
+    else:
+        grouped[parent]["children"].append(record)
+
+def sort_groups(grouped):
+    """Return grouped as a dict sorted case-insensitively by parent name."""
+    return dict(sorted(grouped.items(), key=lambda x: x[0].lower()))
+
+def _as_catalog_record(record, versions):
+    if isinstance(record, CatalogRecord):
+        return record
+    return CatalogRecord.from_airtable(record, versions.get(record.get("id")))
+
+def build_catalog_index(all_records, versions=None):
+    """
+    Build {"regions": {region: grouped}, "states": {region: {state: grouped}}, "records": {id: CatalogRecord}}
+    from raw Airtable records (or CatalogRecords, e.g. loaded from the shared catalog store).
+
+    Region and state keys are lowercase. A record lands under every region in its Region field and,
+    within each of those regions, under every state in its Manufacturer States field, which is
+    exactly what filtering by (region, state) would select; for a state in OVERLAPPING_STATES the
+    state scope is the union over its regions, each record once (see state_card_regions). versions ({record id: version}, see
+    catalog_diff.record_versions) is stored on each CatalogRecord so manifests needn't rehash.
+    """
+    started = time.time()
+    versions = versions or {}
+    records = {}
+    regions = {}
+    states = {}
+    for r in all_records:
+        record = _as_catalog_record(r, versions)
+        records[record.id] = record
+        if not record.regions:
+            continue
+        for region in record.regions:
+            add_to_groups(regions.setdefault(region, {}), record)
+        for state in record.states:
+            for region in state_card_regions(record.regions, state):
+                add_to_groups(states.setdefault(region, {}).setdefault(state, {}), record)
+
+    index = {
+        "regions": {region: sort_groups(grouped) for region, grouped in regions.items()},
+        "states": {
+            region: {state: sort_groups(grouped) for state, grouped in region_states.items()}
+            for region, region_states in states.items()
+        },
+        "records": records,
+        "build_seconds": round(time.time() - started, 4),
+    }
+    logger.info("Catalog index built: %d records, %d regions in %.3fs",
+                len(all_records), len(index["regions"]), index["build_seconds"])
+    return index
+
+def lookup_catalog_index(index, region, state=None):
+    """
+    Return the grouped dict for a region (and optionally a state), or {} if nothing matches.
+    The result is a shallow copy; the group dicts themselves are shared and must not be mutated.
+    """
+    region = region.lower()
+    if state:
+        grouped = index["states"].get(region, {}).get(state.lower(), {})
+    else:
+        grouped = index["regions"].get(region, {})
+    return dict(grouped)
+
+def iter_index_scopes(index):
+    """(scope, grouped dict) for every regional and state card in an index."""
+    for region, grouped in index["regions"].items():
+        yield linecard_scope(region), grouped
+    for region, region_states in index["states"].items():
+        for state, grouped in region_states.items():
+            yield linecard_scope(region, state), grouped
+
+def _record_scopes(record):
+    """(region, state or None) pairs a record is grouped under."""
+    if record is None:
+        return set()
+    scopes = {(region, None) for region in record.regions}
+    scopes.update((region, state) for state in record.states for region in state_card_regions(record.regions, state))
+    return scopes
+
+def patch_catalog_index(index, changed_records, removed_ids=(), versions=None):
+    """
+    Return a new index with changed_records (raw Airtable records or CatalogRecords) inserted or
+    replaced and the records in removed_ids dropped, without rebuilding it from the full table.
+
+    The input index is not modified: scopes and groups a change touches are copied, everything
+    else is shared, so readers holding the old index are unaffected. Children end up in the same
+    order a rebuild from the table would give. The result's "patched_scopes" lists the touched
+    (scope, grouped dict) pairs; a scope left empty has {}.
+    """
+    started = time.time()
+    versions = versions or {}
+    records = dict(index.get("records") or {})
+    changes = [(records.get(new.id), new) for new in (_as_catalog_record(r, versions) for r in changed_records)]
+    changes += [(records[record_id], None) for record_id in removed_ids if record_id in records]
+
+    grouped_by_scope = {}  # (region, state) -> copy of the grouped dict being edited
+    copied_groups = set()
+
+    def editable(scope):
+        grouped = grouped_by_scope.get(scope)
+        if grouped is None:
+            region, state = scope
+            source = index["states"].get(region, {}).get(state) if state else index["regions"].get(region)
+            grouped = grouped_by_scope[scope] = dict(source or {})
+        return grouped
+
+    def editable_group(grouped, parent):
+        group = grouped.get(parent)
+        if group is not None and id(group) not in copied_groups:
+            group = grouped[parent] = {"parent": group["parent"], "children": list(group["children"])}
+            copied_groups.add(id(group))
+        return group
+
+    for old, new in changes:
+        if new is not None:
+            records[new.id] = new
+        elif old is not None:
+            records.pop(old.id, None)
+    # records keeps table order (updates stay in place, new records are appended, as in Airtable),
+    # so children are inserted where a rebuild from the table would put them
+    rank = {record_id: i for i, record_id in enumerate(records)}
+
+    for old, new in changes:
+        old_scopes = _record_scopes(old)
+        new_scopes = _record_scopes(new)
+        for scope in old_scopes | new_scopes:
+            grouped = editable(scope)
+            if scope in old_scopes:
+                old_parent, _ = record_parent_and_name(old)
+                group = editable_group(grouped, old_parent)
+                if group is not None:
+                    if group["parent"] is old:
+                        group["parent"] = None
+                    else:
+                        group["children"] = [c for c in group["children"] if c is not old]
+                    if group["parent"] is None and not group["children"]:
+                        del grouped[old_parent]
+            if scope in new_scopes:
+                parent, name = record_parent_and_name(new)
+                group = editable_group(grouped, parent)
+                if group is None:
+                    group = grouped[parent] = {"parent": None, "children": []}
+                    copied_groups.add(id(group))
+                if name == parent:
+                    group["parent"] = new
+                else:
+                    children = group["children"]
+                    position = next((i for i, c in enumerate(children) if rank.get(c.id, -1) > rank[new.id]), len(children))
+                    children.insert(position, new)
+
+    regions = dict(index["regions"])
+    states = {region: dict(region_states) for region, region_states in index["states"].items()}
+    patched_scopes = []
+    for (region, state), grouped in grouped_by_scope.items():
+        target = states.setdefault(region, {}) if state else regions
+        key = state if state else region
+        if grouped:
+            target[key] = sort_groups(grouped)
+        else:
+            target.pop(key, None)
+        patched_scopes.append((linecard_scope(region, state), target.get(key, {})))
+    states = {region: region_states for region, region_states in states.items() if region_states}
+
+    patched = {
+        "regions": regions,
+        "states": states,
+        "records": records,
+        "build_seconds": index.get("build_seconds"),
+        "patch_seconds": round(time.time() - started, 4),
+        "patched_scopes": patched_scopes,
+    }
+    logger.info("Catalog index patched: %d records changed, %d scopes touched in %.3fs",
+                len(changes), len(grouped_by_scope), patched["patch_seconds"])
+    return patched
@@ -0,0 +1,160 @@
+# catalog_model.py
+# Compact in-memory form of an Airtable manufacturer record.
+# Raw records carry every field Airtable returns (plus attachment thumbnails); the snapshot index
+# holds thousands of them per worker and the layout loop used to re-probe their keys on every build.
+# CatalogRecord keeps only what a line card needs, with the display name, region set and state set
+# resolved once at ingest. It answers .get() for the Airtable field names the layout code reads,
+# so grouped dicts keep their {"parent", "children"} shape.
+
+# Keys tried, in order, when resolving a display name
+DISPLAY_NAME_KEYS = (
+    "Manufacturer Names",
+    "Manufacturer Name",
+    "Manufacturer",
+    "Name",
+    "Company",
+    "Title",
+    "Display Name",
+)
+
+# Attachment keys the logo cache and PDF cache keys need; thumbnails and the like are dropped
+_ATTACHMENT_KEEP_KEYS = ("id", "url", "filename", "size", "type", "width", "height")
+
+def normalize_manufacturer_states(val):
+    """Return the lowercased state names from a 'Manufacturer States' value (list or comma-separated string)."""
+    if isinstance(val, list):
+        return [s.strip().lower() for s in val]
+    elif isinstance(val, str):
+        return [s.strip().lower() for s in val.split(",")]
+    else:
+        return []
+
+def _display_name_from_fields(record):
+    # Support nested 'fields' wrapper
+    candidate_sources = [record]
+    if "fields" in record and isinstance(record.get("fields"), dict):
+        candidate_sources.insert(0, record["fields"])
+
+    for src in candidate_sources:
+        for k in DISPLAY_NAME_KEYS:
+            if k in src:
+                val = src.get(k)
+                if val is None:
+                    continue
+                # If list, choose first non-empty element (common in Airtable multi-select)
+                if isinstance(val, list):
+                    for item in val:
+                        if isinstance(item, str) and item.strip():
+                            return item.strip()
+                    # if list but empty strings, continue searching other keys
+                    continue
+                # If not list, coerce to string
+                if isinstance(val, str) and val.strip():
+                    return val.strip()
+                # If other types, convert to str
+                try:
+                    s = str(val).strip()
+                    if s:
+                        return s
+                except Exception:
+                    continue
+    return None
+
+def resolve_display_name(record):
+    """
+    Resolve a display name from a CatalogRecord or an Airtable record dict.
+
+    A CatalogRecord already carries the name resolved at ingest. For dicts, tries
+    DISPLAY_NAME_KEYS in order, checking a nested {"fields": {...}} wrapper first.
+    If the found value is a list, returns the first non-empty element as a string.
+    Returns None if no name found.
+    """
+    if isinstance(record, CatalogRecord):
+        return record.display_name
+    if not isinstance(record, dict):
+        return None
+    return _display_name_from_fields(record)
+
+def _slim_attachment(attachment):
+    if not isinstance(attachment, dict):
+        return attachment
+    return {k: attachment[k] for k in _ATTACHMENT_KEEP_KEYS if k in attachment}
+
+class CatalogRecord:
+    """One manufacturer row, reduced to the fields a line card uses."""
+    __slots__ = ("id", "name", "parent", "display_name", "description", "logos", "regions", "states", "version")
+
+    # Airtable field name -> attribute, for .get()
+    _FIELDS = {
+        "Manufacturer Names": "name",
+        "Parent": "parent",
+        "Description": "description",
+        "Logos": "logos",
+    }
+
+    def __init__(self, id=None, name=None, parent=None, display_name=None, description=None,
+                 logos=None, regions=frozenset(), states=frozenset(), version=None):
+        self.id = id
+        self.name = name
+        self.parent = parent
+        self.display_name = display_name
+        self.description = description
+        self.logos = logos
+        self.regions = regions
+        self.states = states
+        self.version = version
+
+    @classmethod
+    def from_airtable(cls, record, version=None):
+        """Build from a raw Airtable record ({"id", "fields"}) or a bare fields dict."""
+        fields = record["fields"] if isinstance(record.get("fields"), dict) else record
+        states = set(normalize_manufacturer_states(fields.get("Manufacturer States", "")))
+        states.discard("")
+        logos = fields.get("Logos")
+        return cls(
+            id=record.get("id"),
+            name=fields.get("Manufacturer Names"),
+            parent=fields.get("Parent"),
+            display_name=_display_name_from_fields(fields),
+            description=fields.get("Description"),
+            # the layout only ever embeds the first attachment
+            logos=[_slim_attachment(logos[0])] if isinstance(logos, list) and logos else None,
+            regions=frozenset(reg.lower() for reg in fields.get("Region", []) or []),
+            states=frozenset(states),
+            version=version,
+        )
+
+    def get(self, key, default=None):
+        """dict.get-compatible access by Airtable field name; unset fields return default."""
+        attr = self._FIELDS.get(key)
+        value = getattr(self, attr) if attr else None
+        return default if value is None else value
+
+    def keys(self):
+        """Airtable field names this record has values for."""
+        return [key for key, attr in self._FIELDS.items() if getattr(self, attr) is not None]
+
+    def as_fields(self):
+        """The line card fields as an Airtable-style dict (used for cache keys)."""
+        fields = {key: self.get(key) for key in self.keys()}
+        fields["Region"] = sorted(self.regions)
+        fields["Manufacturer States"] = sorted(self.states)
+        return fields
+
+    def to_dict(self):
+        """Every slot as a JSON-serializable dict (region/state sets as sorted lists); see from_dict."""
+        data = {attr: getattr(self, attr) for attr in self.__slots__}
+        data["regions"] = sorted(self.regions)
+        data["states"] = sorted(self.states)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a record stored with to_dict (the shared catalog store keeps records this way)."""
+        data = dict(data)
+        data["regions"] = frozenset(data.get("regions") or ())
+        data["states"] = frozenset(data.get("states") or ())
+        return cls(**{attr: data.get(attr) for attr in cls.__slots__ if attr in data})
+
+    def __repr__(self):
+        return f"CatalogRecord(id={self.id!r}, name={self.name!r}, parent={self.parent!r})"
@@ -0,0 +1,268 @@
+# catalog_store.py
+# Catalog snapshot shared by every worker process on the host, kept in a SQLite database in WAL mode.
+# Without it each gunicorn worker pages the whole Airtable table itself, and a deploy that starts N
+# cold workers sends N full table walks at once. The store holds the latest catalog (CatalogRecords
+# in table order, as JSON rows), every card's grouping (one row per scope listing its parents and
+# children by record id), the diff report of the last change, and a refresh lease: only the worker
+# holding the lease fetches from Airtable and publishes. The other workers keep just the head row
+# and answer a card lookup by reading that scope's row and its records, so the catalog and its
+# index live once on disk rather than once per worker; the full index is only built in a process
+# that needs all of it (a refresh, a webhook patch, batch rendering). WAL lets readers see a
+# consistent version while a writer publishes the next one.
+# The catalog is tagged with the table URL it came from; a store holding another table's catalog
+# reads as empty until it is overwritten.
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+from catalog_model import CatalogRecord
+from catalog_index import iter_index_scopes
+
+logger = logging.getLogger(__name__)
+
+# "" or "off" disables the store; each worker then keeps its own snapshot
+CATALOG_STORE_PATH = os.getenv("CATALOG_STORE_PATH", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "cache", "catalog.sqlite3")).strip()
+CATALOG_REFRESH_LEASE = float(os.getenv("CATALOG_REFRESH_LEASE", "300"))  # seconds; must outlast a full table fetch
+CATALOG_STORE_POLL = float(os.getenv("CATALOG_STORE_POLL", "2"))  # seconds between checks for a newer published version
+CATALOG_STORE_WAIT_INTERVAL = float(os.getenv("CATALOG_STORE_WAIT_INTERVAL", "0.25"))  # poll while another worker fetches
+# Longest a worker with nothing to serve waits for another worker's fetch (a few full table fetches)
+# before fetching itself, so a lease holder that died mid-fetch doesn't stall it for the whole lease
+CATALOG_STORE_MAX_WAIT = float(os.getenv("CATALOG_STORE_MAX_WAIT", "60"))
+
+# Bump when the stored row format (CatalogRecord.to_dict, scope rows) changes; older stores are recreated
+STORE_SCHEMA_VERSION = 2
+
+_TABLES = ("catalog_head", "catalog_records", "catalog_scopes", "catalog_lease")
+_OLD_TABLES = ("catalog_removed",)  # dropped along with _TABLES when an older store is recreated
+_SCHEMA = (
+    # diff is the catalog_diff report of the change that made this version, for every worker's /catalog/diff
+    """CREATE TABLE catalog_head (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        source TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        fetched_at REAL NOT NULL,
+        record_count INTEGER NOT NULL,
+        published_at REAL NOT NULL,
+        diff TEXT)""",
+    """CREATE TABLE catalog_records (
+        id TEXT PRIMARY KEY,
+        position INTEGER NOT NULL,
+        data TEXT NOT NULL)""",
+    # data: [[parent key, parent record id or null, [child record ids]], ...] in card order
+    "CREATE TABLE catalog_scopes (scope TEXT PRIMARY KEY, data TEXT NOT NULL)",
+    "CREATE TABLE catalog_lease (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)",
+)
+_HEAD_COLUMNS = ("version", "fetched_at", "record_count", "published_at")
+
+@contextmanager
+def _transaction(conn, immediate=False):
+    """BEGIN (IMMEDIATE takes the write lock up front) ... COMMIT, rolling back on errors."""
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def _read_head(conn, source):
+    row = conn.execute(f"SELECT {', '.join(_HEAD_COLUMNS)} FROM catalog_head WHERE id = 1 AND source = ?",
+                       (source,)).fetchone()
+    return dict(zip(_HEAD_COLUMNS, row)) if row else None
+
+def _record_row(record):
+    return json.dumps(record.to_dict(), separators=(",", ":"))
+
+def _scope_row(grouped):
+    return json.dumps([[parent, group["parent"].id if group["parent"] is not None else None,
+                        [child.id for child in group["children"]]] for parent, group in grouped.items()],
+                      separators=(",", ":"))
+
+def _write_scopes(conn, scopes):
+    """Store (scope, grouped dict) pairs as scope rows; an empty grouped dict deletes the scope."""
+    for scope, grouped in scopes:
+        if grouped:
+            conn.execute("INSERT OR REPLACE INTO catalog_scopes (scope, data) VALUES (?, ?)", (scope, _scope_row(grouped)))
+        else:
+            conn.execute("DELETE FROM catalog_scopes WHERE scope = ?", (scope,))
+
+def _diff_row(diff, version):
+    if diff is None:
+        return None
+    return json.dumps(dict(diff, to_version=version), separators=(",", ":"), default=str)
+
+def lease_owner():
+    """Lease owner id for this process (refreshes within a process are already serialized)."""
+    return f"pid:{os.getpid()}"
+
+class CatalogStore:
+    """
+    The shared catalog database at path. Connections are opened per thread, and again after a
+    fork; each method is one transaction. sqlite3.Error is left to callers, which fall back to
+    fetching from Airtable themselves.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _transaction(conn, immediate=True):
+            if conn.execute("PRAGMA user_version").fetchone()[0] != STORE_SCHEMA_VERSION:
+                for table in _TABLES + _OLD_TABLES:
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                for statement in _SCHEMA:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {STORE_SCHEMA_VERSION}")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def head(self, source):
+        """{"version", "fetched_at", "record_count", "published_at"} of source's catalog, or None."""
+        return _read_head(self._connect(), source)
+
+    def lookup(self, source, scope):
+        """
+        (head, grouped dict) for one card scope (catalog_index.linecard_scope), read from one
+        consistent version: the same {parent: {"parent", "children"}} dict the index would give,
+        holding fresh CatalogRecords. (None, {}) when source has nothing published.
+        """
+        with _transaction(self._connect()) as conn:
+            head = _read_head(conn, source)
+            row = conn.execute("SELECT data FROM catalog_scopes WHERE scope = ?", (scope,)).fetchone() if head else None
+            if row is None:
+                return head, {}
+            groups = json.loads(row[0])
+            ids = [parent_id for _, parent_id, _ in groups if parent_id is not None]
+            ids += [child_id for _, _, child_ids in groups for child_id in child_ids]
+            # one JSON array for all the rows: a single parse instead of one per record
+            (rows,) = conn.execute("SELECT '[' || COALESCE(group_concat(data), '') || ']' FROM catalog_records "
+                                   "WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),)).fetchone()
+        records = {record.id: record for record in map(CatalogRecord.from_dict, json.loads(rows))}
+        return head, {
+            parent: {"parent": records.get(parent_id) if parent_id is not None else None,
+                     "children": [records[child_id] for child_id in child_ids if child_id in records]}
+            for parent, parent_id, child_ids in groups
+        }
+
+    def last_diff(self, source):
+        """The diff report stored with source's current version, or None."""
+        row = self._connect().execute("SELECT diff FROM catalog_head WHERE id = 1 AND source = ?", (source,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def load(self, source):
+        """(head, [CatalogRecord] in table order), read from one consistent version; (None, []) when empty."""
+        with _transaction(self._connect()) as conn:
+            head = _read_head(conn, source)
+            rows = conn.execute("SELECT data FROM catalog_records ORDER BY position").fetchall() if head else []
+        return head, [CatalogRecord.from_dict(json.loads(data)) for (data,) in rows]
+
+    def publish(self, source, index, fetched_at, diff=None):
+        """
+        Replace the stored catalog with source's catalog index (catalog_index.build_catalog_index):
+        its records in table order and the grouping of every scope. diff (a catalog_diff report
+        against the catalog being replaced) is kept for last_diff with its to_version set.
+        Returns the new version.
+        """
+        rows = [(record.id, position, _record_row(record)) for position, record in enumerate(index["records"].values())]
+        with _transaction(self._connect(), immediate=True) as conn:
+            # versions keep counting across a change of source, so no worker mistakes one for the other
+            version = conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM catalog_head").fetchone()[0]
+            conn.execute("DELETE FROM catalog_records")
+            conn.execute("DELETE FROM catalog_scopes")
+            conn.executemany("INSERT INTO catalog_records (id, position, data) VALUES (?, ?, ?)", rows)
+            _write_scopes(conn, iter_index_scopes(index))
+            conn.execute("INSERT OR REPLACE INTO catalog_head (id, source, version, fetched_at, record_count, "
+                         "published_at, diff) VALUES (1, ?, ?, ?, ?, ?, ?)",
+                         (source, version, fetched_at, len(rows), time.time(), _diff_row(diff, version)))
+        return version
+
+    def apply_changes(self, source, base_version, changed, removed_ids=(), scopes=(), diff=None):
+        """
+        Apply a patch made on top of base_version as one new version: store changed CatalogRecords
+        (updates keep their place, new records go to the end of the table order, in the order
+        given), delete removed_ids and rewrite the (scope, grouped dict) pairs in scopes (an empty
+        dict deletes the scope). diff is stored as in publish.
+        Returns the new version, or None if the stored catalog is no longer at base_version (or
+        source has nothing published): the caller rebuilds the patch on the current version.
+        """
+        with _transaction(self._connect(), immediate=True) as conn:
+            head = _read_head(conn, source)
+            if head is None or head["version"] != base_version:
+                return None
+            version = base_version + 1
+            next_position = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM catalog_records").fetchone()[0]
+            for record in changed:
+                data = _record_row(record)
+                if not conn.execute("UPDATE catalog_records SET data = ? WHERE id = ?", (data, record.id)).rowcount:
+                    conn.execute("INSERT INTO catalog_records (id, position, data) VALUES (?, ?, ?)",
+                                 (record.id, next_position, data))
+                    next_position += 1
+            for record_id in removed_ids:
+                conn.execute("DELETE FROM catalog_records WHERE id = ?", (record_id,))
+            _write_scopes(conn, scopes)
+            count = conn.execute("SELECT COUNT(*) FROM catalog_records").fetchone()[0]
+            conn.execute("UPDATE catalog_head SET version = ?, record_count = ?, published_at = ?, diff = ? WHERE id = 1",
+                         (version, count, time.time(), _diff_row(diff, version)))
+        return version
+
+    def acquire_lease(self, owner, seconds, name="refresh"):
+        """Take or extend the named lease for seconds; False while another owner holds an unexpired one."""
+        now = time.time()
+        with _transaction(self._connect(), immediate=True) as conn:
+            row = conn.execute("SELECT owner, expires_at FROM catalog_lease WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != owner and row[1] > now:
+                return False
+            conn.execute("INSERT OR REPLACE INTO catalog_lease (name, owner, expires_at) VALUES (?, ?, ?)",
+                         (name, owner, now + seconds))
+        return True
+
+    def release_lease(self, owner, name="refresh"):
+        with _transaction(self._connect(), immediate=True) as conn:
+            conn.execute("DELETE FROM catalog_lease WHERE name = ? AND owner = ?", (name, owner))
+
+    def lease_info(self, name="refresh"):
+        """{"owner", "expires_in"} of an unexpired lease, or None."""
+        row = self._connect().execute("SELECT owner, expires_at FROM catalog_lease WHERE name = ?", (name,)).fetchone()
+        if not row or row[1] <= time.time():
+            return None
+        return {"owner": row[0], "expires_in": round(row[1] - time.time(), 3)}
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_catalog_store():
+    """The shared CatalogStore, or None when CATALOG_STORE_PATH is empty or "off"."""
+    global _store
+    if CATALOG_STORE_PATH.lower() in ("", "off", "0", "false", "no"):
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CatalogStore(CATALOG_STORE_PATH)
+    return _store
+
+def get_catalog_store_stats(source):
+    store = get_catalog_store()
+    if store is None:
+        return {"enabled": False}
+    stats = {"enabled": True, "path": store.path, "head": None, "lease": None}
+    try:
+        stats["head"] = store.head(source)
+        stats["lease"] = store.lease_info()
+    except sqlite3.Error as ex:
+        stats["error"] = str(ex)
+    stats["bytes"] = sum(os.path.getsize(p) for p in (store.path, store.path + "-wal") if os.path.exists(p))
+    return stats
@@ -0,0 +1,133 @@
+# http_client.py
+# Process-wide pooled HTTP client shared by Airtable paging and logo downloads.
+# One requests.Session with keep-alive connection pools (sized per host if configured) and
+# urllib3 retry/backoff, so repeated requests to the same host reuse TCP+TLS connections.
+import os
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))  # distinct host pools kept per adapter
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))          # keep-alive connections per host
+HTTP_RETRY_TOTAL = int(os.getenv("HTTP_RETRY_TOTAL", "3"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.5"))     # seconds, doubled per retry
+# Per-host pool size overrides, e.g. "api.airtable.com=4,v5.airtableusercontent.com=32"
+HTTP_HOST_POOL_SIZES = os.getenv("HTTP_HOST_POOL_SIZES", "")
+
+# Statuses worth retrying for idempotent GETs. 429 is left to the caller, which knows the API's limits.
+RETRY_STATUSES = (500, 502, 503, 504)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def parse_host_pool_sizes(spec):
+    """Parse "host=size,host=size" into a dict, ignoring malformed entries."""
+    sizes = {}
+    for item in (spec or "").split(","):
+        host, _, size = item.partition("=")
+        host = host.strip().lower()
+        try:
+            if host:
+                sizes[host] = int(size)
+        except ValueError:
+            logger.warning("Ignoring malformed HTTP_HOST_POOL_SIZES entry: %s", item)
+    return sizes
+
+class _Retry(Retry):
+    # urllib3 also retries any 429 carrying Retry-After; leave those to rate_limit.py, which
+    # shares the pause with the other workers instead of sleeping in this one only
+    RETRY_AFTER_STATUS_CODES = frozenset(Retry.RETRY_AFTER_STATUS_CODES) - {429}
+
+def _make_retry():
+    return _Retry(
+        total=HTTP_RETRY_TOTAL,
+        connect=HTTP_RETRY_TOTAL,
+        read=HTTP_RETRY_TOTAL,
+        status=HTTP_RETRY_TOTAL,
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,  # hand the final response back so callers can report the status
+        respect_retry_after_header=True,
+    )
+
+def _make_adapter(pool_maxsize):
+    return HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=pool_maxsize, max_retries=_make_retry())
+
+def _build_session():
+    session = requests.Session()
+    default_adapter = _make_adapter(HTTP_POOL_MAXSIZE)
+    session.mount("https://", default_adapter)
+    session.mount("http://", default_adapter)
+    for host, size in parse_host_pool_sizes(HTTP_HOST_POOL_SIZES).items():
+        adapter = _make_adapter(size)
+        session.mount(f"https://{host}/", adapter)
+        session.mount(f"http://{host}/", adapter)
+    return session
+
+def get_http_session():
+    """
+    Return the shared requests.Session for this process.
+    A new session is created after fork (e.g. gunicorn workers) so sockets are never shared across processes.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+def http_get(url, **kwargs):
+    """GET through the shared pooled session with the default timeout."""
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+    return get_http_session().get(url, **kwargs)
+
+def get_http_pool_stats():
+    """
+    Report connection reuse per host for the current process: requests sent, new connections opened,
+    and reused = requests - connections (each reuse is a TCP+TLS handshake saved).
+    Counts cover the host pools currently held; pools evicted from the pool manager drop out.
+    """
+    session = _session if _session_pid == os.getpid() else None
+    hosts = {}
+    if session is not None:
+        seen = set()
+        for adapter in session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host = f"{pool.scheme}://{pool.host}:{pool.port}"
+                entry = hosts.setdefault(host, {"requests": 0, "connections": 0, "pool_maxsize": pool.pool.maxsize if pool.pool else None})
+                entry["requests"] += pool.num_requests
+                entry["connections"] += pool.num_connections
+    totals = {"requests": 0, "connections": 0}
+    for entry in hosts.values():
+        entry["reused"] = max(0, entry["requests"] - entry["connections"])
+        totals["requests"] += entry["requests"]
+        totals["connections"] += entry["connections"]
+    totals["reused"] = max(0, totals["requests"] - totals["connections"])
+    return {
+        "hosts": hosts,
+        "totals": totals,
+        "config": {
+            "pool_connections": HTTP_POOL_CONNECTIONS,
+            "pool_maxsize": HTTP_POOL_MAXSIZE,
+            "host_pool_sizes": parse_host_pool_sizes(HTTP_HOST_POOL_SIZES),
+            "retry_total": HTTP_RETRY_TOTAL,
+            "retry_backoff": HTTP_RETRY_BACKOFF,
+            "timeout": HTTP_TIMEOUT,
+        },
+    }
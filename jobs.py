@@ -0,0 +1,170 @@
+# jobs.py
+# Background job runner for PDF generation. A POST can return a job id immediately while a
+# bounded worker pool renders the card; the status is written to a small JSON file per job so
+# any gunicorn worker can answer a status poll. Submissions for a scope that is already queued
+# or running in any worker on the host attach to the existing job instead of rendering twice: the
+# job directory holds a claim file per in-flight scope, checked and written under a lock file.
+import os
+import re
+import threading
+import time
+import uuid
+import json
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import logo_cache
+
+try:
+    import fcntl  # POSIX only; without it duplicate submissions are only caught within one process
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PDF_JOB_WORKERS = int(os.getenv("PDF_JOB_WORKERS", "2"))
+PDF_JOB_DIR = os.getenv("PDF_JOB_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "jobs")
+PDF_JOB_TTL = float(os.getenv("PDF_JOB_TTL", "3600"))  # seconds finished job records are kept
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+_last_prune = 0.0
+
+def _get_executor():
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=max(1, PDF_JOB_WORKERS), thread_name_prefix="pdf-job")
+        _executor_pid = os.getpid()
+    return _executor
+
+def _job_path(job_id):
+    return os.path.join(PDF_JOB_DIR, job_id + ".json")
+
+def _write_job(job):
+    logo_cache.atomic_write(_job_path(job["id"]), json.dumps(job).encode("utf-8"))
+
+def get_job(job_id):
+    """Return the job dict for job_id, or None if unknown/expired/malformed."""
+    if not job_id or not _JOB_ID_RE.match(job_id):
+        return None
+    try:
+        with open(_job_path(job_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+@contextmanager
+def _claims_locked():
+    """Hold the job directory's lock file (and the in-process lock) while in-flight claims are read or changed."""
+    os.makedirs(PDF_JOB_DIR, exist_ok=True)
+    with _lock, open(os.path.join(PDF_JOB_DIR, ".lock"), "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+def _claim_path(scope):
+    return os.path.join(PDF_JOB_DIR, "inflight", hashlib.sha1(scope.encode("utf-8")).hexdigest() + ".claim")
+
+def _read_claim(scope):
+    try:
+        with open(_claim_path(scope), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _pid_alive(pid):
+    if os.name != "posix":
+        return True  # os.kill(pid, 0) would terminate the process on Windows
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True
+    except (OSError, TypeError):
+        return False
+    return True
+
+def _inflight_job(scope):
+    """The queued or running job claimed for scope by a live worker process, or None. Call with the claims lock held."""
+    claim = _read_claim(scope)
+    if not claim:
+        return None
+    job = get_job(claim.get("job_id"))
+    if job and job["status"] in ("queued", "running") and _pid_alive(claim.get("pid")):
+        return job
+    return None
+
+def _release_claim(scope, job_id):
+    with _claims_locked():
+        claim = _read_claim(scope)
+        if claim and claim.get("job_id") == job_id:
+            try:
+                os.remove(_claim_path(scope))
+            except OSError:
+                pass
+
+def _update_job(job, **changes):
+    job.update(changes)
+    _write_job(job)
+
+def _prune_jobs():
+    """Delete job records older than PDF_JOB_TTL (at most once a minute)."""
+    global _last_prune
+    now = time.time()
+    if now - _last_prune < 60:
+        return
+    _last_prune = now
+    try:
+        with os.scandir(PDF_JOB_DIR) as it:
+            for entry in it:
+                if entry.name.endswith(".json") and now - entry.stat().st_mtime > PDF_JOB_TTL:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+    except FileNotFoundError:
+        pass
+
+def _run_job(job, func):
+    _update_job(job, status="running", started=time.time())
+    try:
+        result, status_code = func()
+        if status_code == 200:
+            _update_job(job, status="done", finished=time.time(), result=result)
+        else:
+            _update_job(job, status="failed", finished=time.time(), error=result.get("error"), result=result)
+    except Exception as ex:
+        logger.exception("PDF job %s (%s) failed", job["id"], job["scope"])
+        _update_job(job, status="failed", finished=time.time(), error=str(ex))
+    finally:
+        _release_claim(job["scope"], job["id"])
+
+def submit_job(scope, func):
+    """
+    Queue func (returning (result_dict, http_status)) for scope on the worker pool.
+    Returns (job, created); created is False when an in-flight job for the same scope, queued by
+    this or another worker process, was reused. A claim left by a process that died is replaced.
+    """
+    with _claims_locked():
+        existing = _inflight_job(scope)
+        if existing:
+            return existing, False
+        _prune_jobs()
+        job = {
+            "id": uuid.uuid4().hex,
+            "scope": scope,
+            "status": "queued",
+            "created": time.time(),
+            "started": None,
+            "finished": None,
+            "result": None,
+            "error": None,
+        }
+        _write_job(job)
+        logo_cache.atomic_write(_claim_path(scope), json.dumps({"job_id": job["id"], "pid": os.getpid()}).encode("utf-8"))
+    _get_executor().submit(_run_job, dict(job), func)
+    return job, True
@@ -0,0 +1,211 @@
+# logo_cache.py
+# Persistent on-disk logo cache shared by requests and gunicorn workers.
+# Logo bytes are stored content-addressed (blobs/<sha256><ext>); a small ref file per attachment
+# id/URL points at the blob. Writes are atomic (temp file + os.replace) so concurrent builds never
+# see partial files, and the total size is bounded with least-recently-used eviction.
+import hashlib
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+import logging
+
+from http_client import http_get
+
+try:
+    import fcntl  # POSIX only; eviction is still safe without it, just not serialized across processes
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOGO_CACHE_DIR = os.getenv("LOGO_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "logos")
+LOGO_CACHE_MAX_BYTES = int(os.getenv("LOGO_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # 0 disables eviction
+# Blobs used more recently than this are never evicted, so an in-progress build never loses a file
+LOGO_CACHE_MIN_AGE = float(os.getenv("LOGO_CACHE_MIN_AGE", "600"))
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "download_errors": 0, "bytes_downloaded": 0, "evicted_files": 0, "evicted_bytes": 0}
+_bytes_since_evict_check = 0
+
+def _bump(**counts):
+    with _stats_lock:
+        for k, v in counts.items():
+            _stats[k] += v
+
+def _blobs_dir():
+    return os.path.join(LOGO_CACHE_DIR, "blobs")
+
+def _refs_dir():
+    return os.path.join(LOGO_CACHE_DIR, "refs")
+
+def logo_cache_key(attachment):
+    """
+    Stable cache key for an Airtable attachment dict.
+    Attachment ids are immutable (replacing a logo creates a new id); signed URLs are not,
+    so the URL is only used when there is no id.
+    """
+    if not attachment:
+        return None
+    if attachment.get("id"):
+        return "id:" + attachment["id"]
+    if attachment.get("url"):
+        return "url:" + attachment["url"]
+    return None
+
+def _ref_path(key):
+    return os.path.join(_refs_dir(), hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+def _guess_extension(attachment, content):
+    if content[:8] == b"\x89PNG\r\n\x1a\n":
+        return ".png"
+    if content[:3] == b"\xff\xd8\xff":
+        return ".jpg"
+    if content[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    ext = mimetypes.guess_extension(attachment.get("type") or "") if attachment else None
+    return ext or ".png"
+
+def atomic_write(path, data):
+    """Write data to path via a temp file + os.replace so readers never see a partial file."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def _touch(path):
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+def get_cached_logo(key):
+    """Return the cached blob path for key, or None. A hit refreshes the blob's LRU timestamp."""
+    ref = _ref_path(key)
+    try:
+        with open(ref, "r", encoding="utf-8") as f:
+            blob_name = f.read().strip()
+    except OSError:
+        return None
+    blob_path = os.path.join(_blobs_dir(), blob_name)
+    if not blob_name or not os.path.exists(blob_path):
+        # blob was evicted; drop the dangling ref
+        try:
+            os.remove(ref)
+        except OSError:
+            pass
+        return None
+    _touch(blob_path)
+    return blob_path
+
+def store_logo(key, content, attachment=None):
+    """Store logo bytes under key. Returns the content-addressed blob path."""
+    global _bytes_since_evict_check
+    blob_name = hashlib.sha256(content).hexdigest() + _guess_extension(attachment, content)
+    blob_path = os.path.join(_blobs_dir(), blob_name)
+    if os.path.exists(blob_path):
+        _touch(blob_path)
+    else:
+        atomic_write(blob_path, content)
+    atomic_write(_ref_path(key), blob_name.encode("utf-8"))
+
+    # Check the size budget roughly every 5% of it rather than scanning the directory on every store
+    with _stats_lock:
+        _bytes_since_evict_check += len(content)
+        due = LOGO_CACHE_MAX_BYTES > 0 and _bytes_since_evict_check >= max(1, LOGO_CACHE_MAX_BYTES // 20)
+        if due:
+            _bytes_since_evict_check = 0
+    if due:
+        evict_logo_cache()
+    return blob_path
+
+def fetch_logo(attachment, timeout=30):
+    """
+    Return a local file path for an Airtable attachment, downloading it only on a cache miss.
+    Returns None if the download fails with a non-200 status. Network errors propagate.
+    """
+    key = logo_cache_key(attachment)
+    if key:
+        path = get_cached_logo(key)
+        if path:
+            _bump(hits=1)
+            return path
+    _bump(misses=1)
+
+    logo_url = attachment.get("url") if attachment else None
+    resp = http_get(logo_url, timeout=timeout)
+    if resp.status_code != 200:
+        _bump(download_errors=1)
+        logger.warning("Failed to download logo %s: status %s", logo_url, resp.status_code)
+        return None
+    _bump(bytes_downloaded=len(resp.content))
+    return store_logo(key or "url:" + logo_url, resp.content, attachment)
+
+def _scan_blobs():
+    entries = []
+    try:
+        with os.scandir(_blobs_dir()) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith(".tmp-"):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+    except FileNotFoundError:
+        pass
+    return entries
+
+def evict_logo_cache(max_bytes=None):
+    """
+    Evict least-recently-used blobs until the cache is at or below 90% of max_bytes.
+    Serialized across processes with a lock file where fcntl is available; skipped if another
+    process is already evicting. Returns (files_removed, bytes_removed).
+    """
+    max_bytes = LOGO_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if max_bytes <= 0:
+        return 0, 0
+    os.makedirs(LOGO_CACHE_DIR, exist_ok=True)
+    with open(os.path.join(LOGO_CACHE_DIR, ".lock"), "a") as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return 0, 0
+        entries = _scan_blobs()
+        total = sum(size for _, size, _ in entries)
+        if total <= max_bytes:
+            return 0, 0
+        target = int(max_bytes * 0.9)
+        cutoff = time.time() - LOGO_CACHE_MIN_AGE
+        removed_files = removed_bytes = 0
+        for mtime, size, path in sorted(entries):
+            if total <= target or mtime > cutoff:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed_files += 1
+            removed_bytes += size
+    if removed_files:
+        _bump(evicted_files=removed_files, evicted_bytes=removed_bytes)
+        logger.info("Logo cache evicted %d files (%d bytes)", removed_files, removed_bytes)
+    return removed_files, removed_bytes
+
+def get_logo_cache_stats():
+    """Counters for this process plus the current on-disk size of the shared cache."""
+    with _stats_lock:
+        stats = dict(_stats)
+    entries = _scan_blobs()
+    stats["files"] = len(entries)
+    stats["bytes"] = sum(size for _, size, _ in entries)
+    stats["max_bytes"] = LOGO_CACHE_MAX_BYTES
+    stats["dir"] = LOGO_CACHE_DIR
+    return stats
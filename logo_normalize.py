@@ -0,0 +1,116 @@
+# logo_normalize.py
+# Pillow-based preprocessing that turns a cached source logo into a display-resolution variant
+# before it is embedded. Logos are drawn at most ~1.6in wide, so anything beyond
+# LOGO_TARGET_DPI at that width only inflates the PDF and ReportLab's encode time.
+# Variants are written next to the source blobs in the logo cache (and evicted with them),
+# so each logo is processed once per DPI setting.
+import io
+import os
+import threading
+import logging
+
+from PIL import Image
+
+import logo_cache
+
+logger = logging.getLogger(__name__)
+
+LOGO_TARGET_DPI = float(os.getenv("LOGO_TARGET_DPI", "300"))  # 0 disables normalization
+# Widest slot a logo is drawn into by build_table_content (PARENT_LOGO_W_TARGET = 1.6in)
+LOGO_MAX_DISPLAY_WIDTH_IN = float(os.getenv("LOGO_MAX_DISPLAY_WIDTH_IN", "1.6"))
+LOGO_JPEG_QUALITY = int(os.getenv("LOGO_JPEG_QUALITY", "85"))
+
+_stats_lock = threading.Lock()
+_stats = {"variants_created": 0, "variants_reused": 0, "passthrough": 0, "errors": 0}
+
+def _bump(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+def _has_alpha(im):
+    """True if the image has an alpha channel (or palette transparency) that is actually used."""
+    if im.mode == "P" and "transparency" in im.info:
+        im = im.convert("RGBA")
+    if im.mode not in ("RGBA", "LA", "PA"):
+        return False, im
+    return im.getchannel("A").getextrema()[0] < 255, im
+
+def _encode(im, has_alpha):
+    """
+    Pick the output format: PNG for transparency or flat-colour artwork (<=256 colours, which
+    JPEG would smear), JPEG for everything else. Returns (bytes, ext).
+    """
+    buf = io.BytesIO()
+    if has_alpha:
+        im.convert("RGBA").save(buf, "PNG", optimize=True)
+        return buf.getvalue(), ".png"
+    rgb = im.convert("RGB")
+    if rgb.getcolors(256) is not None:
+        rgb.save(buf, "PNG", optimize=True)
+        return buf.getvalue(), ".png"
+    rgb.save(buf, "JPEG", quality=LOGO_JPEG_QUALITY, optimize=True)
+    return buf.getvalue(), ".jpg"
+
+def normalize_logo(src_path, dpi=None, max_width_in=None):
+    """
+    Return (path, source_bytes, embedded_bytes) for a display-resolution variant of src_path.
+
+    The variant keeps the source aspect ratio so layout is unchanged. If the source is already
+    small enough and re-encoding would not make it smaller, the source itself is returned.
+    Any failure falls back to the source file.
+    """
+    dpi = LOGO_TARGET_DPI if dpi is None else dpi
+    max_width_in = LOGO_MAX_DISPLAY_WIDTH_IN if max_width_in is None else max_width_in
+    try:
+        source_bytes = os.path.getsize(src_path)
+    except OSError:
+        return src_path, 0, 0
+    if dpi <= 0:
+        return src_path, source_bytes, source_bytes
+
+    stem = os.path.splitext(os.path.basename(src_path))[0]
+    variant_base = os.path.join(os.path.dirname(src_path), f"{stem}@{int(dpi)}dpi_{max_width_in:g}in")
+    for ext in (".png", ".jpg"):
+        existing = variant_base + ext
+        if os.path.exists(existing):
+            os.utime(existing, None)
+            _bump("variants_reused")
+            return existing, source_bytes, os.path.getsize(existing)
+    passthrough_marker = variant_base + ".src"
+    if os.path.exists(passthrough_marker):
+        _bump("passthrough")
+        return src_path, source_bytes, source_bytes
+
+    try:
+        with Image.open(src_path) as im:
+            im.load()
+            max_px = max(1, int(round(max_width_in * dpi)))
+            resized = False
+            if im.width > max_px:
+                height = max(1, int(round(im.height * max_px / float(im.width))))
+                im = im.resize((max_px, height), Image.LANCZOS)
+                resized = True
+            has_alpha, im = _has_alpha(im)
+            data, ext = _encode(im, has_alpha)
+    except Exception:
+        logger.exception("Logo normalization failed for %s; embedding original", src_path)
+        _bump("errors")
+        return src_path, source_bytes, source_bytes
+
+    if not resized and len(data) >= source_bytes:
+        # Nothing to gain; remember that so the next build skips the decode
+        logo_cache.atomic_write(passthrough_marker, b"")
+        _bump("passthrough")
+        return src_path, source_bytes, source_bytes
+
+    variant_path = variant_base + ext
+    logo_cache.atomic_write(variant_path, data)
+    _bump("variants_created")
+    return variant_path, source_bytes, len(data)
+
+def get_logo_normalize_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["target_dpi"] = LOGO_TARGET_DPI
+    stats["max_display_width_in"] = LOGO_MAX_DISPLAY_WIDTH_IN
+    return stats
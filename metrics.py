@@ -0,0 +1,114 @@
+# metrics.py
+# In-process stage timings and counters, exposed in Prometheus text format on /metrics (admin token).
+# Every sample is labeled with the endpoint, region and state of the card being built; those
+# labels are set once per request with metric_labels() and carried in a contextvar, so the
+# instrumented code deep in airtable_utils / utils / the PDF generators doesn't need to be
+# passed them. Values are per process (each gunicorn worker exposes its own).
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+LABEL_NAMES = ("endpoint", "region", "state")
+
+# Seconds; spans a single Airtable page up to a large regional doc.build
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_HELP = {
+    "linecard_stage_seconds": ("histogram", "Time spent per pipeline stage (airtable_page, filter_group, logo_fetch, flowable_build, pdf_build including the file write)."),
+    "linecard_records_total": ("counter", "Airtable records laid out into line cards."),
+    "linecard_groups_total": ("counter", "Parent manufacturer groups laid out into line cards."),
+    "linecard_logos_total": ("counter", "Logos requested for line cards, by result (fetched or failed)."),
+    "linecard_pages_total": ("counter", "PDF pages rendered."),
+    "linecard_output_bytes_total": ("counter", "PDF bytes rendered."),
+    "linecard_renders_total": ("counter", "Line card PDFs rendered."),
+    "linecard_airtable_throttled_seconds_total": ("counter", "Seconds Airtable requests waited for the shared rate limit (including 429 pauses)."),
+    "linecard_airtable_rate_limited_total": ("counter", "Airtable responses with status 429."),
+}
+
+_labels = contextvars.ContextVar("linecard_metric_labels", default={})
+_lock = threading.Lock()
+_counters = {}    # (name, label items) -> value
+_histograms = {}  # (name, label items) -> [bucket counts..., +Inf count, sum]
+
+@contextmanager
+def metric_labels(**labels):
+    """Set endpoint/region/state labels for every sample recorded inside the block (merged with outer labels)."""
+    merged = dict(_labels.get())
+    merged.update({k: v for k, v in labels.items() if v is not None})
+    token = _labels.set(merged)
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+def _label_key(extra):
+    current = _labels.get()
+    items = [(name, str(current.get(name, ""))) for name in LABEL_NAMES]
+    items.extend(sorted((k, str(v)) for k, v in extra.items()))
+    return tuple(items)
+
+def inc(name, value=1, **extra_labels):
+    """Add value to counter name for the current labels (plus extra_labels)."""
+    key = (name, _label_key(extra_labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, value, **extra_labels):
+    """Record value in histogram name for the current labels (plus extra_labels)."""
+    key = (name, _label_key(extra_labels))
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [0] * (len(STAGE_BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(STAGE_BUCKETS):
+            if value <= bound:
+                series[i] += 1
+        series[len(STAGE_BUCKETS)] += 1
+        series[-1] += value
+
+@contextmanager
+def stage_timer(stage):
+    """Time the block into linecard_stage_seconds{stage=...} (recorded even if the block raises)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("linecard_stage_seconds", time.perf_counter() - started, stage=stage)
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(items, extra=()):
+    pairs = [f'{k}="{_escape(v)}"' for k, v in list(items) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+def render_metrics():
+    """Return all metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+    lines = []
+    for name, (kind, help_text) in METRIC_HELP.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, items), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(items)} {_format_number(value)}")
+        else:
+            for (metric, items), series in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(STAGE_BUCKETS, series):
+                    lines.append(f"{name}_bucket{_format_labels(items, [('le', repr(bound))])} {count}")
+                total = series[len(STAGE_BUCKETS)]
+                lines.append(f"{name}_bucket{_format_labels(items, [('le', '+Inf')])} {total}")
+                lines.append(f"{name}_sum{_format_labels(items)} {_format_number(series[-1])}")
+                lines.append(f"{name}_count{_format_labels(items)} {total}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,157 @@
+# output_janitor.py
+# Background housekeeping for output/. Replaces the per-request cleanup_output_folder scan:
+# a daemon thread in each worker sweeps the folder every OUTPUT_JANITOR_INTERVAL seconds,
+# deleting files older than OUTPUT_RETENTION_SECONDS and then the oldest files until the folder
+# is within OUTPUT_MAX_BYTES. Files that are being sent by this process, or were written or
+# served within OUTPUT_SERVE_GRACE seconds, are never deleted; sweeps are serialized across
+# gunicorn workers with a lock file. (On POSIX a file deleted mid-download still completes,
+# since the open handle keeps it alive; the grace period covers clients that haven't clicked yet.)
+import os
+import threading
+import time
+import logging
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", "output")
+OUTPUT_RETENTION_SECONDS = float(os.getenv("OUTPUT_RETENTION_SECONDS", "3600"))
+OUTPUT_MAX_BYTES = int(os.getenv("OUTPUT_MAX_BYTES", str(256 * 1024 * 1024)))  # 0 disables the quota
+OUTPUT_SERVE_GRACE = float(os.getenv("OUTPUT_SERVE_GRACE", "120"))
+OUTPUT_JANITOR_INTERVAL = float(os.getenv("OUTPUT_JANITOR_INTERVAL", "60"))
+
+_lock = threading.Lock()
+_serving = {}      # absolute path -> number of responses currently sending it (this process)
+_last_served = {}  # absolute path -> time a response for it last finished (this process)
+_thread = None
+_thread_pid = None
+_stats = {
+    "sweeps": 0,
+    "files_reclaimed": 0,
+    "bytes_reclaimed": 0,
+    "last_sweep": None,
+    "last_files_reclaimed": 0,
+    "last_bytes_reclaimed": 0,
+    "files": 0,
+    "bytes": 0,
+}
+
+def mark_serving(path):
+    """Protect path from eviction while it is sent; returns a callable to run when the response closes."""
+    path = os.path.abspath(path)
+    with _lock:
+        _serving[path] = _serving.get(path, 0) + 1
+
+    def release():
+        with _lock:
+            remaining = _serving.get(path, 1) - 1
+            if remaining > 0:
+                _serving[path] = remaining
+            else:
+                _serving.pop(path, None)
+            _last_served[path] = time.time()
+    return release
+
+def _is_protected(path, mtime, now):
+    if now - mtime < OUTPUT_SERVE_GRACE:
+        return True
+    with _lock:
+        if path in _serving:
+            return True
+        served = _last_served.get(path)
+    return served is not None and now - served < OUTPUT_SERVE_GRACE
+
+def _scan(folder):
+    entries = []
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, os.path.abspath(entry.path)))
+    except FileNotFoundError:
+        pass
+    return entries
+
+def sweep_output(folder=None, now=None):
+    """
+    Delete expired files, then the oldest files until the folder fits the quota.
+    Returns {"files": n, "bytes": n} reclaimed; skipped (0, 0) if another process is sweeping.
+    """
+    folder = folder or OUTPUT_DIR
+    now = now or time.time()
+    if not os.path.isdir(folder):
+        return {"files": 0, "bytes": 0}
+    with open(os.path.join(folder, ".janitor.lock"), "a") as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return {"files": 0, "bytes": 0}
+        entries = [e for e in _scan(folder) if not os.path.basename(e[2]).startswith(".janitor")]
+        total = sum(size for _, size, _ in entries)
+        files_removed = bytes_removed = 0
+        for mtime, size, path in sorted(entries):
+            expired = now - mtime > OUTPUT_RETENTION_SECONDS
+            over_quota = OUTPUT_MAX_BYTES > 0 and total > OUTPUT_MAX_BYTES
+            if not (expired or over_quota):
+                break  # sorted oldest first: nothing newer is expired either
+            if _is_protected(path, mtime, now):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            files_removed += 1
+            bytes_removed += size
+
+    with _lock:
+        # forget serve times for files that are gone
+        for path in [p for p in _last_served if not os.path.exists(p)]:
+            del _last_served[path]
+        _stats["sweeps"] += 1
+        _stats["files_reclaimed"] += files_removed
+        _stats["bytes_reclaimed"] += bytes_removed
+        _stats["last_sweep"] = now
+        _stats["last_files_reclaimed"] = files_removed
+        _stats["last_bytes_reclaimed"] = bytes_removed
+        _stats["files"] = len(entries) - files_removed
+        _stats["bytes"] = total
+    if files_removed:
+        logger.info("Output janitor reclaimed %d files (%d bytes) from %s", files_removed, bytes_removed, folder)
+    return {"files": files_removed, "bytes": bytes_removed}
+
+def _run():
+    while True:
+        try:
+            sweep_output()
+        except Exception:
+            logger.exception("Output janitor sweep failed")
+        time.sleep(OUTPUT_JANITOR_INTERVAL)
+
+def ensure_output_janitor():
+    """Start the janitor thread for this process if it isn't running (safe to call on every request)."""
+    global _thread, _thread_pid
+    if _thread is not None and _thread_pid == os.getpid():
+        return
+    with _lock:
+        if _thread is not None and _thread_pid == os.getpid():
+            return
+        _thread = threading.Thread(target=_run, name="output-janitor", daemon=True)
+        _thread_pid = os.getpid()
+        _thread.start()
+
+def get_output_janitor_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["serving"] = sum(_serving.values())
+    stats["retention_seconds"] = OUTPUT_RETENTION_SECONDS
+    stats["max_bytes"] = OUTPUT_MAX_BYTES
+    stats["serve_grace_seconds"] = OUTPUT_SERVE_GRACE
+    stats["interval_seconds"] = OUTPUT_JANITOR_INTERVAL
+    return stats
@@ -0,0 +1,325 @@
+# pdf_cache.py
+# Rendered-PDF cache. A line card is fully determined by its scope (region or region+state),
+# the grouped Airtable records, the static header/footer assets and the render settings, so a
+# PDF is stored under a hash of those and later requests for the same inputs skip rendering.
+# Entries are evicted least-recently-used by count and total size, independent of output/; recency
+# is kept on each entry's metadata file so hits never change the mtime of a PDF handed out.
+import contextvars
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+
+import logo_cache
+import logo_normalize
+import utils
+from output_janitor import OUTPUT_DIR
+from catalog_index import canonical_value
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "pdfs")
+PDF_CACHE_MAX_ENTRIES = int(os.getenv("PDF_CACHE_MAX_ENTRIES", "200"))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Renders with missing logos (e.g. a transient CDN failure) are only reused for this long
+PDF_CACHE_INCOMPLETE_TTL = float(os.getenv("PDF_CACHE_INCOMPLETE_TTL", "300"))
+PDF_CACHE_ENABLED = os.getenv("PDF_CACHE_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+
+# Bump when layout code changes the output for identical inputs
+RENDER_VERSION = "1"
+
+_bypass = contextvars.ContextVar("pdf_cache_bypass", default=False)
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "incomplete_stores": 0, "evicted": 0, "invalidated": 0}
+
+def _bump(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+def records_fingerprint(airtable_records):
+    """Content hash of a grouped records dict (order-sensitive, as it is for the layout)."""
+    payload = json.dumps(canonical_value(list(airtable_records.items())), sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def assets_fingerprint(assets_dir=None):
+    """Hash of the names, sizes and mtimes of the files directly under static/assets."""
+    assets_dir = assets_dir or utils.get_static_assets_dir()
+    h = hashlib.sha256()
+    try:
+        with os.scandir(assets_dir) as it:
+            entries = sorted((e.name, e.stat()) for e in it if e.is_file())
+    except FileNotFoundError:
+        entries = []
+    for name, st in entries:
+        h.update(f"{name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+def render_settings():
+    """Settings that change the rendered bytes for identical inputs."""
+    return {
+        "render_version": RENDER_VERSION,
+        "logo_dpi": logo_normalize.LOGO_TARGET_DPI,
+        "logo_width_in": logo_normalize.LOGO_MAX_DISPLAY_WIDTH_IN,
+        "logo_jpeg_quality": logo_normalize.LOGO_JPEG_QUALITY,
+        "page_templates": utils.PDF_PAGE_TEMPLATES,
+    }
+
+@contextmanager
+def bypass_pdf_cache():
+    """Render without reading or writing the cache inside the block (e.g. for a profiled request)."""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+def linecard_filename(region, state=None, timestamp=None):
+    """Date-stamped download name for a regional or state card, e.g. new_york_Linecard_20250101.pdf."""
+    timestamp = timestamp or datetime.now().strftime("%Y%m%d")
+    name = state.replace(" ", "_") if state else region
+    return f"{name}_Linecard_{timestamp}.pdf"
+
+def render_cache_key(scope, airtable_records, assets_dir=None):
+    parts = [scope, records_fingerprint(airtable_records), assets_fingerprint(assets_dir),
+             json.dumps(render_settings(), sort_keys=True)]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+def _entry_path(key):
+    return os.path.join(PDF_CACHE_DIR, key + ".pdf")
+
+def _meta_path(key):
+    return os.path.join(PDF_CACHE_DIR, key + ".json")
+
+def _read_meta(key):
+    try:
+        with open(_meta_path(key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def get_cached_pdf(key):
+    """
+    Return the cached PDF path for key, or None. A hit refreshes the entry's LRU timestamp, which is
+    the mtime of its metadata file: the PDF itself may be hard-linked elsewhere and is never touched.
+    """
+    path = _entry_path(key)
+    if not os.path.exists(path):
+        return None
+    meta = _read_meta(key)
+    if meta.get("incomplete") and time.time() - meta.get("created", 0) > PDF_CACHE_INCOMPLETE_TTL:
+        remove_cached_pdf(key)
+        return None
+    try:
+        os.utime(_meta_path(key), None)
+    except OSError:
+        return None
+    return path
+
+def _place(src, dest):
+    """
+    Atomically put a copy of src at dest, replacing whatever is there. Hard-linked where possible,
+    except into the output janitor's folder: its retention goes by file mtime, and a link would
+    share the cache entry's mtime instead of recording when this copy was written.
+    """
+    dest_dir = os.path.dirname(os.path.abspath(dest))
+    os.makedirs(dest_dir, exist_ok=True)
+    tmp = os.path.join(dest_dir, f".tmp-{uuid.uuid4().hex}.pdf")
+    linked = False
+    if dest_dir != os.path.abspath(OUTPUT_DIR):
+        try:
+            os.link(src, tmp)
+            linked = True
+        except OSError:
+            pass
+    if not linked:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+def _write_meta(key, scope, size, incomplete):
+    meta = {"scope": scope, "created": time.time(), "bytes": size, "incomplete": incomplete}
+    logo_cache.atomic_write(_meta_path(key), json.dumps(meta).encode("utf-8"))
+    _bump("incomplete_stores" if incomplete else "stores")
+
+def store_pdf(key, pdf_path, scope, incomplete=False):
+    """
+    Move a freshly rendered PDF into the cache under key. Returns the cache path.
+    incomplete entries (missing logos) expire after PDF_CACHE_INCOMPLETE_TTL.
+    """
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    path = _entry_path(key)
+    _write_meta(key, scope, os.path.getsize(pdf_path), incomplete)
+    os.replace(pdf_path, path)
+    return path
+
+def store_pdf_bytes(key, data, scope, incomplete=False):
+    """Like store_pdf, for a PDF rendered in memory. Returns the cache path."""
+    path = _entry_path(key)
+    _write_meta(key, scope, len(data), incomplete)
+    logo_cache.atomic_write(path, data)
+    return path
+
+def _is_incomplete(report):
+    logos = (report or {}).get("logos") or {}
+    return logos.get("logos_fetched", 0) < logos.get("logos_requested", 0)
+
+def render_cached(scope, airtable_records, output_path, render):
+    """
+    Produce the PDF for scope at output_path, reusing a cached render when the inputs match.
+
+    render(path) must write the PDF to path and may return a build report dict; a render whose
+    report shows missing logos is only reused for PDF_CACHE_INCOMPLETE_TTL, so a transient
+    logo failure is not pinned.
+    output_path is always replaced atomically, never written in place, so it can't clobber a
+    cache entry it was linked from.
+    Returns {"cached": bool, "key": str, "report": dict or None}.
+    """
+    if not PDF_CACHE_ENABLED or _bypass.get():
+        return {"cached": False, "key": None, "report": render(output_path)}
+
+    key = render_cache_key(scope, airtable_records)
+    cached = get_cached_pdf(key)
+    if cached:
+        _bump("hits")
+        _place(cached, output_path)
+        logger.info("PDF cache hit for %s (%s)", scope, key[:12])
+        return {"cached": True, "key": key, "report": None}
+
+    _bump("misses")
+    tmp = _temp_pdf_path()
+    try:
+        report = render(tmp)
+        _place(store_pdf(key, tmp, scope, incomplete=_is_incomplete(report)), output_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    evict_pdf_cache()
+    return {"cached": False, "key": key, "report": report}
+
+def _temp_pdf_path():
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    return os.path.join(PDF_CACHE_DIR, f".tmp-{uuid.uuid4().hex}.pdf")
+
+def render_cached_file(scope, airtable_records, render):
+    """
+    Streaming counterpart of render_cached: the PDF is rendered into (or found in) a file the
+    response is sent from, so it is never held in memory, and nothing is written to output/.
+
+    render(path) must write the PDF to path, as for render_cached.
+    Returns {"cached": bool, "key": str, "report": dict or None, "path": str, "temporary": bool}.
+    A temporary path (cache disabled or bypassed) is the caller's to remove once it has been sent.
+    """
+    if not PDF_CACHE_ENABLED or _bypass.get():
+        tmp = _temp_pdf_path()
+        try:
+            report = render(tmp)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return {"cached": False, "key": None, "report": report, "path": tmp, "temporary": True}
+
+    key = render_cache_key(scope, airtable_records)
+    cached = get_cached_pdf(key)
+    if cached:
+        _bump("hits")
+        logger.info("PDF cache hit for %s (%s)", scope, key[:12])
+        return {"cached": True, "key": key, "report": None, "path": cached, "temporary": False}
+
+    _bump("misses")
+    tmp = _temp_pdf_path()
+    try:
+        report = render(tmp)
+        path = store_pdf(key, tmp, scope, incomplete=_is_incomplete(report))
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    evict_pdf_cache()
+    return {"cached": False, "key": key, "report": report, "path": path, "temporary": False}
+
+def _scan_entries():
+    """[(last used, PDF bytes, key)]; last used is the metadata file's mtime (see get_cached_pdf)."""
+    entries = []
+    try:
+        with os.scandir(PDF_CACHE_DIR) as it:
+            for e in it:
+                if e.name.endswith(".pdf") and not e.name.startswith(".tmp-"):
+                    st = e.stat()
+                    try:
+                        used = os.stat(_meta_path(e.name[:-4])).st_mtime
+                    except OSError:
+                        used = st.st_mtime
+                    entries.append((used, st.st_size, e.name[:-4]))
+    except FileNotFoundError:
+        pass
+    return entries
+
+def remove_cached_pdf(key):
+    for path in (_entry_path(key), _meta_path(key)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def invalidate_scopes(scopes):
+    """
+    Drop every cached render for the given scopes (e.g. the changed_scopes of a catalog diff).
+    Keys are content hashes, so a changed catalog never hits a stale entry; this frees the
+    now-unreachable entries right away instead of waiting for LRU eviction. Returns count removed.
+    """
+    scopes = set(scopes)
+    if not scopes:
+        return 0
+    removed = 0
+    for _, _, key in _scan_entries():
+        if _read_meta(key).get("scope") in scopes:
+            remove_cached_pdf(key)
+            removed += 1
+    if removed:
+        _bump("invalidated", removed)
+        logger.info("PDF cache invalidated %d entries for %d changed scopes", removed, len(scopes))
+    return removed
+
+def evict_pdf_cache():
+    """Drop least-recently-used entries beyond PDF_CACHE_MAX_ENTRIES / PDF_CACHE_MAX_BYTES. Returns count removed."""
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    with open(os.path.join(PDF_CACHE_DIR, ".lock"), "a") as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return 0
+        entries = sorted(_scan_entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        while entries and (len(entries) > PDF_CACHE_MAX_ENTRIES or total > PDF_CACHE_MAX_BYTES):
+            _, size, key = entries.pop(0)
+            remove_cached_pdf(key)
+            total -= size
+            removed += 1
+    if removed:
+        _bump("evicted", removed)
+        logger.info("PDF cache evicted %d entries", removed)
+    return removed
+
+def get_pdf_cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    entries = _scan_entries()
+    stats["entries"] = len(entries)
+    stats["bytes"] = sum(size for _, size, _ in entries)
+    stats["max_entries"] = PDF_CACHE_MAX_ENTRIES
+    stats["max_bytes"] = PDF_CACHE_MAX_BYTES
+    stats["enabled"] = PDF_CACHE_ENABLED
+    return stats
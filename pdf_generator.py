@@ -9,7 +9,8 @@ from reportlab.platypus import KeepTogether
 import logging
 from reportlab.lib import colors
 
-from utils import create_scaled_image, build_table_content, make_page_decorator, del_downloaded_logos, cleanup_output_folder, get_asset_image_path, compute_image_display_height
+from utils import create_scaled_image, build_table_content, iter_table_content, LazyFlowables, PDF_STREAM_FLOWABLES, make_page_decorator, del_downloaded_logos, get_asset_image_path, compute_image_display_height, pdf_build_target, finish_pdf_output
+from metrics import stage_timer
 
 logger = logging.getLogger(__name__)
 
@@ -19,13 +20,20 @@ TOP_PADDING_AFTER_HEADER_LATER_PAGES = 10  # points for pages 2+
 BOTTOM_PADDING_ABOVE_FOOTER = 6            # small padding above footer
 
 # Primary function to generate the PDF (region-level)
-def generate_pdf(airtable_records, output_path, region, state=None):
+def generate_pdf(airtable_records, output_path, region, state=None, stream_layout=None):
     """
     airtable_records: grouped dict
-    output_path: filesystem path to write PDF
+    output_path: filesystem path or writable binary file object to write the PDF to;
+                 None renders into memory and returns the bytes as report["pdf"]
     region: region name (string)
     state: optional (kept for compatibility)
+    stream_layout: build the manufacturer tables lazily as doc.build reaches them (default
+                   PDF_STREAM_FLOWABLES); the PDF is identical, peak memory lower
+
+    Returns a build report dict; "logos" holds logo counts and bytes saved by normalization.
     """
+    # doc.build writes straight to the file or stream; only an in-memory render holds the bytes
+    target = pdf_build_target(output_path)
 
     # Page and content margins
     PAGE_WIDTH, PAGE_HEIGHT = letter
@@ -50,8 +58,10 @@ def generate_pdf(airtable_records, output_path, region, state=None):
     first_page_total_needed = header1_h + TOP_PADDING_AFTER_HEADER_FIRST_PAGE
     first_page_extra = max(0, first_page_total_needed - later_reserved_top)
 
-    doc = SimpleDocTemplate(output_path, pagesize=letter, topMargin=later_reserved_top, bottomMargin=reserved_bottom, leftMargin=left_margin, rightMargin=right_margin)
-    elements = []  # will be used to store the elements of the PDF
+    doc = SimpleDocTemplate(target, pagesize=letter, topMargin=later_reserved_top, bottomMargin=reserved_bottom, leftMargin=left_margin, rightMargin=right_margin)
+    if stream_layout is None:
+        stream_layout = PDF_STREAM_FLOWABLES
+    elements = LazyFlowables() if stream_layout else []  # will be used to store the elements of the PDF
     downloaded_logos = []  # List to keep track of temporarily downloaded logos from the Airtable records
 
     # Insert a first-page-only spacer so page 1 content sits below header_1 area (no double-counting)
@@ -59,8 +69,12 @@ def generate_pdf(airtable_records, output_path, region, state=None):
         elements.append(Spacer(1, first_page_extra))
 
     # Add the table content (no additional top spacer here)
-    tables, downloaded_logos = build_table_content(airtable_records, downloaded_logos)
-    elements.extend(tables)
+    logo_report = {}
+    if stream_layout:
+        elements.extend(iter_table_content(airtable_records, downloaded_logos, logo_report=logo_report))
+    else:
+        tables, downloaded_logos = build_table_content(airtable_records, downloaded_logos, logo_report=logo_report)
+        elements.extend(tables)
 
     # --- East-only appended asset (insert before footer, after all tables) ---
     # Tweakable side padding (points)
@@ -99,8 +113,17 @@ def generate_pdf(airtable_records, output_path, region, state=None):
     page_decorator = make_page_decorator(region, state_name=None)
 
     # Build PDF with page decorator applied to both first and later pages
-    doc.build(elements, onFirstPage=page_decorator, onLaterPages=page_decorator)
+    with stage_timer("pdf_build"):
+        doc.build(elements, onFirstPage=page_decorator, onLaterPages=page_decorator)
+    pdf = finish_pdf_output(target, doc.page)
 
     # Clean up downloaded logo files
     del_downloaded_logos(downloaded_logos)
-    cleanup_output_folder()
+
+    logger.info("Region %s PDF: %d logos, %d bytes embedded from %d source bytes (%d saved)",
+                region, logo_report.get("logos_fetched", 0), logo_report.get("embedded_bytes", 0),
+                logo_report.get("source_bytes", 0), logo_report.get("bytes_saved", 0))
+    report = {"logos": logo_report, "pages": doc.page}
+    if output_path is None:
+        report["pdf"] = pdf
+    return report
@@ -5,14 +5,27 @@ from reportlab.lib.units import inch
 from datetime import datetime
 import os
 from reportlab.platypus import KeepTogether
+import logging
 
-from utils import create_scaled_image, build_table_content, make_page_decorator, del_downloaded_logos, cleanup_output_folder, get_asset_image_path, compute_image_display_height
+from utils import create_scaled_image, build_table_content, iter_table_content, LazyFlowables, PDF_STREAM_FLOWABLES, make_page_decorator, del_downloaded_logos, get_asset_image_path, compute_image_display_height, pdf_build_target, finish_pdf_output
+from metrics import stage_timer
 
-def generate_pdf_state(airtable_records, output_path, region, state):
+logger = logging.getLogger(__name__)
+
+def generate_pdf_state(airtable_records, output_path, region, state, stream_layout=None):
     """
     Generate a state-specific PDF using the region's header/footer assets.
     Draw a centered state name under the header on page 1 only.
+    output_path may be a filesystem path or a writable binary file object; None renders into
+    memory and returns the bytes as report["pdf"].
+    stream_layout (default PDF_STREAM_FLOWABLES) builds the manufacturer tables lazily as doc.build
+    reaches them; the PDF is identical, peak memory lower.
+
+    Returns a build report dict; "logos" holds logo counts and bytes saved by normalization.
     """
+    # doc.build writes straight to the file or stream; only an in-memory render holds the bytes
+    target = pdf_build_target(output_path)
+
     # Page and content margins
     PAGE_WIDTH, PAGE_HEIGHT = letter
     left_margin = 36
@@ -43,8 +56,10 @@ def generate_pdf_state(airtable_records, output_path, region, state):
     first_page_total_needed = header1_h + state_padding_top + state_text_height + state_padding_bottom
     first_page_extra = max(0, first_page_total_needed - later_reserved_top)
 
-    doc = SimpleDocTemplate(output_path, pagesize=letter, topMargin=later_reserved_top, bottomMargin=reserved_bottom, leftMargin=left_margin, rightMargin=right_margin)
-    elements = []
+    doc = SimpleDocTemplate(target, pagesize=letter, topMargin=later_reserved_top, bottomMargin=reserved_bottom, leftMargin=left_margin, rightMargin=right_margin)
+    if stream_layout is None:
+        stream_layout = PDF_STREAM_FLOWABLES
+    elements = LazyFlowables() if stream_layout else []
     downloaded_logos = []
 
     # Insert a first-page-only spacer so the content on page 1 sits below header_1 + state label area
@@ -55,15 +70,28 @@ def generate_pdf_state(airtable_records, output_path, region, state):
     elements.append(Spacer(1, 8))
 
     # Table content
-    tables, downloaded_logos = build_table_content(airtable_records, downloaded_logos)
-    elements.extend(tables)
+    logo_report = {}
+    if stream_layout:
+        elements.extend(iter_table_content(airtable_records, downloaded_logos, logo_report=logo_report))
+    else:
+        tables, downloaded_logos = build_table_content(airtable_records, downloaded_logos, logo_report=logo_report)
+        elements.extend(tables)
 
     # Page decorator will draw header (Logo_1 on page1, Logo_2 on others) and footer using the region.
     # Provide state_name so decorator draws the centered state under the header on page 1 only.
     page_decorator = make_page_decorator(region, state_name=state.title())
 
-    doc.build(elements, onFirstPage=page_decorator, onLaterPages=page_decorator)
+    with stage_timer("pdf_build"):
+        doc.build(elements, onFirstPage=page_decorator, onLaterPages=page_decorator)
+    pdf = finish_pdf_output(target, doc.page)
 
     # Cleanup
     del_downloaded_logos(downloaded_logos)
-    cleanup_output_folder()
+
+    logger.info("State %s PDF: %d logos, %d bytes embedded from %d source bytes (%d saved)",
+                state, logo_report.get("logos_fetched", 0), logo_report.get("embedded_bytes", 0),
+                logo_report.get("source_bytes", 0), logo_report.get("bytes_saved", 0))
+    report = {"logos": logo_report, "pages": doc.page}
+    if output_path is None:
+        report["pdf"] = pdf
+    return report
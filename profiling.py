@@ -0,0 +1,149 @@
+# profiling.py
+# Opt-in profiling of single /generate-pdf/* requests on production data.
+# Disabled unless PROFILING_ENABLED is set AND the request carries PROFILING_ADMIN_TOKEN in the
+# X-Profile-Token header or the profile_token query parameter. A profiled request runs under
+# cProfile (saved as .pstats, for pstats/snakeviz) while a sampler thread records the request
+# thread's stack every PROFILE_SAMPLE_INTERVAL seconds (saved as collapsed stacks, one
+# "frame;frame;frame count" line per stack, for flamegraph.pl / speedscope).
+# Only the request thread is profiled; logo downloads on the fetch pool show up as waiting.
+# The same admin token also guards the /profiles listing in app.py.
+import cProfile
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+import logging
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0").strip().lower() in ("1", "true", "yes", "on")
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "profiles")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_MAX_KEPT = int(os.getenv("PROFILE_MAX_KEPT", "50"))  # oldest profiles beyond this are deleted
+
+PROFILE_KINDS = {"pstats": ".pstats", "collapsed": ".collapsed", "meta": ".json"}
+_PROFILE_ID_RE = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$")
+
+# cProfile can't nest and (on Python 3.12+) only one profiler may be active per process
+_profile_lock = threading.Lock()
+
+def profiling_available():
+    return PROFILING_ENABLED and bool(PROFILING_ADMIN_TOKEN)
+
+def is_admin_token(token):
+    """True if profiling is enabled and token matches PROFILING_ADMIN_TOKEN (constant-time compare)."""
+    if not profiling_available() or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), PROFILING_ADMIN_TOKEN.encode("utf-8"))
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _sample_stacks(thread_id, stop, samples):
+    """Record the target thread's stack (root first, as collapsed-stack tools expect) until stop is set."""
+    while not stop.wait(PROFILE_SAMPLE_INTERVAL):
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(_frame_name(frame))
+            frame = frame.f_back
+        if stack:
+            samples[";".join(reversed(stack))] += 1
+
+def _profile_path(profile_id, kind):
+    return os.path.join(PROFILE_DIR, profile_id + PROFILE_KINDS[kind])
+
+def profile_call(label, func):
+    """
+    Run func() under cProfile and the stack sampler and save the profile.
+    Returns (result, profile_id); profile_id is None if another profile was already running,
+    in which case func runs unprofiled.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        logger.warning("Profile requested for %s while another profile is running; running unprofiled", label)
+        return func(), None
+    try:
+        profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        samples = Counter()
+        stop = threading.Event()
+        sampler = threading.Thread(target=_sample_stacks, args=(threading.get_ident(), stop, samples),
+                                   name="profile-sampler", daemon=True)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        sampler.start()
+        profiler.enable()
+        try:
+            result = func()
+        finally:
+            profiler.disable()
+            stop.set()
+            sampler.join()
+            seconds = time.perf_counter() - started
+            _save_profile(profile_id, label, profiler, samples, seconds)
+        return result, profile_id
+    finally:
+        _profile_lock.release()
+
+def _save_profile(profile_id, label, profiler, samples, seconds):
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(_profile_path(profile_id, "pstats"))
+        with open(_profile_path(profile_id, "collapsed"), "w", encoding="utf-8") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        meta = {
+            "id": profile_id,
+            "label": label,
+            "created": time.time(),
+            "seconds": round(seconds, 4),
+            "samples": sum(samples.values()),
+            "sample_interval": PROFILE_SAMPLE_INTERVAL,
+        }
+        with open(_profile_path(profile_id, "meta"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        logger.info("Saved profile %s for %s (%.2fs, %d samples)", profile_id, label, seconds, meta["samples"])
+    except OSError:
+        logger.exception("Failed to save profile %s for %s", profile_id, label)
+        return
+    _prune_profiles()
+
+def list_profiles():
+    """Metadata of the saved profiles, newest first."""
+    profiles = []
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except FileNotFoundError:
+        return profiles
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), "r", encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    profiles.sort(key=lambda p: p.get("created", 0), reverse=True)
+    return profiles
+
+def get_profile_file(profile_id, kind):
+    """Return the path of a saved profile file, or None for unknown ids/kinds."""
+    if kind not in PROFILE_KINDS or not _PROFILE_ID_RE.match(profile_id or ""):
+        return None
+    path = _profile_path(profile_id, kind)
+    return path if os.path.exists(path) else None
+
+def _prune_profiles():
+    for profile in list_profiles()[PROFILE_MAX_KEPT:]:
+        for kind in PROFILE_KINDS:
+            try:
+                os.remove(_profile_path(profile["id"], kind))
+            except OSError:
+                pass
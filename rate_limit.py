@@ -0,0 +1,204 @@
+# rate_limit.py
+# Client-side rate limiting for the Airtable API, which allows about 5 requests per second per base.
+# Every gunicorn worker (and batch_render process) draws from one token bucket whose state lives in
+# a small file guarded by flock, so the workers together stay at AIRTABLE_RATE_LIMIT instead of
+# each sending at full speed. The default sits a little under 5/s: pacing at exactly the limit
+# lets network jitter push six requests into one second, and Airtable answers that with a 30s
+# pause. A 429 that still gets through is retried after Retry-After (or a jittered exponential
+# backoff), and the wait is written into the shared bucket so every worker pauses, not just the
+# one that was told to. Time spent waiting is counted per process.
+import os
+import random
+import struct
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from metrics import inc
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+AIRTABLE_RATE_LIMIT = float(os.getenv("AIRTABLE_RATE_LIMIT", "4.5"))  # requests/second across all workers; 0 disables
+AIRTABLE_RATE_BURST = float(os.getenv("AIRTABLE_RATE_BURST", "1"))  # >1 lets idle workers send a burst above the rate
+AIRTABLE_RATE_FILE = os.getenv("AIRTABLE_RATE_FILE") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "cache", "airtable_rate.bucket")
+AIRTABLE_429_RETRIES = int(os.getenv("AIRTABLE_429_RETRIES", "5"))
+AIRTABLE_BACKOFF_BASE = float(os.getenv("AIRTABLE_BACKOFF_BASE", "1.0"))  # seconds, doubled per retry
+AIRTABLE_BACKOFF_MAX = float(os.getenv("AIRTABLE_BACKOFF_MAX", "30"))
+
+# tokens, time of last refill, time until which nobody may send (after a 429)
+_STATE = struct.Struct("<ddd")
+
+_stats_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "throttled_requests": 0,
+    "throttled_seconds": 0.0,
+    "rate_limited": 0,
+    "retries": 0,
+    "gave_up": 0,
+    "backoff_seconds": 0.0,
+}
+
+class FileTokenBucket:
+    """
+    Token bucket refilled at rate tokens/second up to burst, shared by every process using path.
+    acquire() reserves a token and sleeps until it is due, so waiters are served in arrival order.
+    Without fcntl (Windows) the state is kept in memory and only shared between threads.
+    """
+    def __init__(self, path, rate, burst):
+        self.path = path
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._lock = threading.Lock()
+        self._memory = None
+
+    @contextmanager
+    def _state(self):
+        """Yield a [tokens, updated, blocked_until] list under the lock; changes are written back."""
+        with self._lock:
+            if fcntl is None:
+                state = list(self._memory or (self.burst, time.time(), 0.0))
+                yield state
+                self._memory = tuple(state)
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                data = os.pread(fd, _STATE.size, 0)
+                state = list(_STATE.unpack(data)) if len(data) == _STATE.size else [self.burst, time.time(), 0.0]
+                yield state
+                os.pwrite(fd, _STATE.pack(*state), 0)
+            finally:
+                os.close(fd)  # releases the flock
+
+    def _refill(self, state, now):
+        state[0] = min(self.burst, state[0] + max(0.0, now - state[1]) * self.rate)
+        state[1] = now
+
+    def acquire(self):
+        """Take one token, sleeping as needed (including any shared 429 pause). Returns seconds waited."""
+        waited = 0.0
+        reserved = False
+        while True:
+            with self._state() as state:
+                now = time.time()
+                self._refill(state, now)
+                if now < state[2]:
+                    wait = state[2] - now
+                elif reserved:
+                    return waited
+                else:
+                    state[0] -= 1
+                    reserved = True
+                    wait = -state[0] / self.rate if state[0] < 0 else 0.0
+                    if wait <= 0:
+                        return waited
+            time.sleep(wait)
+            waited += wait
+
+    def block(self, seconds):
+        """Make every process sharing the bucket hold off for seconds (extends, never shortens, a pause)."""
+        with self._state() as state:
+            now = time.time()
+            self._refill(state, now)
+            state[2] = max(state[2], now + seconds)
+
+_bucket = None
+_bucket_lock = threading.Lock()
+
+def get_airtable_bucket():
+    """The shared Airtable bucket, or None when AIRTABLE_RATE_LIMIT is 0."""
+    global _bucket
+    if AIRTABLE_RATE_LIMIT <= 0:
+        return None
+    if _bucket is None:
+        with _bucket_lock:
+            if _bucket is None:
+                _bucket = FileTokenBucket(AIRTABLE_RATE_FILE, AIRTABLE_RATE_LIMIT, AIRTABLE_RATE_BURST)
+    return _bucket
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP-date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def backoff_delay(attempt, retry_after=None):
+    """Delay before retry number attempt (0-based): at least Retry-After, else jittered exponential backoff."""
+    ceiling = min(AIRTABLE_BACKOFF_MAX, AIRTABLE_BACKOFF_BASE * (2 ** attempt))
+    delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+def _bump(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+def rate_limited_request(send):
+    """
+    Run send() (one Airtable HTTP request, returning a response) within the shared rate limit.
+    429 responses are retried up to AIRTABLE_429_RETRIES times; the last response is returned
+    either way, so callers still see a 429 once retries run out.
+    """
+    bucket = get_airtable_bucket()
+    attempt = 0
+    while True:
+        waited = bucket.acquire() if bucket else 0.0
+        with _stats_lock:
+            _stats["requests"] += 1
+            if waited > 0:
+                _stats["throttled_requests"] += 1
+                _stats["throttled_seconds"] += waited
+        if waited > 0:
+            inc("linecard_airtable_throttled_seconds_total", waited)
+        resp = send()
+        if resp.status_code != 429:
+            return resp
+        _bump("rate_limited")
+        inc("linecard_airtable_rate_limited_total")
+        if attempt >= AIRTABLE_429_RETRIES:
+            _bump("gave_up")
+            logger.error("Airtable still rate limiting after %d retries", attempt)
+            return resp
+        delay = backoff_delay(attempt, parse_retry_after(resp.headers.get("Retry-After")))
+        logger.warning("Airtable returned 429; pausing all workers for %.2fs (retry %d/%d)",
+                       delay, attempt + 1, AIRTABLE_429_RETRIES)
+        with _stats_lock:
+            _stats["retries"] += 1
+            _stats["backoff_seconds"] += delay
+        if bucket:
+            bucket.block(delay)
+        else:
+            time.sleep(delay)
+        attempt += 1
+
+def get_rate_limit_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["throttled_seconds"] = round(stats["throttled_seconds"], 3)
+    stats["backoff_seconds"] = round(stats["backoff_seconds"], 3)
+    stats["rate"] = AIRTABLE_RATE_LIMIT
+    stats["burst"] = AIRTABLE_RATE_BURST
+    stats["max_retries"] = AIRTABLE_429_RETRIES
+    return stats
@@ -0,0 +1,44 @@
+# regions.py
+# Region/state maps shared by the web app, the catalog index and batch tooling.
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Maps for region and state
+REGION_STATE_MAP = {
+    "midwest": ["illinois", "indiana", "michigan", "wisconsin"],
+    "west": ["california", "nevada", "hawaii", "new mexico"],
+    "east": ["florida", "georgia", "alabama", "tennessee", "kentucky", "north carolina", "south carolina", "virginia",
+             "new york", "massachusetts", "connecticut", "ohio", "pennsylvania", "new jersey", "maryland", "delaware",
+             "rhode island", "maine", "new hampshire", "vermont", "west virginia"],
+    "southwest": ["texas", "arkansas", "oklahoma", "louisiana", "mississippi", "arizona", "tennessee"],
+    "north central": ["minnesota", "north dakota", "south dakota", "iowa", "nebraska", "kansas", "missouri"],
+    "pacific northwest": ["oregon", "washington", "alaska"],
+    "rockies": ["colorado", "utah", "montana", "wyoming", "idaho"]
+}
+
+# States listed under more than one region, e.g. {"tennessee": ["east", "southwest"]}
+OVERLAPPING_STATES = {}
+for _region, _states in REGION_STATE_MAP.items():
+    for _state in _states:
+        OVERLAPPING_STATES.setdefault(_state, []).append(_region)
+OVERLAPPING_STATES = {s: regs for s, regs in OVERLAPPING_STATES.items() if len(regs) > 1}
+
+# Region whose header/footer art a state card uses when the state is in several regions. The card
+# itself lists the manufacturers of every region the state is in (catalog_index.state_card_regions);
+# this only picks the artwork. Tennessee has always used the southwest art.
+STATE_REGION_OVERRIDES = {
+    "tennessee": "southwest",
+}
+
+def _resolve_state_region(state, regions):
+    if state in STATE_REGION_OVERRIDES:
+        return STATE_REGION_OVERRIDES[state]
+    logger.warning("State %s is listed under regions %s with no override; using %s", state, regions, regions[0])
+    return regions[0]
+
+STATE_TO_REGION_MAP = {
+    state: (_resolve_state_region(state, OVERLAPPING_STATES[state]) if state in OVERLAPPING_STATES else region)
+    for region, states in REGION_STATE_MAP.items()
+    for state in states
+}
@@ -1,15 +1,23 @@
 #This file contains utility functions for generating PDF line cards, including image handling, table creation, and footer generation.
 # It also includes functions for cleaning up temporary files and managing the output folder.
-from reportlab.lib.utils import ImageReader
 from reportlab.platypus import Table, TableStyle, Paragraph, Spacer, Image as RLImage
+from PIL import Image as PILImage
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from datetime import datetime
+import io
 import os
-import requests
-import time
 import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from logo_cache import fetch_logo
+from logo_normalize import normalize_logo
+from catalog_model import resolve_display_name, DISPLAY_NAME_KEYS
+from metrics import stage_timer, observe, inc
 
 logger = logging.getLogger(__name__)
 
@@ -59,6 +67,49 @@ def normalize_asset_key(s: str) -> str:
         out = out.replace("__", "_")
     return out.strip("_")
 
+# Extensions considered for assets, in priority order
+ASSET_EXTENSIONS = [".png", ".jpg", ".jpeg", ".pdf"]
+
+# assets_dir -> {"mtime_ns": int, "paths": {normalized_key: best path}}
+_asset_registry = {}
+_asset_registry_lock = threading.Lock()
+
+def get_asset_registry(assets_dir: str = None):
+    """
+    Return {normalized_key: path} for every asset in assets_dir, keeping the best extension per key
+    (.png, .jpg, .jpeg, .pdf). The directory is listed once and re-indexed only when its mtime
+    changes (a file added, removed or renamed). Raises OSError if the directory can't be read.
+
+    If assets_dir is None, resolve via get_static_assets_dir(), so this works inside and outside a Flask app context.
+    """
+    if not assets_dir:
+        assets_dir = get_static_assets_dir()
+    mtime_ns = os.stat(assets_dir).st_mtime_ns
+
+    entry = _asset_registry.get(assets_dir)
+    if entry and entry["mtime_ns"] == mtime_ns:
+        return entry["paths"]
+
+    with _asset_registry_lock:
+        entry = _asset_registry.get(assets_dir)
+        if entry and entry["mtime_ns"] == mtime_ns:
+            return entry["paths"]
+        best = {}
+        for fname in os.listdir(assets_dir):
+            name, ext = os.path.splitext(fname)
+            ext = ext.lower()
+            if ext not in ASSET_EXTENSIONS:
+                continue
+            norm = normalize_asset_key(name)
+            rank = ASSET_EXTENSIONS.index(ext)
+            # prefer earlier extension in ASSET_EXTENSIONS order
+            if norm not in best or rank < best[norm][0]:
+                best[norm] = (rank, os.path.join(assets_dir, fname))
+        paths = {norm: path for norm, (_, path) in best.items()}
+        _asset_registry[assets_dir] = {"mtime_ns": mtime_ns, "paths": paths}
+        logger.debug("Indexed %d assets in %s", len(paths), assets_dir)
+        return paths
+
 def get_asset_image_path(base_name: str, assets_dir: str = None):
     """
     Given a base_name like "MidwestLogo_1" or "MidwestFooter",
@@ -66,6 +117,7 @@ def get_asset_image_path(base_name: str, assets_dir: str = None):
     .png, .jpg, .jpeg, .pdf (case-insensitive). If missing, return None and log.
 
     If assets_dir is None, resolve via get_static_assets_dir() so callers never need to compute paths.
+    Lookups go through the memoized asset registry instead of listing the directory each time.
     """
     if not base_name:
         return None
@@ -74,11 +126,8 @@ def get_asset_image_path(base_name: str, assets_dir: str = None):
     if not assets_dir:
         assets_dir = get_static_assets_dir()
 
-    desired = normalize_asset_key(base_name)
-    exts = [".png", ".jpg", ".jpeg", ".pdf"]
-
     try:
-        files = os.listdir(assets_dir)
+        registry = get_asset_registry(assets_dir)
     except FileNotFoundError:
         logger.warning("Assets directory does not exist: %s", assets_dir)
         return None
@@ -86,40 +135,85 @@ def get_asset_image_path(base_name: str, assets_dir: str = None):
         logger.exception("Failed listing assets directory: %s", assets_dir)
         return None
 
-    candidates = []
-    for fname in files:
-        name, ext = os.path.splitext(fname)
-        ext = ext.lower()
-        if ext not in exts:
-            continue
-        norm = normalize_asset_key(name)
-        if norm == desired:
-            # prefer earlier extension in exts order
-            candidates.append((exts.index(ext), os.path.join(assets_dir, fname)))
-    if not candidates:
+    path = registry.get(normalize_asset_key(base_name))
+    if not path:
         logger.warning("Asset not found for base '%s' in %s", base_name, assets_dir)
         return None
-    # sort by extension priority and return the best candidate
-    candidates.sort(key=lambda x: x[0])
-    return candidates[0][1]
+    return path
+
+# --- Image metadata cache ---------------------------------------------------
+# Image metadata keyed by (path, mtime, size), shared by layout and the page decorators so a
+# header/footer/logo is opened once per process instead of once per helper call and per page.
+# Only the metadata is kept: ReportLab is handed the path and decodes the image itself.
+IMAGE_INFO_CACHE_SIZE = int(os.getenv("IMAGE_INFO_CACHE_SIZE", "256"))
+
+_image_info_cache = OrderedDict()  # (path, mtime_ns, size) -> info dict, least recently used first
+_image_info_lock = threading.Lock()
+_image_info_stats = {"hits": 0, "misses": 0, "evictions": 0, "errors": 0}
+
+def get_image_info(image_path: str):
+    """
+    Return cached metadata for an image file, or None if it is missing or unreadable:
+      {"path", "width", "height", "format", "has_alpha"}
+    Only the image header is read. Entries are invalidated when the file's mtime or size changes
+    and evicted least-recently-used beyond IMAGE_INFO_CACHE_SIZE entries.
+    """
+    if not image_path:
+        return None
+    try:
+        st = os.stat(image_path)
+    except OSError:
+        return None
+    key = (image_path, st.st_mtime_ns, st.st_size)
+
+    with _image_info_lock:
+        info = _image_info_cache.get(key)
+        if info is not None:
+            _image_info_cache.move_to_end(key)
+            _image_info_stats["hits"] += 1
+            return info
+        _image_info_stats["misses"] += 1
+
+    try:
+        with PILImage.open(image_path) as im:
+            width, height = im.size
+            mode = im.mode
+            info = {
+                "path": image_path,
+                "width": width,
+                "height": height,
+                "format": im.format,
+                "has_alpha": mode in ("RGBA", "LA", "PA") or (mode == "P" and "transparency" in im.info),
+            }
+    except Exception:
+        logger.warning("Image not found or unreadable: %s", image_path)
+        with _image_info_lock:
+            _image_info_stats["errors"] += 1
+        return None
+
+    with _image_info_lock:
+        _image_info_cache[key] = info
+        while len(_image_info_cache) > IMAGE_INFO_CACHE_SIZE:
+            _image_info_cache.popitem(last=False)
+            _image_info_stats["evictions"] += 1
+    return info
+
+def get_image_info_stats():
+    with _image_info_lock:
+        stats = dict(_image_info_stats)
+        stats["entries"] = len(_image_info_cache)
+    return stats
 
 def compute_image_display_height(image_path: str, target_width: float) -> float:
     """
     Compute the image height (points) when scaled to target_width preserving aspect ratio.
     Returns 0 if the image_path is missing or unreadable.
     """
-    if not image_path or not os.path.exists(image_path):
-        return 0
-    try:
-        img = ImageReader(image_path)
-        iw, ih = img.getSize()
-        if iw == 0:
-            return 0
-        scale = float(target_width) / float(iw)
-        return float(ih) * scale
-    except Exception:
-        logger.exception("Failed to compute image display height for %s", image_path)
+    info = get_image_info(image_path)
+    if not info or info["width"] == 0:
         return 0
+    scale = float(target_width) / float(info["width"])
+    return float(info["height"]) * scale
 
 # --- Image helpers ---------------------------------------------------------
 def create_scaled_image(image_path, target_width, max_height=650):
@@ -127,13 +221,12 @@ def create_scaled_image(image_path, target_width, max_height=650):
     Return an RLImage scaled to target_width while preserving aspect ratio.
     If image can't be read, return a Paragraph placeholder.
     """
-    try:
-        image_reader = ImageReader(image_path)
-    except Exception:
+    info = get_image_info(image_path)
+    if not info:
         logger.warning("create_scaled_image: image not found or unreadable: %s", image_path)
         return Paragraph("Image not available", getSampleStyleSheet()["Normal"])
 
-    orig_width, orig_height = image_reader.getSize()
+    orig_width, orig_height = info["width"], info["height"]
     aspect_ratio = orig_height / orig_width
     target_height = target_width * aspect_ratio
 
@@ -141,6 +234,7 @@ def create_scaled_image(image_path, target_width, max_height=650):
         target_height = max_height
         target_width = target_height / aspect_ratio
 
+    # Pass the path (not the reader): ReportLab caches the embedded image per document by filename
     return RLImage(image_path, width=target_width, height=target_height)
 
 def draw_image_on_canvas(canvas, image_path, x, y, width=None, keep_aspect=True, anchor_top=False):
@@ -160,8 +254,10 @@ def draw_image_on_canvas(canvas, image_path, x, y, width=None, keep_aspect=True,
         logger.warning("PDF asset rendering not implemented: %s (skipping)", image_path)
         return 0
     try:
-        img = ImageReader(image_path)
-        iw, ih = img.getSize()
+        info = get_image_info(image_path)
+        if not info:
+            return 0
+        iw, ih = info["width"], info["height"]
         if iw == 0:
             return 0
         if width:
@@ -178,7 +274,8 @@ def draw_image_on_canvas(canvas, image_path, x, y, width=None, keep_aspect=True,
         else:
             bottom_y = y
 
-        # ReportLab's drawImage expects bottom-left coordinates
+        # ReportLab's drawImage expects bottom-left coordinates; passing the path lets the canvas
+        # reuse the already-embedded image XObject on later pages
         canvas.drawImage(image_path, x, bottom_y, width=draw_w, height=draw_h, preserveAspectRatio=keep_aspect, mask='auto')
         return draw_h
     except Exception as ex:
@@ -186,86 +283,341 @@ def draw_image_on_canvas(canvas, image_path, x, y, width=None, keep_aspect=True,
         return 0
 
 # --- Page decorators for header/footer ------------------------------------
-def make_page_decorator(region_name: str, state_name: str = None, assets_dir: str = None):
+# When enabled, each header variant (with the state label on page 1) and the footer are compiled
+# once per document into PDF form XObjects; every page then just references them.
+PDF_PAGE_TEMPLATES = os.getenv("PDF_PAGE_TEMPLATES", "1").strip().lower() not in ("0", "false", "no", "off")
+
+def make_page_decorator(region_name: str, state_name: str = None, assets_dir: str = None, use_templates: bool = None):
     """
     Return a single function to be passed to doc.build for onFirstPage and onLaterPages.
     Behavior:
      - Header image base: "{RegionName}Logo_1" for page 1, "{RegionName}Logo_2" for later pages.
      - Footer image base: "{RegionName}Footer" for all pages.
      - If state_name provided, draw centered state_name text under the header (only on page 1).
+     - use_templates (default PDF_PAGE_TEMPLATES): draw header/footer into reusable form XObjects
+       on first use and reference them on every page, instead of re-emitting them per page.
     The decorator will log missing assets and never raise.
     """
     if not assets_dir:
         assets_dir = get_static_assets_dir()
-
-    def add_header_footer(canvas, doc):
-        try:
-            page_width, page_height = doc.pagesize
+    if use_templates is None:
+        use_templates = PDF_PAGE_TEMPLATES
+
+    # Asset paths are resolved once per decorator, not per page
+    header_paths = {
+        1: get_asset_image_path(f"{region_name}Logo_1", assets_dir=assets_dir),
+        2: get_asset_image_path(f"{region_name}Logo_2", assets_dir=assets_dir),
+    }
+    footer_path = get_asset_image_path(f"{region_name}Footer", assets_dir=assets_dir)
+    form_prefix = "LinecardPage_" + (normalize_asset_key(region_name) or "region")
+
+    def draw_header(canvas, doc, header_variant):
+        page_width, page_height = doc.pagesize
+        header_path = header_paths[header_variant]
+        header_height = 0
+        if header_path:
+            # draw header top-aligned to page top and spanning full page width (not constrained by margins)
+            header_height = draw_image_on_canvas(canvas, header_path, 0, page_height, width=page_width, anchor_top=True)
+            if header_height == 0:
+                header_height = int(0.9 * inch)
+        else:
+            header_height = int(0.9 * inch)
+            logger.warning("Missing header asset for region=%s variant=%s", region_name, header_variant)
+
+        # If state_name is present, draw it centered under the header with configurable padding only on page 1
+        if state_name and header_variant == 1:
+            # Increased top padding above State Name (affects page 1 only)
+            state_padding_top = 28  # points (increased from 12)
+            state_font_size = 20
+            # place baseline of text below header by padding; text_y is baseline
+            text_y = page_height - header_height - state_padding_top
+            canvas.setFont("Helvetica-Bold", state_font_size)
+            canvas.setFillColorRGB(0, 0, 0)
+            canvas.drawCentredString(page_width / 2.0, text_y, state_name.title())
+
+    def draw_footer(canvas, doc):
+        page_width, _ = doc.pagesize
+        # Footer: use {RegionName}Footer on every page (draw full page width, bottom-aligned)
+        if footer_path:
+            # draw footer bottom-aligned at y=0 spanning full page width
+            draw_image_on_canvas(canvas, footer_path, 0, 0, width=page_width, anchor_top=False)
+        else:
+            # fallback: draw a rule line across content area
             left = doc.leftMargin
-            # content_width still available for content calculations
             content_width = page_width - doc.leftMargin - doc.rightMargin
+            canvas.setStrokeColorRGB(0.5, 0.5, 0.5)
+            canvas.setLineWidth(0.5)
+            canvas.line(left, 30, left + content_width, 30)
+            logger.warning("Missing footer asset for region=%s", region_name)
+
+    def draw_as_form(canvas, name, draw):
+        # compile the form the first time this document needs it, then just reference it
+        if not canvas.hasForm(name):
+            canvas.beginForm(name)
+            draw()
+            canvas.endForm()
+        canvas.doForm(name)
 
+    def add_header_footer(canvas, doc):
+        try:
             # determine header variant
             page_num = canvas.getPageNumber()
             header_variant = 1 if page_num == 1 else 2
-            header_base = f"{region_name}Logo_{header_variant}"
-            header_path = get_asset_image_path(header_base, assets_dir=assets_dir)
-
-            header_height = 0
-            if header_path:
-                # draw header top-aligned to page top and spanning full page width (not constrained by margins)
-                header_height = draw_image_on_canvas(canvas, header_path, 0, page_height, width=page_width, anchor_top=True)
-                if header_height == 0:
-                    header_height = int(0.9 * inch)
-            else:
-                header_height = int(0.9 * inch)
-                logger.warning("Missing header asset for region=%s variant=%s", region_name, header_variant)
-
-            # If state_name is present, draw it centered under the header with configurable padding only on page 1
-            if state_name and page_num == 1:
-                # Increased top padding above State Name (affects page 1 only)
-                state_padding_top = 28  # points (increased from 12)
-                state_font_size = 20
-                # place baseline of text below header by padding; text_y is baseline
-                text_y = page_height - header_height - state_padding_top
-                canvas.setFont("Helvetica-Bold", state_font_size)
-                canvas.setFillColorRGB(0, 0, 0)
-                canvas.drawCentredString(page_width / 2.0, text_y, state_name.title())
-
-            # Footer: use {RegionName}Footer on every page (draw full page width, bottom-aligned)
-            footer_base = f"{region_name}Footer"
-            footer_path = get_asset_image_path(footer_base, assets_dir=assets_dir)
-            if footer_path:
-                # draw footer bottom-aligned at y=0 spanning full page width
-                draw_image_on_canvas(canvas, footer_path, 0, 0, width=page_width, anchor_top=False)
+
+            if use_templates:
+                canvas.saveState()
+                draw_as_form(canvas, f"{form_prefix}_Header{header_variant}", lambda: draw_header(canvas, doc, header_variant))
+                draw_as_form(canvas, f"{form_prefix}_Footer", lambda: draw_footer(canvas, doc))
+                canvas.restoreState()
             else:
-                # fallback: draw a rule line across content area
-                canvas.setStrokeColorRGB(0.5, 0.5, 0.5)
-                canvas.setLineWidth(0.5)
-                canvas.line(left, 30, left + content_width, 30)
-                logger.warning("Missing footer asset for region=%s", region_name)
+                draw_header(canvas, doc, header_variant)
+                draw_footer(canvas, doc)
         except Exception:
             logger.exception("Error in page decorator for region=%s state=%s", region_name, state_name)
     return add_header_footer
 
-# --- Existing table-building that downloads logos from Airtable -----------
-def build_table_content(airtable_records, downloaded_logos):
+# --- Logo acquisition -------------------------------------------------------
+# Logos are fetched concurrently in one stage before layout so a region with many manufacturers
+# is not bound by serial network latency, and one slow response doesn't stall the rest.
+# Each logo is read from the persistent logo cache and only downloaded on a miss.
+LOGO_FETCH_WORKERS = int(os.getenv("LOGO_FETCH_WORKERS", "8"))
+
+def acquire_logo(attachment):
+    """
+    Fetch one logo through the cache and normalize it to display resolution.
+    Returns (path, source_bytes, embedded_bytes) or None if the download failed.
+    """
+    path = fetch_logo(attachment)
+    if not path:
+        return None
+    return normalize_logo(path)
+
+def fetch_group_logos(airtable_records, downloaded_logos, max_workers=None, report=None):
+    """
+    Download every parent and child logo the grouped records need, in parallel with a bounded worker pool.
+
+    Returns {parent_name: {"parent": filename or None, "children": [filename, ...]}}.
+    Child filenames keep child order and only include successful downloads; a failed parent
+    download yields None so layout falls back to the "No Logo" placeholder.
+
+    Files come from the persistent logo cache (logo_cache.py) and are shared with other builds,
+    so they are NOT added to downloaded_logos and must not be deleted by the caller.
+    Each logo is downsampled to display resolution (logo_normalize.py); if report is a dict it is
+    filled with logo counts and source vs embedded byte totals.
+    """
+    # (parent_name, child_index or None, attachment)
+    jobs = []
+    for parent_name, group in airtable_records.items():
+        parent = group["parent"]
+        children = group.get("children", []) or []
+
+        parent_logo_info = parent.get("Logos", []) if parent else []
+        if parent_logo_info:
+            jobs.append((parent_name, None, parent_logo_info[0]))
+        for i, child in enumerate(children):
+            child_logo_info = child.get("Logos", [])
+            if child_logo_info:
+                jobs.append((parent_name, i, child_logo_info[0]))
+
+    results = {}
+    if jobs:
+        workers = max(1, min(max_workers or LOGO_FETCH_WORKERS, len(jobs)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="logo-fetch") as pool:
+            futures = {pool.submit(acquire_logo, attachment): (parent_name, idx) for parent_name, idx, attachment in jobs}
+            for future in as_completed(futures):
+                parent_name, idx = futures[future]
+                try:
+                    results[(parent_name, idx)] = future.result()
+                except Exception as ex:
+                    if idx is None:
+                        logger.exception("Error downloading parent logo for %s: %s", parent_name, ex)
+                    else:
+                        logger.exception("Error downloading child logo for %s child %d: %s", parent_name, idx, ex)
+                    results[(parent_name, idx)] = None
+
+    logo_files = {}
+    source_bytes = embedded_bytes = fetched = 0
+    for parent_name, idx, _ in jobs:
+        entry = logo_files.setdefault(parent_name, {"parent": None, "children": []})
+        result = results.get((parent_name, idx))
+        if not result:
+            continue
+        filename, src_size, out_size = result
+        fetched += 1
+        source_bytes += src_size
+        embedded_bytes += out_size
+        if idx is None:
+            entry["parent"] = filename
+        else:
+            entry["children"].append(filename)
+
+    if report is not None:
+        report.update({
+            "logos_requested": len(jobs),
+            "logos_fetched": fetched,
+            "source_bytes": source_bytes,
+            "embedded_bytes": embedded_bytes,
+            "bytes_saved": source_bytes - embedded_bytes,
+        })
+    return logo_files
+
+# --- Parsed paragraph cache -------------------------------------------------
+# A manufacturer's descriptions recur in the regional card and every state card it appears in.
+# Parsing a Paragraph's markup into frags is the costly part of building its table block, and frags
+# are read-only once parsed (ReportLab's own split shares them), so build_table_content keeps them
+# per (style, text) and builds each card's Paragraphs from them. The flowables themselves are built
+# anew for every card: they are stateful once laid out, and copying a whole cached block cost more
+# than building it. Image sizes for the logos come from the get_image_info cache.
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "4096"))  # parsed texts kept; 0 disables
+
+_fragment_cache = OrderedDict()  # (style name, text) -> (text, style, bulletText, frags), least recently used first
+_fragment_lock = threading.Lock()
+_fragment_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+def parsed_paragraph(text, style):
+    """
+    A new Paragraph for text in style, reusing the frags parsed the last time the same text was
+    laid out in a style of that name. Only for getSampleStyleSheet() styles, which every card
+    creates anew but which are identical under the same name.
+    """
+    if FRAGMENT_CACHE_SIZE <= 0:
+        return Paragraph(text, style)
+    key = (style.name, text)
+    with _fragment_lock:
+        parsed = _fragment_cache.get(key)
+        if parsed is None:
+            _fragment_stats["misses"] += 1
+        else:
+            _fragment_cache.move_to_end(key)
+            _fragment_stats["hits"] += 1
+    if parsed is not None:
+        cleaned, parsed_style, bullet_text, frags = parsed
+        return Paragraph(cleaned, parsed_style, bulletText=bullet_text, frags=frags)
+    paragraph = Paragraph(text, style)
+    with _fragment_lock:
+        _fragment_cache[key] = (paragraph.text, paragraph.style, paragraph.bulletText, paragraph.frags)
+        while len(_fragment_cache) > FRAGMENT_CACHE_SIZE:
+            _fragment_cache.popitem(last=False)
+            _fragment_stats["evictions"] += 1
+    return paragraph
+
+def get_fragment_cache_stats():
+    with _fragment_lock:
+        stats = dict(_fragment_stats)
+        stats["entries"] = len(_fragment_cache)
+    stats["max_entries"] = FRAGMENT_CACHE_SIZE
+    return stats
+
+# --- Lazy story ---------------------------------------------------------------
+# With streaming layout the PDF generators hand doc.build a LazyFlowables instead of a list, and the
+# table flowables come from iter_table_content: each parent group is built only when layout reaches
+# it, and laid-out flowables are dropped as pages are finished, so a large card never holds every
+# group's flowables at once. The output is the same as building the full list first.
+PDF_STREAM_FLOWABLES = os.getenv(
+    "PDF_STREAM_FLOWABLES", "1" if os.getenv("AIRTABLE_FETCH_MODE", "").strip().lower() == "stream" else "0"
+).strip().lower() not in ("0", "false", "no", "off")
+
+def _keeps_with_next(flowable):
+    get_keep = getattr(flowable, "getKeepWithNext", None)
+    return bool(get_keep()) if get_keep else False
+
+class LazyFlowables:
+    """
+    List stand-in for doc.build's story that pulls flowables from its sources only as layout needs them.
+
+    append() and extend() queue items and iterables without consuming them. doc.build only works at
+    the front of the story: len(), indexing and slicing, del, insert(0, ...) and [0:0] = split parts.
+    len() counts the buffered flowables after topping the buffer up to at least one, and past any
+    keepWithNext run, so it is 0 only at the end and keepWithNext grouping sees what a list would.
+    """
+    def __init__(self, iterable=()):
+        self._buffer = []
+        self._sources = deque()
+        self.extend(iterable)
+
+    def append(self, flowable):
+        if self._sources:
+            self._sources.append(iter((flowable,)))
+        else:
+            self._buffer.append(flowable)
+
+    def extend(self, iterable):
+        self._sources.append(iter(iterable))
+
+    def _fill(self, count):
+        while len(self._buffer) < count and self._sources:
+            try:
+                self._buffer.append(next(self._sources[0]))
+            except StopIteration:
+                self._sources.popleft()
+
+    def _fill_for(self, index):
+        if isinstance(index, slice):
+            if index.stop is None or index.stop < 0 or (index.start or 0) < 0:
+                self._fill(float("inf"))
+            else:
+                self._fill(index.stop)
+        elif index < 0:
+            self._fill(float("inf"))
+        else:
+            self._fill(index + 1)
+
+    def __len__(self):
+        self._fill(1)
+        while self._sources and self._buffer and _keeps_with_next(self._buffer[-1]):
+            self._fill(len(self._buffer) + 1)
+        return len(self._buffer)
+
+    def __getitem__(self, index):
+        self._fill_for(index)
+        return self._buffer[index]
+
+    def __setitem__(self, index, value):
+        self._fill_for(index)
+        self._buffer[index] = value
+
+    def __delitem__(self, index):
+        self._fill_for(index)
+        del self._buffer[index]
+
+    def insert(self, index, flowable):
+        self._fill_for(index)
+        self._buffer.insert(index, flowable)
+
+# --- Existing table-building from Airtable records -------------------------
+def build_table_content(airtable_records, downloaded_logos, logo_files=None, logo_report=None):
+    """
+    Build flowable tables for each parent group; see iter_table_content for the layout.
+    Returns (tables, downloaded_logos).
+    """
+    tables = list(iter_table_content(airtable_records, downloaded_logos, logo_files, logo_report))
+    return tables, downloaded_logos
+
+def iter_table_content(airtable_records, downloaded_logos, logo_files=None, logo_report=None):
     """
-    Build flowable tables for each parent group.
+    Return a generator of the flowable tables for each parent group, built one group at a time as
+    the caller consumes it (build_table_content lists them; LazyFlowables feeds them to doc.build).
 
     - Parents with children: single-column full-width block.
       * Top: single-row logos (parent first, then child logos) scaled to fit in one line.
       * Below: parent description (if present), then each child line "ChildName: Description" (or description-only if name missing).
     - Parents without children: unchanged two-column layout (left logo ? 2.0in column, right description ? 5.0in).
-    Returns (tables, downloaded_logos).
+
+    logo_files is the mapping returned by fetch_group_logos; if omitted, logos are fetched here,
+    before this returns (filling logo_report, if given).
     """
     styles = getSampleStyleSheet()
     styleN = styles["Normal"]
-    tables = []
 
-    # Base directory for temporary logos under static assets
-    base_temp_dir = os.path.join(get_static_assets_dir(), "temp_logos")
-    os.makedirs(base_temp_dir, exist_ok=True)
+    # Acquire all logos concurrently before layout begins
+    if logo_files is None:
+        logo_report = {} if logo_report is None else logo_report
+        with stage_timer("logo_fetch"):
+            logo_files = fetch_group_logos(airtable_records, downloaded_logos, report=logo_report)
+        inc("linecard_logos_total", logo_report.get("logos_fetched", 0), result="fetched")
+        inc("linecard_logos_total", logo_report.get("logos_requested", 0) - logo_report.get("logos_fetched", 0), result="failed")
+    inc("linecard_groups_total", len(airtable_records))
+    inc("linecard_records_total", sum((1 if g.get("parent") else 0) + len(g.get("children") or []) for g in airtable_records.values()))
 
     # total width for single-column parent-with-children rows (preserve original col widths)
     total_row_width = 2.0 * inch + 5.0 * inch
@@ -335,65 +687,21 @@ def build_table_content(airtable_records, downloaded_logos):
 
     # Track whether we've already emitted a missing-name warning this build to avoid spam
     missing_name_warned = False
-    attempted_keys = [
-        "Manufacturer Names",
-        "Manufacturer Name",
-        "Manufacturer",
-        "Name",
-        "Company",
-        "Title",
-        "Display Name"
-    ]
+    attempted_keys = list(DISPLAY_NAME_KEYS)
 
-    for parent_name, group in airtable_records.items():
+    def build_group(parent_name, group, group_logos):
+        """Return the flowables (table block + trailing spacer) for one parent group."""
+        nonlocal missing_name_warned
         parent = group["parent"]
         children = group.get("children", []) or []
 
-        # sanitize parent_name for filenames
-        safe_parent = "".join(c if (c.isalnum() or c in (' ', '_', '-')) else '_' for c in (parent_name or "unknown"))
-        safe_parent = safe_parent.replace(' ', '_')
-
-        # ---- DOWNLOAD LOGOS, but store filenames (do NOT finalize scaled flowables yet) ----
-        parent_logo_filename = None
-        parent_logo_info = parent.get("Logos", []) if parent else []
-        if parent_logo_info:
-            try:
-                logo_url = parent_logo_info[0].get("url")
-                logo_filename = os.path.join(base_temp_dir, f"logo_{safe_parent}.png")
-                resp = requests.get(logo_url, timeout=30)
-                if resp.status_code == 200:
-                    with open(logo_filename, "wb") as f:
-                        f.write(resp.content)
-                    downloaded_logos.append(logo_filename)
-                    parent_logo_filename = logo_filename
-                else:
-                    logger.warning("Failed to download parent logo %s: status %s", logo_url, resp.status_code)
-                    parent_logo_filename = None
-            except Exception as ex:
-                logger.exception("Error downloading parent logo for %s: %s", parent_name, ex)
-                parent_logo_filename = None
-
-        child_logo_filenames = []
-        for i, child in enumerate(children):
-            child_logo_info = child.get("Logos", [])
-            if child_logo_info:
-                try:
-                    logo_url = child_logo_info[0].get("url")
-                    logo_filename = os.path.join(base_temp_dir, f"child_logo_{safe_parent}_{i}.png")
-                    resp = requests.get(logo_url, timeout=30)
-                    if resp.status_code == 200:
-                        with open(logo_filename, "wb") as f:
-                            f.write(resp.content)
-                        downloaded_logos.append(logo_filename)
-                        child_logo_filenames.append(logo_filename)
-                    else:
-                        logger.warning("Failed to download child logo %s: status %s", logo_url, resp.status_code)
-                except Exception as ex:
-                    logger.exception("Error downloading child logo for %s child %d: %s", parent_name, i, ex)
+        # ---- Logos were fetched up front by fetch_group_logos; look up the local filenames ----
+        parent_logo_filename = group_logos.get("parent")
+        child_logo_filenames = list(group_logos.get("children") or [])
 
         # Parent description (may be empty)
         description = parent.get("Description", "").strip() if parent else ""
-        description_paragraph = Paragraph(description or "No description available.", styleN)
+        description_paragraph = parsed_paragraph(description or "No description available.", styleN)
 
         # ---- Parent WITHOUT children: keep original two-column layout (unchanged) ----
         if not children:
@@ -401,7 +709,7 @@ def build_table_content(airtable_records, downloaded_logos):
             if parent_logo_filename:
                 left_cell = create_scaled_image(parent_logo_filename, target_width=PARENT_LOGO_W_DEFAULT)
             else:
-                left_cell = Paragraph("No Logo", styleN)
+                left_cell = parsed_paragraph("No Logo", styleN)
 
             right_column = [description_paragraph]
 
@@ -413,9 +721,7 @@ def build_table_content(airtable_records, downloaded_logos):
                 ("BOTTOMPADDING", (0, 0), (-1, -1), 12),
                 ("LINEBELOW", (0, 0), (-1, -1), 0.25, colors.grey),
             ]))
-            tables.append(table)
-            tables.append(Spacer(1, 12))
-            continue
+            return [table, Spacer(1, 12)]
 
         # ---- Parent WITH children: single-column full-width block, single-line logos only ----
 
@@ -428,7 +734,7 @@ def build_table_content(airtable_records, downloaded_logos):
 
         if not logos_filenames:
             # No logos at all -> placeholder flowable row
-            logos_row_flowables = [Paragraph("No Logos", styleN)]
+            logos_row_flowables = [parsed_paragraph("No Logos", styleN)]
             # assemble the rest as before (no scaling needed)
             right_column_content = [logos_row_flowables[0], Spacer(1, 6)]
             if description:
@@ -440,22 +746,22 @@ def build_table_content(airtable_records, downloaded_logos):
                 if child_name:
                     # bold only child name
                     if child_desc and child_desc.strip():
-                        right_column_content.append(Paragraph(f"<b>{child_name}</b>: {child_desc}", styleN))
+                        right_column_content.append(parsed_paragraph(f"<b>{child_name}</b>: {child_desc}", styleN))
                     else:
-                        right_column_content.append(Paragraph(f"<b>{child_name}</b>", styleN))
+                        right_column_content.append(parsed_paragraph(f"<b>{child_name}</b>", styleN))
                 else:
                     # log once
                     if not missing_name_warned:
-                        child_keys = list(child.keys()) if isinstance(child, dict) else []
+                        child_keys = list(child.keys()) if hasattr(child, "keys") else []
                         logger.warning(
                             "Missing child display name under parent=%s. child keys=%s. attempted keys=%s",
                             parent_name, child_keys, attempted_keys
                         )
                         missing_name_warned = True
                     if child_desc and child_desc.strip():
-                        right_column_content.append(Paragraph(child_desc, styleN))
+                        right_column_content.append(parsed_paragraph(child_desc, styleN))
                     else:
-                        right_column_content.append(Paragraph("(Unnamed)", styleN))
+                        right_column_content.append(parsed_paragraph("(Unnamed)", styleN))
 
             row = [right_column_content]
             table = Table([row], colWidths=[total_row_width])
@@ -466,9 +772,7 @@ def build_table_content(airtable_records, downloaded_logos):
                 ("BOTTOMPADDING", (0, 0), (-1, -1), 12),
                 ("LINEBELOW", (0, 0), (-1, -1), 0.25, colors.grey),
             ]))
-            tables.append(table)
-            tables.append(Spacer(1, 12))
-            continue
+            return [table, Spacer(1, 12)]
 
         # Compute initially intended widths (points) for each logo in order
         intended_widths = []
@@ -502,7 +806,7 @@ def build_table_content(airtable_records, downloaded_logos):
                 logos_flowables.append(img_flow)
             except Exception:
                 logger.exception("Failed to create image flowable for %s", fname)
-                logos_flowables.append(Paragraph("No Logo", styleN))
+                logos_flowables.append(parsed_paragraph("No Logo", styleN))
 
         # Single-line logos row (no wrapping) represented as a single table row
         logos_table = Table([logos_flowables])
@@ -527,22 +831,22 @@ def build_table_content(airtable_records, downloaded_logos):
             child_desc = child.get("Description", "")
             if not child_name:
                 if not missing_name_warned:
-                    child_keys = list(child.keys()) if isinstance(child, dict) else []
+                    child_keys = list(child.keys()) if hasattr(child, "keys") else []
                     logger.warning(
                         "Missing child display name under parent=%s. child keys=%s. attempted keys=%s",
                         parent_name, child_keys, attempted_keys
                     )
                     missing_name_warned = True
                 if child_desc and child_desc.strip():
-                    right_column_content.append(Paragraph(child_desc, styleN))
+                    right_column_content.append(parsed_paragraph(child_desc, styleN))
                 else:
-                    right_column_content.append(Paragraph("(Unnamed)", styleN))
+                    right_column_content.append(parsed_paragraph("(Unnamed)", styleN))
             else:
                 # bold only the child name, keep description normal
                 if child_desc and child_desc.strip():
-                    right_column_content.append(Paragraph(f"<b>{child_name}</b>: {child_desc}", styleN))
+                    right_column_content.append(parsed_paragraph(f"<b>{child_name}</b>: {child_desc}", styleN))
                 else:
-                    right_column_content.append(Paragraph(f"<b>{child_name}</b>", styleN))
+                    right_column_content.append(parsed_paragraph(f"<b>{child_name}</b>", styleN))
 
         # Assemble single-column table spanning combined width
         row = [right_column_content]
@@ -554,84 +858,61 @@ def build_table_content(airtable_records, downloaded_logos):
             ("BOTTOMPADDING", (0, 0), (-1, -1), 12),
             ("LINEBELOW", (0, 0), (-1, -1), 0.25, colors.grey),
         ]))
-        tables.append(table)
-        tables.append(Spacer(1, 12))
+        return [table, Spacer(1, 12)]
 
-    return tables, downloaded_logos
+    def blocks():
+        # flowable_build covers only the time spent building groups, not the consumer's work in between
+        build_seconds = 0.0
+        try:
+            for parent_name, group in airtable_records.items():
+                started = time.perf_counter()
+                block = build_group(parent_name, group, logo_files.get(parent_name) or {})
+                build_seconds += time.perf_counter() - started
+                yield from block
+        finally:
+            observe("linecard_stage_seconds", build_seconds, stage="flowable_build")
+
+    return blocks()
+
+class _CountingWriter:
+    """Writable file object passed to doc.build in place of the caller's, counting the bytes written."""
+    def __init__(self, f):
+        self.f = f
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        return self.f.write(data)
+
+def pdf_build_target(output_path):
+    """
+    What doc.build should write to for output_path: the path itself, the caller's file object (via
+    a byte counter) or, for None, a BytesIO to return the bytes from. Pass it to finish_pdf_output.
+    """
+    if output_path is None:
+        return io.BytesIO()
+    if hasattr(output_path, "write"):
+        return _CountingWriter(output_path)
+    return output_path
+
+def finish_pdf_output(target, page_count):
+    """
+    Count a PDF doc.build has written to target (from pdf_build_target; the write itself is part of
+    the pdf_build stage). Returns the bytes of an in-memory render, else None: a file or stream the
+    PDF went to is never read back.
+    """
+    if isinstance(target, io.BytesIO):
+        pdf = target.getvalue()
+        size = len(pdf)
+    else:
+        pdf = None
+        size = target.bytes if isinstance(target, _CountingWriter) else os.path.getsize(target)
+    inc("linecard_renders_total")
+    inc("linecard_pages_total", page_count)
+    inc("linecard_output_bytes_total", size)
+    return pdf
 
 def del_downloaded_logos(downloaded_logos):
     for logo_filename in downloaded_logos:
         if os.path.exists(logo_filename):
             os.remove(logo_filename)
-
-def cleanup_output_folder(folder="output", max_age_seconds=60):
-    now = time.time()
-    if not os.path.exists(folder):
-        return  # Skip if folder doesn't exist
-    for filename in os.listdir(folder):
-        filepath = os.path.join(folder, filename)
-        if os.path.isfile(filepath):
-            file_age = now - os.path.getmtime(filepath)
-            if file_age > max_age_seconds:
-                os.remove(filepath)
-                print(f"Deleted {filepath}")
-
-def resolve_display_name(record):
-    """
-    Resolve a display name from an Airtable record dict.
-
-    Tries keys in order:
-      - "Manufacturer Names"
-      - "Manufacturer Name"
-      - "Manufacturer"
-      - "Name"
-      - "Company"
-      - "Title"
-      - "Display Name"
-
-    Supports nested shapes like {"fields": {...}} by checking record.get("fields", {}).
-    If the found value is a list, returns the first non-empty element joined as string.
-    Returns None if no name found.
-    """
-    if not isinstance(record, dict):
-        return None
-
-    # Support nested 'fields' wrapper
-    candidate_sources = [record]
-    if "fields" in record and isinstance(record.get("fields"), dict):
-        candidate_sources.insert(0, record["fields"])
-
-    lookup_keys = [
-        "Manufacturer Names",
-        "Manufacturer Name",
-        "Manufacturer",
-        "Name",
-        "Company",
-        "Title",
-        "Display Name"
-    ]
-
-    for src in candidate_sources:
-        for k in lookup_keys:
-            if k in src:
-                val = src.get(k)
-                if val is None:
-                    continue
-                # If list, choose first non-empty element (common in Airtable multi-select)
-                if isinstance(val, list):
-                    for item in val:
-                        if isinstance(item, str) and item.strip():
-                            return item.strip()
-                    # if list but empty strings, continue searching other keys
-                    continue
-                # If not list, coerce to string
-                if isinstance(val, str) and val.strip():
-                    return val.strip()
-                # If other types, convert to str
-                try:
-                    s = str(val).strip()
-                    if s:
-                        return s
-                except Exception:
-                    continue
-    return None